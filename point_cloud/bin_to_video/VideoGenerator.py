@@ -22,6 +22,7 @@ from ConfigManager import ConfigManager
 commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
 sys.path.append(str(Path(commonDir)))
 import utils
+import ResourceMonitor
 
 class VideoGenerator:
 
@@ -31,6 +32,8 @@ class VideoGenerator:
         self.cmd = utils.pathStr(config_manager.renderer)
 
         self.testList=[]
+        # resource usage record of each render job
+        self.recordFiles={}
 
         if(not test==None):
             self.addTest(config_manager, test)
@@ -83,6 +86,7 @@ class VideoGenerator:
                     cmdArgs=(f"{cmdArgs} {conf_arg}")                
                 
                 testArgs.append(cmdArgs)
+                self.recordFiles[cmdArgs] = ResourceMonitor.getRecordFile(utils.createPath(vid_dir.joinpath("resources")).joinpath(vid_name))
 
                 if exist and self.force==True:
                     for v in os.listdir(vid_dir):
@@ -100,7 +104,9 @@ class VideoGenerator:
         for test in self.testList:
             for args in test:
                 print ("local:", self.cmd, args, "\n\n", flush=True)
-                subprocess.run(f"{self.cmd} {args}", shell=True)  
+                recordFile = self.recordFiles.get(args)
+                ResourceMonitor.clearRecord(recordFile)
+                ResourceMonitor.MonitoredProcess(f"{self.cmd} {args}", recordFile=recordFile, shell=True).wait()
         
     def toFile(self, path):
         fpath=Path(path)
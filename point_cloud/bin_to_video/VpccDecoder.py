@@ -22,12 +22,15 @@ from ConfigManager import ConfigManager
 commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
 sys.path.append(str(Path(commonDir)))
 import utils
+import ResourceMonitor
 
 class VpccDecoder:
 
     def __init__ (self, config_manager:ConfigManager, test=None, force=False):
         self.cmd = utils.pathStr(config_manager.pcc_dec)
         self.argList=[]
+        # resource usage record of each decoding
+        self.recordFiles={}
         self.force=force
 
         if (not test==None):
@@ -56,6 +59,7 @@ class VpccDecoder:
                 ])
 
                 self.argList.append(cmdArgs)
+                self.recordFiles[cmdArgs] = ResourceMonitor.getRecordFile(output_dir.joinpath(f"{name}_decoder"))
             else:
                 print(f"[Decoder] | test {name} skipped, output folder already exists")
         else:
@@ -65,7 +69,9 @@ class VpccDecoder:
         for args in self.argList:
             print ("local:", self.cmd, args, "\n", flush=True)
             cmd = f"{self.cmd} {args}"
-            subprocess.run(cmd, shell=True)   
+            recordFile = self.recordFiles.get(args)
+            ResourceMonitor.clearRecord(recordFile)
+            ResourceMonitor.MonitoredProcess(cmd, recordFile=recordFile, shell=True).wait()
                 
     def toFile(self, path):
         fpath=Path(path)
@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Resource usage of the tools (encoder, decoder, mm, renderer): a tool is run as a
+# MonitoredProcess, a subprocess.Popen reaped by wait4 such that its rusage is read when it ends
+# (wall, user and system times, max RSS, blocks read and written), while a thread samples the
+# process tree of the tool in /proc (CPU used, RSS and I/O bytes of the tool and its children).
+# The record of each process is appended to a JSON file next to the log of the stage:
+# {"processes": [{"cmd", "host", "start", "returncode", "wall", "user", "sys", "cpu", "maxRss",
+# "peakRss", "readBytes", "writeBytes", "timeline": {"time", "cpu", "rss", "readBytes", "writeBytes"}}]}
+# The times are in seconds, the memories in KB, "cpu" is the number of cores used in average
+# (user + sys over wall): close to the number of threads of a CPU bound stage, low for an I/O
+# bound one. "maxRss" is the one of wait4, which also counts the memory of the spawning process
+# at the time of the fork when it is larger (the rusage is inherited by fork and exec), "peakRss"
+# is the largest sampled RSS of the process tree. Without wait4 or /proc (Windows) the process is
+# waited for as usual and only the wall time is recorded.
+
+import os, json, time, shlex, socket, threading, subprocess
+from datetime import datetime
+from pathlib import Path
+
+SAMPLE_INTERVAL = 1.0
+# the timeline of a long process is thinned out (every other sample removed and the interval
+# doubled) each time it reaches this number of samples
+MAX_SAMPLES = 2048
+# the wait4 block counts are in 512 bytes units
+BLOCK_SIZE = 512
+
+PROC_DIR = Path("/proc")
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+recordLock = threading.Lock()
+
+def getRecordFile(logFile):
+    logFile = Path(logFile)
+    return logFile.with_name("".join([logFile.stem, "_resources.json"]))
+
+def hasProc():
+    return PROC_DIR.joinpath("self", "stat").exists()
+
+# (parent pid, CPU ticks, RSS in KB) of a process, the CPU ticks include the ones of the children
+# it reaped such that the CPU used by the tree does not drop when a child ends
+def readStat(pid):
+    data = PROC_DIR.joinpath(str(pid), "stat").read_text()
+    # the fields after the command name, which may hold spaces and parentheses
+    fields = data[data.rindex(")") + 2:].split()
+    return int(fields[1]), sum(int(field) for field in fields[11:15]), int(fields[21]) * PAGE_SIZE // 1024
+
+# (bytes read, bytes written) from the storage by a process and the children it reaped
+def readIo(pid):
+    values = {}
+    try:
+        for line in PROC_DIR.joinpath(str(pid), "io").read_text().splitlines():
+            key, value = line.split(":")
+            values[key] = int(value)
+    except (OSError, ValueError):
+        pass
+    return values.get("read_bytes", 0), values.get("write_bytes", 0)
+
+# {pid: (CPU ticks, RSS)} of a process and its descendants
+def readTree(rootPid):
+    stats = {}
+    children = {}
+    for entry in os.listdir(PROC_DIR):
+        if not entry.isdigit():
+            continue
+        try:
+            ppid, ticks, rss = readStat(entry)
+        except (OSError, ValueError, IndexError):
+            # ended since listed
+            continue
+        stats[int(entry)] = (ticks, rss)
+        children.setdefault(ppid, []).append(int(entry))
+    tree = {}
+    pending = [rootPid]
+    while pending:
+        pid = pending.pop()
+        if pid in stats:
+            tree[pid] = stats[pid]
+            pending.extend(children.get(pid, []))
+    return tree
+
+class Sampler(threading.Thread):
+
+    def __init__ (self, pid, interval=SAMPLE_INTERVAL):
+        super().__init__(daemon=True)
+        self.pid       = pid
+        self.interval  = interval
+        self.stopped   = threading.Event()
+        self.timeline  = {"time": [], "cpu": [], "rss": [], "readBytes": [], "writeBytes": []}
+        self.peakRss   = 0
+        self.startTime = time.perf_counter()
+
+    def sample(self, lastTime, lastTicks):
+        tree = readTree(self.pid)
+        if not tree:
+            return lastTime, lastTicks
+        now = time.perf_counter()
+        ticks = sum(ticks for ticks, rss in tree.values())
+        rss = sum(rss for ticks, rss in tree.values())
+        io = [readIo(pid) for pid in tree]
+        self.peakRss = max(self.peakRss, rss)
+        self.timeline["time"].append(round(now - self.startTime, 3))
+        self.timeline["cpu"].append(round(max(0, ticks - lastTicks) / CLOCK_TICKS / max(now - lastTime, 1e-6), 3))
+        self.timeline["rss"].append(rss)
+        self.timeline["readBytes"].append(sum(read for read, write in io))
+        self.timeline["writeBytes"].append(sum(write for read, write in io))
+        if len(self.timeline["time"]) >= MAX_SAMPLES:
+            for values in self.timeline.values():
+                del values[1::2]
+            self.interval *= 2
+        return now, ticks
+
+    def run(self):
+        lastTime, lastTicks = self.startTime, 0
+        while not self.stopped.wait(self.interval):
+            try:
+                lastTime, lastTicks = self.sample(lastTime, lastTicks)
+            except OSError:
+                pass
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+# subprocess.Popen recording its resource usage to recordFile when it ends
+class MonitoredProcess(subprocess.Popen):
+
+    def __init__ (self, cmd, recordFile=None, interval=SAMPLE_INTERVAL, **kwargs):
+        self.recordFile = recordFile
+        self.startDate  = datetime.now().isoformat(timespec="seconds")
+        self.startTime  = time.perf_counter()
+        super().__init__(cmd, **kwargs)
+        self.cmdLine    = cmd if isinstance(cmd, str) else shlex.join(str(arg) for arg in cmd)
+        self.isWait4    = hasattr(os, "wait4")
+        self.sampler    = Sampler(self.pid, interval) if self.isWait4 and hasProc() else None
+        if self.sampler:
+            self.sampler.start()
+
+    def poll(self):
+        if self.returncode is None and self.isWait4:
+            try:
+                pid, status, usage = os.wait4(self.pid, os.WNOHANG)
+            except ChildProcessError:
+                return self.returncode
+            if pid == self.pid:
+                self.finish(status, usage)
+            return self.returncode
+        if self.returncode is None and super().poll() is not None:
+            self.finish(None, None)
+        return self.returncode
+
+    def wait(self, timeout=None):
+        if self.returncode is None and self.isWait4:
+            if timeout is None:
+                pid, status, usage = os.wait4(self.pid, 0)
+                self.finish(status, usage)
+            else:
+                end = time.monotonic() + timeout
+                while self.poll() is None:
+                    if time.monotonic() >= end:
+                        raise subprocess.TimeoutExpired(self.args, timeout)
+                    time.sleep(min(0.05, max(0.0, end - time.monotonic())))
+            return self.returncode
+        if self.returncode is None:
+            super().wait(timeout)
+            self.finish(None, None)
+        return self.returncode
+
+    def finish(self, status, usage):
+        wall = time.perf_counter() - self.startTime
+        if status is not None:
+            self.returncode = os.waitstatus_to_exitcode(status)
+        if self.sampler:
+            self.sampler.stop()
+        if not self.recordFile:
+            return
+        record = {"cmd": self.cmdLine, "host": socket.gethostname(), "start": self.startDate,
+                  "returncode": self.returncode, "wall": round(wall, 3)}
+        if usage is not None:
+            record.update({"user": round(usage.ru_utime, 3), "sys": round(usage.ru_stime, 3),
+                           "cpu": round((usage.ru_utime + usage.ru_stime) / max(wall, 1e-6), 3),
+                           "maxRss": usage.ru_maxrss,
+                           "readBytes": usage.ru_inblock * BLOCK_SIZE, "writeBytes": usage.ru_oublock * BLOCK_SIZE})
+        if self.sampler:
+            record.update({"peakRss": self.sampler.peakRss, "timeline": self.sampler.timeline})
+        try:
+            addRecord(self.recordFile, record)
+        except OSError as e:
+            print("Resource record not written:", self.recordFile, e, flush=True)
+
+def readRecords(recordFile):
+    recordFile = Path(recordFile)
+    if not recordFile.exists():
+        return []
+    try:
+        return json.loads(recordFile.read_text()).get("processes", [])
+    except ValueError:
+        return []
+
+def addRecord(recordFile, record):
+    recordFile = Path(recordFile)
+    with recordLock:
+        records = readRecords(recordFile) + [record]
+        tmpFile = Path("".join([str(recordFile), ".tmp"]))
+        with open(tmpFile, 'w') as f:
+            json.dump({"processes": records}, f, indent=1)
+        os.replace(tmpFile, recordFile)
+    return recordFile
+
+# a stage starts its record when it is run again
+def clearRecord(recordFile):
+    if recordFile:
+        with recordLock:
+            Path(recordFile).unlink(missing_ok=True)
@@ -25,11 +25,11 @@ PURPLE = '\033[95m'
 ENDC  = '\033[m' # reset to the defaults
 
 
-def printArgs(args):
-    print(BLUE + "Argument values:")
+def printArgs(args, file=None):
+    print(BLUE + "Argument values:", file=file)
     for arg in vars(args):
-        print(BLUE + "  - %-20s = %s" % (arg, getattr(args, arg)))
-    print (ENDC, flush=True)
+        print(BLUE + "  - %-20s = %s" % (arg, getattr(args, arg)), file=file)
+    print (ENDC, file=file, flush=True)
 
 def str2bool(v):
     if isinstance(v, bool):           return v
@@ -0,0 +1,126 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import subprocess, sys, os, time, shlex, re
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+BACKENDS = ["local", "slurm", "fake-slurm"]
+TERMINAL_STATES = ["COMPLETED", "FAILED", "CANCELLED", "TIMEOUT", "OUT_OF_MEMORY", "NODE_FAIL", "PREEMPTED", "BOOT_FAIL", "DEADLINE"]
+
+ARRAY_TASK_SCRIPT = """#!/bin/bash
+# run the command at line SLURM_ARRAY_TASK_ID (starting at 0) of the command list given as argument
+cmd=$(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" "$1")
+eval "$cmd"
+"""
+
+# submit array jobs with dependencies through an sbatch like command line,
+# then poll their state and exit codes through an sacct like command line
+class BatchBackend:
+
+    def __init__ (self, submitCmd, queryCmd, workDir, pollInterval=30):
+        self.submitCmd    = submitCmd
+        self.queryCmd     = queryCmd
+        self.workDir      = utils.createPath(Path(workDir))
+        self.pollInterval = pollInterval
+        self.script       = self.workDir.joinpath("array_task.sh")
+
+        self.script.write_text(ARRAY_TASK_SCRIPT)
+        self.script.chmod(0o755)
+
+    # each command of cmdList becomes one task of the array, the dependency is given in sbatch
+    # syntax, e.g. "aftercorr:<jobId>" to start task i once task i of <jobId> is completed
+    def submitArray(self, jobName, cmdList, logDir, nbThreads=1, dependency=None):
+        cmdFile = self.workDir.joinpath("".join([jobName, ".cmds"]))
+        with open(cmdFile, 'w') as f:
+            for cmd in cmdList:
+                print(shlex.join(str(arg) for arg in cmd), file=f)
+
+        submit = self.submitCmd + [
+            "--parsable",
+            "".join(["--job-name=", jobName]),
+            "".join(["--array=0-", str(len(cmdList) - 1)]),
+            "".join(["--cpus-per-task=", str(nbThreads)]),
+            "".join(["--output=", utils.pathStr(Path(logDir).joinpath("".join([jobName, "_%a.log"])))]),
+            "--kill-on-invalid-dep=yes",
+        ]
+        if dependency:
+            submit.append("".join(["--dependency=", dependency]))
+        submit += [str(self.script), str(cmdFile)]
+
+        os.makedirs(logDir, exist_ok=True)
+        jobId = subprocess.check_output(submit, text=True).strip().split(";")[0]
+        print(utils.BLUE + "submitted:", jobName, "job", jobId, "(%d tasks)" % len(cmdList), "dependency:", dependency or "none", utils.ENDC, flush=True)
+        return jobId
+
+    # returns {(jobId, taskId): (state, exitCode)}
+    def query(self, jobIds):
+        output = subprocess.check_output(self.queryCmd + [
+            "--parsable2", "--noheader",
+            "--format=JobID,State,ExitCode",
+            "".join(["--jobs=", ",".join(jobIds)]),
+        ], text=True)
+
+        states = {}
+        for line in output.splitlines():
+            fields = line.strip().split("|")
+            if len(fields) < 3 or "." in fields[0] or "_" not in fields[0]:
+                continue
+            jobId, tasks = fields[0].split("_", 1)
+            state    = fields[1].split()[0] if fields[1] else "PENDING"
+            exitCode = int(fields[2].split(":")[0]) if fields[2] else 0
+            for taskId in self.parseTaskIds(tasks):
+                states[(jobId, taskId)] = (state, exitCode)
+        return states
+
+    # "4" or "[0-3,5%2]" (pending array tasks are grouped by sacct)
+    def parseTaskIds(self, tasks):
+        taskIds = []
+        for item in re.sub(r"%\d+", "", tasks.strip("[]")).split(","):
+            if "-" in item:
+                first, last = item.split("-")
+                taskIds += list(range(int(first), int(last) + 1))
+            elif item:
+                taskIds.append(int(item))
+        return taskIds
+
+    # jobs = {jobId: nbTasks}, block until every task reached a terminal state
+    def wait(self, jobs):
+        while True:
+            states = self.query(list(jobs.keys()))
+            nbDone = 0
+            nbTasks = 0
+            for jobId, nbJobTasks in jobs.items():
+                for taskId in range(nbJobTasks):
+                    nbTasks += 1
+                    state, exitCode = states.get((jobId, taskId), ("PENDING", 0))
+                    if state in TERMINAL_STATES:
+                        nbDone += 1
+            print(utils.BLUE + "batch: %d/%d tasks finished" % (nbDone, nbTasks), utils.ENDC, flush=True)
+            if nbDone == nbTasks:
+                return states
+            time.sleep(self.pollInterval)
+
+def getBatchBackend(name, workDir):
+    if name == "slurm":
+        return BatchBackend(["sbatch"], ["sacct"], workDir)
+    elif name == "fake-slurm":
+        fake = [sys.executable, str(Path(__file__).resolve().parent.joinpath("fake_sbatch.py")), "--spool", str(Path(workDir).joinpath("spool"))]
+        return BatchBackend(fake + ["sbatch"], fake + ["sacct"], workDir, pollInterval=1)
+    else:
+        raise ValueError("Unknown batch backend:", name)
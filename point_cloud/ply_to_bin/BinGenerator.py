@@ -13,22 +13,43 @@
 # See the License for the specific language governing permissions and limitations
 # under the License.
 #--------------------------------------------------------------------------------
-import traceback, subprocess, sys, argparse
+import traceback, sys, argparse, shlex, math
+from functools import partial
 from pathlib import Path
 
 commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
 sys.path.append(str(Path(commonDir)))
 import utils as utils
 
+import compute
+import CostModel
+import DiskBudget
+import MemoryModel
+from TaskScheduler import Task, TaskScheduler
+
 class BinGenerator:
 
-    def __init__ (self, config_manager, testInfo=None):
+    # taskOptions : options of compute.ComputeTask applied to every test (e.g. streamMetrics)
+    # batchRates  : the native metrics of the rates of a sequence are computed by a single task
+    # costHistory : output directories of previous campaigns training the cost model with the output directory
+    # diskMargin  : bytes kept free on the output volume by the admission of the decoders
+    # memoryBudget: bytes of RAM shared by the running stages, None for no limit
+    def __init__ (self, config_manager, testInfo=None, nbThreads=1, cacheDir=None, taskOptions=None, batchRates=False, costHistory=None, diskMargin=0, memoryBudget=None):
         
         self.config_manager = config_manager
+        self.cacheDir = cacheDir
+        self.taskOptions = dict(taskOptions or {})
+        self.batchRates = batchRates
+        self.costHistory = list(costHistory or [])
+        self.costModel = None
+        self.costFeatures = {}
+        self.diskMargin = diskMargin
+        self.memoryBudget = memoryBudget
+        self.memoryModel = None
         self.cmd = utils.pathStr(Path(config_manager.scriptDir).joinpath("compute.py"))
         
-        self.argList   = []
-        self.encParams = []
+        self.computeTasks = []
+        self.taskList     = []
 
         if (not testInfo==None):
             (seqId, name, fps, config, ply, condition, effectiveNbFrame, 
@@ -72,31 +93,35 @@ class BinGenerator:
                             taskIdx+=1
                             effectiveNbFrame = nbFrame
                             if maxNbFrame < int(nbFrame):
-                                print (frameworkUtils.RED, "available:", maxNbFrame, " asked:", nbFrame, frameworkUtils.ENDC)
+                                print (utils.RED, "available:", maxNbFrame, " asked:", nbFrame, utils.ENDC)
                                 effectiveNbFrame = maxNbFrame
                             self.addTest(seqId, name, fps, config, ply, 
                                          condition, effectiveNbFrame, rateId, geoQP, attQP, occPrec, 
                                          forceEnc, forceDec, forceMet, forceClean, 
-                                         testName, encoderParams)
+                                         testName, encoderParams, nbThreads, profile)
 
-        #print(self.argList)
     
     def addTest(self, seqId, name, fps, config, ply, 
                 condition, effectiveNbFrame, rateId, geoQP, attQP, occPrec, 
                 forceEnc, forceDec, forceMet, forceClean, 
-                testName, encoderParams, nbThreads = 1):
+                testName, encoderParams, nbThreads = 1, profile = None):
                    
-        cmdArgs,encParamsArgs = self.buildCmdArgs(seqId, name, fps, config, ply, 
+        computeTask = self.buildComputeTask(seqId, name, fps, config, ply, 
                                     condition, effectiveNbFrame, rateId, geoQP, attQP, occPrec, 
                                     forceEnc, forceDec, forceMet, forceClean, 
                                     testName, encoderParams, self.config_manager.tmc2Dir, self.config_manager.mmDir, nbThreads)
-        #print(taskIdx, "task=", cmdArgs)   
 
-        self.argList.append(cmdArgs)
-        self.encParams.append(encParamsArgs)
+        self.computeTasks.append(computeTask)
+        self.taskList.append({
+            'name'      : "".join([self.config_manager.getJobName(profile or testName, seqId, effectiveNbFrame, testName), "_R%04d" % int(rateId)]),
+            'nbThreads' : nbThreads,
+            'files'     : compute.getOutputFiles(self.config_manager.outputDir, seqId, effectiveNbFrame, condition, rateId, name, testName),
+            'force'     : {'encoder': forceEnc, 'decoder': forceDec, 'mm': forceMet},
+            'test'      : {'seqId': seqId, 'nbFrame': effectiveNbFrame, 'condition': condition, 'rateId': rateId, 'name': name, 'testName': testName},
+        })
 
-    ### Build command line args that call encode/decode/compute metrics process on grid or locally
-    def buildCmdArgs(self, seqId, name, fps, config, plyPath, 
+    ### Build the task that encode/decode/compute metrics, run in process or through the compute.py command line
+    def buildComputeTask(self, seqId, name, fps, config, plyPath, 
                      condition, nbFrame, rateId, geoQP, attQP, occPrec, 
                      forceEnc, forceDec, forceMet, forceClean, 
                      testName, encoderParams, tmc2Dir, mmDir, nbThreads = 1):
@@ -104,55 +129,228 @@ class BinGenerator:
         inputDir   = Path(plyPath).resolve(strict=True)
         seqCfgFile = Path(str(tmc2Dir), "cfg", "sequence", config).resolve(strict=True)  
         
-        testEncParams = "--encOptions="
-        testEncParams += "".join(["--geometryQP=", str(geoQP), " --attributeQP=", str(attQP), " --occupancyPrecision=", str(occPrec)])
+        encOptions = ["".join(["--geometryQP=", str(geoQP)]), "".join(["--attributeQP=", str(attQP)]), "".join(["--occupancyPrecision=", str(occPrec)])]
         for param in encoderParams:
-            testEncParams += " " + param
-
-        # build command's arguments
-        args = " ".join(
-                        [
-                        "-s", str(seqId), 
-                        "-o", str(self.config_manager.outputDir),
-                        "--name", name,
-                        "-i", str(inputDir),
-                        "--seqCfg", str(seqCfgFile),
-                        "-n", str(nbFrame),
-                        "-r", str(rateId), 
-                        "--condition", condition,
-                        "--nbThreads", str(nbThreads),
-                        "--tmc2Dir", str(tmc2Dir),
-                        "--mmDir", str(mmDir),
-                        "--forceEncode", str(forceEnc),
-                        "--forceDecode", str(forceDec),
-                        "--forceMetric", str(forceMet),
-                        "--forceClean", str(forceClean),
-                        "--testName", testName
-                        ])    
-
-        #print(args)
-        return args, testEncParams
-
-    def buildCmd(self, cmdArgs, encParams):
-
-        cmd = ['python', self.cmd]
-        for arg in cmdArgs.split():
-            #print(arg)
-            cmd.append(arg)
-        cmd.append(encParams)
-        return cmd
-
-    def run(self):
-        for idx, args in enumerate(self.argList) :
-            print ("local:", self.cmd, flush=True)
-            self.startLocalTask(args, self.encParams[idx])
-    
-    def startLocalTask(self, cmdArgs, encParams):
-        cmd = self.buildCmd(cmdArgs, encParams)
-        print(cmd)
-        print("running subprocess\n", flush=True)
-        subprocess.run(cmd)
-        print()
+            encOptions += shlex.split(param)
+
+        return compute.ComputeTask(
+                        seqId, seqCfgFile, name, inputDir, self.config_manager.outputDir, tmc2Dir, mmDir, testName,
+                        frameNumber=nbFrame, rate=rateId, condition=condition, nbThreads=nbThreads, encOptions=encOptions,
+                        forceEncode=forceEnc, forceDecode=forceDec, forceMetric=forceMet, forceClean=forceClean,
+                        cacheDir=Path(self.cacheDir).resolve() if self.cacheDir else "").withOptions(**self.taskOptions)
+
+    # compute.py command line of a test, options override the ones of the task (e.g. stage="mm")
+    def buildCmd(self, idx, **options):
+        return [sys.executable, self.cmd] + self.computeTasks[idx].withOptions(**options).toArgs()
+
+    # build the encoder -> decoder -> metrics graph of one test, decoder is single threaded and each
+    # metric family is an independent task using mmJobs processes, except geometry and colour sharing
+    # the mm pcc run (see compute.getMetricTasks, no metric task when withMetrics is False),
+    # the encoder waits for the tasks estimating the normals of its source (normalsTasks)
+    def buildStageTasks(self, idx, withMetrics=True, normalsTasks=None):
+        task  = self.taskList[idx]
+        computeTask = self.computeTasks[idx]
+        tasks = []
+        # a streaming decoder runs mm at the same time
+        decoderThreads = 2 if computeTask.isStreamed() else 1
+        for stage, nbThreads in [("encoder", task['nbThreads']), ("decoder", decoderThreads)]:
+            name    = "_".join([task['name'], stage])
+            cmd     = partial(compute.runTask, computeTask.withOptions(stage=stage))
+            logFile = Path(self.config_manager.cmdDir).joinpath("".join([name, ".log"]))
+            isDone  = None if task['force'][stage] else partial(compute.isStageDone, stage, task['files'], self.config_manager.journal)
+            if stage == "decoder" and isDone is not None:
+                isDone = partial(compute.isDecodedForMetrics, task['files'], self.config_manager.journal, computeTask.metrics, computeTask.metricSampling)
+            scratch = self.getDecodedScratch(idx) if stage == "decoder" else 0
+            tasks.append(Task(name, cmd, logFile, nbThreads, tasks[-1:] if tasks else list(normalsTasks or []), isDone, self.predictCost(idx, stage),
+                              scratch, str(task['files']['plyDecPath']).replace("%04d", "*"), self.predictStageMemory(idx, stage)))
+        decoderTask = tasks[-1:]
+        for stage, families in (compute.getMetricTasks(computeTask.metrics, computeTask.metricBackend) if withMetrics else []):
+            name    = "_".join([task['name'], stage])
+            cmd     = partial(compute.runTask, computeTask.withOptions(stage=stage))
+            logFile = Path(self.config_manager.cmdDir).joinpath("".join([name, ".log"]))
+            isDone  = None if task['force']['mm'] else partial(compute.isStageDone, stage, task['files'], self.config_manager.journal, families, sampling=computeTask.metricSampling)
+            tasks.append(Task(name, cmd, logFile, computeTask.mmJobs, decoderTask, isDone, self.predictMetricCost(idx, families, computeTask.mmJobs),
+                              memory=self.predictMetricMemory(idx, families, computeTask.mmJobs)))
+        return tasks
+
+    # features of the cost model of a test: frames, QPs and threads of the test and points of its first source frame
+    def getCostFeatures(self, idx):
+        if idx not in self.costFeatures:
+            computeTask = self.computeTasks[idx]
+            options = CostModel.parseOptions(" ".join(computeTask.encOptions))
+            startFrameNb, uncompressedDataPath, resolution = compute.readSequenceCfg(computeTask.seqCfgFile)
+            nbPoints = CostModel.readNbPoints(compute.getFramePath(Path(computeTask.inputDir).joinpath(uncompressedDataPath), startFrameNb))
+            self.costFeatures[idx] = CostModel.getFeatures(compute.getFrameNumber(computeTask), nbPoints or CostModel.DEFAULT_POINTS,
+                                                           options.get('geometryQP', 0), options.get('attributeQP', 0), computeTask.condition, computeTask.nbThreads)
+        return self.costFeatures[idx]
+
+    # predicted seconds of a stage of a test run by nbJobs threads or processes, None without cost model
+    def predictCost(self, idx, stage, nbJobs=1):
+        if self.costModel is None:
+            return None
+        features = self.getCostFeatures(idx)
+        if stage != "encoder":
+            features = dict(features, nbThreads=1)
+        return self.costModel.predict(stage, features) / (1 if stage == "encoder" else max(1, nbJobs))
+
+    # predicted seconds and peak bytes of a metric task computing families in one run: the largest
+    # ones of its families, the stages of the families computed together having the time and peak of the run
+    def predictMetricCost(self, idx, families, nbJobs=1):
+        if self.costModel is None:
+            return None
+        return max(self.predictCost(idx, compute.getMetricStage(family), nbJobs) for family in families)
+
+    def predictMetricMemory(self, idx, families, nbJobs=1):
+        return max(self.predictMemory(idx, compute.getMetricStage(family), nbJobs) for family in families)
+
+    # predicted peak bytes of a stage of a test run by nbJobs processes, 0 without memory model
+    def predictMemory(self, idx, stage, nbJobs=1):
+        if self.memoryModel is None:
+            return 0
+        features = self.getCostFeatures(idx)
+        test = self.taskList[idx]['test']
+        return self.memoryModel.predict(stage, test['seqId'], test['name'], features['condition'],
+                                        features['geoQP'], features['attQP'], features['nbPoints'], nbJobs)
+
+    # peak of the encoder and decoder tasks: the segments of an all intra encode run at the same time,
+    # a streaming decoder runs the metric families with it
+    def predictStageMemory(self, idx, stage):
+        computeTask = self.computeTasks[idx]
+        if stage == "encoder" and computeTask.isSegmented():
+            nbSegments = math.ceil(compute.getFrameNumber(computeTask) / computeTask.aiSegmentSize)
+            return self.predictMemory(idx, stage, min(nbSegments, computeTask.nbThreads))
+        if stage == "decoder" and computeTask.isStreamed():
+            return self.predictMemory(idx, stage) + sum(self.predictMemory(idx, compute.getMetricStage(family)) for family in computeTask.metrics)
+        return self.predictMemory(idx, stage)
+
+    # bytes of the decoded PLY of a test: frames x source points x bytes per point of a decoded frame
+    # of the test or of another rate when one is on disk, at most the scratch limit when streamed
+    def getDecodedScratch(self, idx):
+        files = self.taskList[idx]['files']
+        computeTask = self.computeTasks[idx]
+        decodedFiles = sorted(Path(files['compressedPath']).glob(Path(str(files['plyDecPath']).replace("%04d", "*")).name))
+        decodedFiles += sorted(Path(files['compressedPath']).glob("*_dec_*.ply")) if not decodedFiles else []
+        pointSize = (DiskBudget.getPointSize(decodedFiles[0]) if decodedFiles else None) or DiskBudget.DECODED_POINT_SIZE
+        frameSize = self.getCostFeatures(idx)['nbPoints'] * pointSize * DiskBudget.DECODED_HEADROOM
+        scratch = frameSize * compute.getFrameNumber(computeTask)
+        if computeTask.isStreamed() and computeTask.scratchLimit > 0:
+            scratch = min(scratch, computeTask.scratchLimit * 1024 * 1024 + frameSize)
+        return int(scratch)
+
+    def run(self, coreBudget=None):
+        # run the stages of all tests concurrently in this process, each stage output is streamed to its own log in cmdDir
+        scheduler = TaskScheduler(coreBudget, diskBudget=DiskBudget.DiskBudget(self.config_manager.outputDir, self.diskMargin), memoryBudget=self.memoryBudget)
+        self.costModel = CostModel.CostModel(CostModel.readSamples([self.config_manager.outputDir] + self.costHistory))
+        counts = self.costModel.getSampleCounts()
+        print(utils.BLUE + "Cost model: %d samples (%s)" % (len(self.costModel.samples), ", ".join("%s %d" % item for item in counts.items()) or "default rates"), utils.ENDC, flush=True)
+        if self.memoryBudget:
+            self.memoryModel = MemoryModel.MemoryModel(MemoryModel.readPeaks([self.config_manager.outputDir] + self.costHistory))
+            print(utils.BLUE + "Memory model: %d stage peaks of past runs" % self.memoryModel.getPeakCount(), utils.ENDC, flush=True)
+        interrupted = self.config_manager.journal.getStages("running")
+        if interrupted:
+            print(utils.BLUE + "Resume: %d stages were interrupted and are run again" % len(interrupted), utils.ENDC, flush=True)
+        groups = self.getRateGroups() if self.batchRates else []
+        batched = [idx for indices in groups for idx in indices]
+        normalsTasks = {}
+        for indices in self.getSourceGroups():
+            normalsTask = self.buildNormalsTask(indices[0])
+            scheduler.addTask(normalsTask)
+            normalsTasks.update({idx: [normalsTask] for idx in indices})
+        decoderTasks = {}
+        for idx in range(len(self.computeTasks)) :
+            for task in self.buildStageTasks(idx, idx not in batched, normalsTasks.get(idx)):
+                scheduler.addTask(task)
+                if task.name.endswith("_decoder"):
+                    decoderTasks[idx] = task
+        for indices in groups:
+            scheduler.addTask(self.buildBatchMetricsTask(indices, [decoderTasks[idx] for idx in indices]))
+        return scheduler.run()
+
+    # run the encoders of some tests alone (the probe encodes of RateMatcher.py), after the normals of their sources
+    def runEncoders(self, indices, coreBudget=None):
+        scheduler = TaskScheduler(coreBudget, memoryBudget=self.memoryBudget)
+        if self.memoryBudget and self.memoryModel is None:
+            self.memoryModel = MemoryModel.MemoryModel(MemoryModel.readPeaks([self.config_manager.outputDir] + self.costHistory))
+        normalsTasks = {}
+        for group in self.getSourceGroups(indices):
+            normalsTask = scheduler.addTask(self.buildNormalsTask(group[0]))
+            normalsTasks.update({idx: [normalsTask] for idx in group})
+        for idx in indices:
+            scheduler.addTask(self.buildStageTasks(idx, False, normalsTasks.get(idx))[0])
+        return scheduler.run()
+
+    # tests estimating the normals of the same source frames, estimated once before their encoders
+    def getSourceGroups(self, indices=None):
+        groups = {}
+        for idx, computeTask in enumerate(self.computeTasks):
+            if computeTask.estimateNormals and (indices is None or idx in indices):
+                groups.setdefault((computeTask.inputDir, computeTask.seqCfgFile, computeTask.frameNumber), []).append(idx)
+        return list(groups.values())
+
+    # task estimating the normals of the source of a test, done at once when the source has normals
+    def buildNormalsTask(self, idx):
+        computeTask = self.computeTasks[idx]
+        name    = "_".join([self.taskList[idx]['name'].rsplit("_R", 1)[0], "normals"])
+        cmd     = partial(compute.runTask, computeTask.withOptions(stage="normals"))
+        logFile = Path(self.config_manager.cmdDir).joinpath("".join([name, ".log"]))
+        return Task(name, cmd, logFile, computeTask.nbThreads, [], partial(compute.isNormalsDone, computeTask), self.predictCost(idx, "normals", computeTask.nbThreads),
+                    memory=self.predictMemory(idx, "normals"))
+
+    # tests whose metrics can be computed together: the rates of a sequence measured with the native
+    # backend (same output directory, frames and metric options), not streamed and not sampled
+    def getRateGroups(self):
+        groups = {}
+        for idx, computeTask in enumerate(self.computeTasks):
+            if computeTask.metricBackend != "native" or computeTask.isStreamed() or computeTask.metricSampling or computeTask.usesFrameCache():
+                continue
+            key = (str(self.taskList[idx]['files']['compressedPath']), computeTask.frameNumber, tuple(computeTask.metrics), computeTask.mmJobs)
+            groups.setdefault(key, []).append(idx)
+        return [indices for indices in groups.values() if len(indices) > 1]
+
+    # single metric task of the rates of a sequence, it waits for their decoders
+    def buildBatchMetricsTask(self, indices, decoderTasks):
+        name    = "_".join([self.taskList[indices[0]]['name'].rsplit("_R", 1)[0], "mm_batch"])
+        cmd     = partial(compute.runBatchMetrics, [self.computeTasks[idx].withOptions(stage="mm") for idx in indices])
+        logFile = Path(self.config_manager.cmdDir).joinpath("".join([name, ".log"]))
+        isForced = any(self.taskList[idx]['force']['mm'] for idx in indices)
+        isDone  = None if isForced else partial(self.isBatchMetricsDone, indices)
+        mmJobs  = self.computeTasks[indices[0]].mmJobs
+        cost    = sum(self.predictCost(idx, compute.getMetricStage(family), mmJobs) for idx in indices for family in self.computeTasks[idx].metrics) if self.costModel else None
+        memory  = max([self.predictMemory(idx, compute.getMetricStage(family), mmJobs) for idx in indices for family in self.computeTasks[idx].metrics], default=0)
+        return Task(name, cmd, logFile, mmJobs, decoderTasks, isDone, cost, memory=memory)
+
+    def isBatchMetricsDone(self, indices):
+        return all(compute.isStageDone("mm", self.taskList[idx]['files'], self.config_manager.journal, self.computeTasks[idx].metrics) for idx in indices)
+
+    # submit one array job per stage (or per test when granularity is "test") for the whole
+    # matrix at once, task i of a stage depends on task i of the previous stage
+    def runBatch(self, backend, granularity="stage"):
+        stages     = ["all"] if granularity == "test" else ["encoder", "decoder", "mm"]
+        stem       = Path(self.config_manager.testConfigJson).stem
+        jobs       = []
+        dependency = None
+        for stage in stages:
+            cmdList   = [self.buildCmd(idx, stage=stage) for idx in range(len(self.computeTasks))]
+            nbThreads = max(task['nbThreads'] for task in self.taskList) if stage in ("all", "encoder") else 1
+            if stage == "decoder" and any(ct.isStreamed() for ct in self.computeTasks):
+                nbThreads = 2
+            if stage == "mm":
+                nbThreads = max(ct.mmJobs for ct in self.computeTasks)
+            jobId     = backend.submitArray("_".join([stem, stage]), cmdList, self.config_manager.cmdDir, nbThreads, dependency)
+            dependency = "".join(["aftercorr:", jobId])
+            jobs.append((stage, jobId))
+
+        states = backend.wait({jobId: len(self.computeTasks) for stage, jobId in jobs})
+
+        isSuccess = True
+        print(utils.BLUE + "Batch summary:", utils.ENDC)
+        for idx, task in enumerate(self.taskList):
+            for stage, jobId in jobs:
+                state, exitCode = states.get((jobId, idx), ("UNKNOWN", None))
+                color = utils.GREEN if state == "COMPLETED" else utils.RED
+                isSuccess = isSuccess and state == "COMPLETED"
+                print(color + "  - %-50s job %s_%d %s exit=%s" % ("_".join([task['name'], stage]), jobId, idx, state, exitCode), utils.ENDC)
+        return isSuccess
 
 def parseArgs():
     global parser
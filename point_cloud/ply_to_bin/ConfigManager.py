@@ -21,6 +21,8 @@ commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
 sys.path.append(str(Path(commonDir)))
 import utils
 import install_deps 
+from JobJournal import JobJournal, getJournalFile
+import MmLog
 
 class ConfigManager:
 
@@ -49,6 +51,12 @@ class ConfigManager:
         # create directory to store command log, scripts
         self.cmdDir = Path(self.outputDir).joinpath("cmd")
         
+        # journal of the stages run in the output directory
+        self.journal = JobJournal(getJournalFile(self.outputDir))
+
+        # metric families computed for each test
+        self.metrics = MmLog.METRIC_FAMILIES
+        
         ####################################
         # READ AND FORMAT INPUT PARAMETERS #
         ####################################
@@ -150,20 +158,50 @@ class ConfigManager:
         outputPrefix    = self.getOutputPrefix(str(seqId), nbFrame, condition, str(rate), name)
         encoderLogFile  = compressedPath.joinpath("".join([outputPrefix, "_encoder.log"]))    
         decoderLogFile  = compressedPath.joinpath("".join([outputPrefix, "_decoder.log"]))  
-        mmLogFile       = compressedPath.joinpath("".join([outputPrefix, "_mm.log"]))
+        mmLogFile       = self.getLegacyMetricLogFile(profile, seqId, nbFrame, condition, rate, name)
+        mmLogFiles      = [f for f in self.getMetricLogFiles(profile, seqId, nbFrame, condition, rate, name).values() if f.exists()]
 
         if not encoderLogFile.exists():
             encoderLogFile = ""
         if not decoderLogFile.exists():
             decoderLogFile = ""
-        if not mmLogFile.exists():
-            mmLogFile = ""
-        return encoderLogFile, decoderLogFile, mmLogFile  
+        # the previous versions wrote all the families in a single log
+        if not mmLogFiles and mmLogFile.exists():
+            mmLogFiles = [mmLogFile]
+        return encoderLogFile, decoderLogFile, mmLogFiles
+
+    # log of each selected metric family, same naming than compute.getOutputFiles
+    def getMetricLogFiles(self, profile, seqId, nbFrame, condition, rate, name):
+        compressedPath  = self.getCompressedFilePath(profile, str(seqId), nbFrame, condition, name)
+        outputPrefix    = self.getOutputPrefix(str(seqId), nbFrame, condition, str(rate), name)
+        return {family: compressedPath.joinpath("".join([outputPrefix, "_mm_", family, ".log"])) for family in self.metrics}
 
-    def taskIsSuccess(self, forceEnc, forceDec, forceMet, encoderLogFile, decoderLogFile, mmLogFile):
-        isEncoded = self.isEncodeProcessSuccess(Path(encoderLogFile))
-        isDecoded = self.isDecodeProcessSuccess(Path(decoderLogFile))
-        isMetrics = self.isMetricProcessSuccess(Path(mmLogFile))
+    def getLegacyMetricLogFile(self, profile, seqId, nbFrame, condition, rate, name):
+        compressedPath  = self.getCompressedFilePath(profile, str(seqId), nbFrame, condition, name)
+        outputPrefix    = self.getOutputPrefix(str(seqId), nbFrame, condition, str(rate), name)
+        return compressedPath.joinpath("".join([outputPrefix, "_mm.log"]))
+
+    def getJournalKey(self, profile, seqId, nbFrame, condition, rate, name):
+        ## ! shall be the same than in compute.py named "journalKey"
+        compressedPath  = self.getCompressedFilePath(profile, str(seqId), nbFrame, condition, name)
+        outputPrefix    = self.getOutputPrefix(str(seqId), nbFrame, condition, str(rate), name)
+        return "/".join([compressedPath.parent.name, compressedPath.name, outputPrefix])
+
+    # the state of a stage is read from the journal, the log is only read when the journal does not know the stage
+    def stageIsSuccess(self, journalKey, stage, logFile, isProcessSuccess):
+        isDone = self.journal.isStageDone(journalKey, stage) if journalKey else None
+        if isDone is None:
+            isDone = isProcessSuccess(Path(logFile))
+        return isDone
+
+    # metricLogFiles = {family: log}, the metrics are done when every family is done or when the
+    # log of the previous versions (mmLogFile) is complete
+    def taskIsSuccess(self, forceEnc, forceDec, forceMet, encoderLogFile, decoderLogFile, metricLogFiles, journalKey=None, mmLogFile=None):
+        isEncoded = self.stageIsSuccess(journalKey, "encoder", encoderLogFile, self.isEncodeProcessSuccess)
+        isDecoded = self.stageIsSuccess(journalKey, "decoder", decoderLogFile, self.isDecodeProcessSuccess)
+        isMetrics = all(self.stageIsSuccess(journalKey, "_".join(["mm", family]), logFile, self.isMetricProcessSuccess) for family, logFile in metricLogFiles.items())
+        if not isMetrics and mmLogFile:
+            isMetrics = self.stageIsSuccess(journalKey, "mm", mmLogFile, self.isMetricProcessSuccess)
 
         if forceEnc or forceDec or forceMet:
             isSuccess = False
@@ -228,8 +266,11 @@ class ConfigManager:
                         effectiveNbFrame = maxNbFrame 
 
                     nbTests+=1
-                    encoderLogFile, decoderLogFile, mmLogFile  = self.getLogFiles(profile, seqId, str(effectiveNbFrame), condition, rateId, name)
-                    isSuccess, isEncoded, isDecoded, isMetrics = self.taskIsSuccess(False, False, False, encoderLogFile, decoderLogFile, mmLogFile)
+                    encoderLogFile, decoderLogFile, mmLogFiles  = self.getLogFiles(profile, seqId, str(effectiveNbFrame), condition, rateId, name)
+                    metricLogFiles = self.getMetricLogFiles(profile, seqId, str(effectiveNbFrame), condition, rateId, name)
+                    mmLogFile  = self.getLegacyMetricLogFile(profile, seqId, str(effectiveNbFrame), condition, rateId, name)
+                    journalKey = self.getJournalKey(profile, seqId, str(effectiveNbFrame), condition, rateId, name)
+                    isSuccess, isEncoded, isDecoded, isMetrics = self.taskIsSuccess(False, False, False, encoderLogFile, decoderLogFile, metricLogFiles, journalKey, mmLogFile)
                     if isSuccess:
                         nbSuccess+=1
                     #print(encoderLogFile, ":", isSuccess, isEncoded, isDecoded, isMetrics)
@@ -0,0 +1,137 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Runtime model of the stages of a test (encoder, decoder, metric families) trained on the tests
+# already run in output directories, used to start the longest tasks first and to predict the
+# makespan of a campaign. The features of a test are read from its command log (QPs and threads)
+# and its encoder log (frames and source points, see ExtractMetrics), the times of its stages are
+# the "Processing time (wall)" of the encoder and decoder logs and the "Time on overall processing"
+# of the mm logs. The logarithm of the time per frame and point of a stage is a ridge regression
+# on the QPs, the condition, the size and the threads of the tests: with a few samples it gives
+# the mean rate of the stage, the other features are weighted as samples are added. A stage
+# without sample uses a default rate.
+
+import re, math
+from pathlib import Path
+
+import numpy as np
+
+import ExtractMetrics
+import MmLog
+
+# seconds per frame and source point of a single threaded stage, rough values of vox10 sequences
+DEFAULT_RATES = {"encoder": 1e-4, "decoder": 2e-6, "normals": 1e-6, "mm_geometry": 3e-6, "mm_color": 2e-6, "mm_pcqm": 1e-5}
+DEFAULT_POINTS = 1000000
+# weight of the ridge penalty on the standardized features
+RIDGE = 1.0
+TIME_UNITS = {"": 1.0, "s": 1.0, "ms": 1e-3, "us": 1e-6}
+
+LOG_PATTERN = re.compile(r"^S\d+C2(AI|RA)R\d+_.+_encoder\.log$")
+OPTION_PATTERN = re.compile(r"--(geometryQP|attributeQP|nbThread)=(\S+)")
+
+# {option: value} of the geometryQP, attributeQP and nbThread options of an encoder command line
+def parseOptions(cmdLine):
+    return {match.group(1): match.group(2) for match in OPTION_PATTERN.finditer(cmdLine)}
+
+def getFeatures(nbFrame, nbPoints, geoQP, attQP, condition, nbThreads=1):
+    return {'nbFrame': max(1, int(nbFrame)), 'nbPoints': max(1, int(nbPoints)), 'geoQP': float(geoQP), 'attQP': float(attQP),
+            'condition': condition, 'nbThreads': max(1, int(nbThreads))}
+
+def getVector(features):
+    return [features['geoQP'], features['attQP'], 1.0 if features['condition'] == "AI" else 0.0,
+            math.log(features['nbFrame'] * features['nbPoints']), math.log(features['nbThreads'])]
+
+# number of points of a PLY file from its header, None when it cannot be read
+def readNbPoints(plyFile):
+    try:
+        with open(plyFile, 'rb') as f:
+            for line in f:
+                line = line.decode('ascii', errors='ignore').strip()
+                if line.startswith("element vertex"):
+                    return int(line.split()[2])
+                if line == "end_header":
+                    break
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+def readTime(logFile):
+    time, unit = MmLog.parseTime(Path(logFile).read_text(errors="ignore").splitlines())
+    return time * TIME_UNITS.get(unit, 1.0) if time is not None else None
+
+# samples [(stage, features, seconds)] of the tests of output directories (F<frames>_<test>/S<seq>C2<condition>_<name>)
+def readSamples(outputDirs):
+    samples = []
+    for outputDir in outputDirs:
+        for encoderFile in sorted(Path(outputDir).glob("*/*/*_encoder.log")):
+            match = LOG_PATTERN.match(encoderFile.name)
+            cmdFile = encoderFile.with_name(encoderFile.name.replace("_encoder.log", "_command.log"))
+            if not match or not cmdFile.exists():
+                continue
+            options = parseOptions(cmdFile.read_text(errors="ignore"))
+            try:
+                nbFrame, nbPoints = ExtractMetrics.extract_sizes(encoderFile)
+                if nbFrame == 0 or nbPoints == 0 or "geometryQP" not in options or "attributeQP" not in options:
+                    continue
+                features = getFeatures(nbFrame, nbPoints // nbFrame, options['geometryQP'], options['attributeQP'], match.group(1), options.get('nbThread', 1))
+                times = {"encoder": float(ExtractMetrics.extract_tool_times(encoderFile)[0][0])}
+                decoderFile = encoderFile.with_name(encoderFile.name.replace("_encoder.log", "_decoder.log"))
+                if decoderFile.exists():
+                    times["decoder"] = float(ExtractMetrics.extract_tool_times(decoderFile)[0][0])
+                for family in MmLog.METRIC_FAMILIES:
+                    mmFile = encoderFile.with_name(encoderFile.name.replace("_encoder.log", "_mm_%s.log" % family))
+                    if mmFile.exists():
+                        times["_".join(["mm", family])] = readTime(mmFile)
+            except (OSError, ValueError, IndexError):
+                continue
+            for stage, seconds in times.items():
+                if seconds:
+                    samples.append((stage, features if stage == "encoder" else dict(features, nbThreads=1), seconds))
+    return samples
+
+class CostModel:
+
+    def __init__ (self, samples=None):
+        self.samples = list(samples or [])
+        # stage: (mean, scale, weights, intercept) of the regression on the standardized features
+        self.models  = {}
+        for stage in sorted(set(stage for stage, features, seconds in self.samples)):
+            self.fit(stage, [(features, seconds) for sampleStage, features, seconds in self.samples if sampleStage == stage])
+
+    def fit(self, stage, samples):
+        vectors = np.array([getVector(features) for features, seconds in samples])
+        rates = np.log([seconds / (features['nbFrame'] * features['nbPoints']) for features, seconds in samples])
+        mean = vectors.mean(axis=0)
+        scale = vectors.std(axis=0)
+        scale[scale == 0] = 1.0
+        normalized = (vectors - mean) / scale
+        intercept = rates.mean()
+        weights = np.linalg.solve(normalized.T @ normalized + RIDGE * np.eye(normalized.shape[1]), normalized.T @ (rates - intercept))
+        self.models[stage] = (mean, scale, weights, intercept)
+
+    # predicted seconds of a stage
+    def predict(self, stage, features):
+        size = features['nbFrame'] * features['nbPoints']
+        if stage not in self.models:
+            return DEFAULT_RATES.get(stage, DEFAULT_RATES["mm_geometry"]) * size / (features['nbThreads'] if stage == "encoder" else 1)
+        mean, scale, weights, intercept = self.models[stage]
+        return math.exp(intercept + float(((np.array(getVector(features)) - mean) / scale) @ weights)) * size
+
+    def getSampleCounts(self):
+        counts = {}
+        for stage, features, seconds in self.samples:
+            counts[stage] = counts.get(stage, 0) + 1
+        return counts
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Admission control of the stages writing large files in the output directory (the decoded PLY):
+# a stage reserves its scratch footprint (frames x points x bytes per point of its PLY format)
+# when it starts, and it is only started when the free space of the volume less the margin and
+# the part of the other reservations not written yet holds it. A reservation is released by the
+# scheduler once its stage and the stages reading its files ended (the metric stages, which
+# remove the decoded PLY with forceClean).
+
+import os, glob, shutil
+from pathlib import Path
+
+PLY_TYPE_SIZES = {"char": 1, "uchar": 1, "int8": 1, "uint8": 1, "short": 2, "ushort": 2, "int16": 2, "uint16": 2,
+                  "int": 4, "uint": 4, "int32": 4, "uint32": 4, "float": 4, "float32": 4, "double": 8, "float64": 8}
+# bytes per point of a decoded frame before one is written: TMC2 writes ASCII PLY with integer
+# coordinates and 8 bits colours, at most "2047 2047 2047 255 255 255\n"
+DECODED_POINT_SIZE = 28
+# a decoded frame can have more points than its source (duplicate points)
+DECODED_HEADROOM = 1.1
+
+# bytes per point of a PLY file: its size over its points for an ASCII file (the values have no
+# fixed size), the size of the properties of a binary file, None when it cannot be read
+def getPointSize(plyFile):
+    nbPoints = None
+    pointSize = 0
+    isAscii = False
+    try:
+        with open(plyFile, 'rb') as f:
+            for line in f:
+                words = line.decode('ascii', errors='ignore').split()
+                if words[:1] == ["format"]:
+                    isAscii = words[1] == "ascii"
+                elif words[:2] == ["element", "vertex"]:
+                    nbPoints = int(words[2])
+                elif words[:1] == ["property"] and nbPoints is not None:
+                    pointSize += PLY_TYPE_SIZES.get(words[1], 4)
+                elif words[:1] == ["element"]:
+                    # the properties of the other elements (faces) are not counted
+                    nbPoints = nbPoints if nbPoints is not None else 0
+                elif words == ["end_header"]:
+                    break
+    except (OSError, ValueError, IndexError):
+        return None
+    if not nbPoints:
+        return None
+    return Path(plyFile).stat().st_size / nbPoints if isAscii else pointSize
+
+# size in bytes of a glob pattern (e.g. the "%04d" frames of a sequence with "*")
+def getWrittenSize(pattern):
+    size = 0
+    for path in glob.glob(pattern):
+        try:
+            size += os.path.getsize(path)
+        except OSError:
+            pass
+    return size
+
+def formatSize(nbBytes):
+    return "%.1f GB" % (nbBytes / 1024**3) if nbBytes >= 1024**3 else "%.1f MB" % (nbBytes / 1024**2)
+
+class DiskBudget:
+
+    # path   : a directory of the volume
+    # margin : bytes kept free on the volume
+    def __init__ (self, path, margin=0):
+        self.path         = Path(path)
+        self.margin       = max(0, int(margin))
+        # name: (bytes, glob pattern of the written files)
+        self.reservations = {}
+        self.available    = None
+
+    # space that can be reserved: free space less the margin and the part of the reservations not written yet
+    def update(self):
+        os.makedirs(self.path, exist_ok=True)
+        self.available = shutil.disk_usage(self.path).free - self.margin - self.getOutstanding()
+        return self.available
+
+    def getOutstanding(self):
+        return sum(max(0, nbBytes - getWrittenSize(pattern)) for nbBytes, pattern in self.reservations.values())
+
+    def fits(self, nbBytes):
+        if self.available is None:
+            self.update()
+        return nbBytes <= self.available
+
+    def reserve(self, name, nbBytes, pattern):
+        if self.available is None:
+            self.update()
+        self.reservations[name] = (int(nbBytes), str(pattern))
+        self.available -= int(nbBytes)
+
+    def release(self, name):
+        return self.reservations.pop(name, None) is not None
+
+    def getReserved(self):
+        return sum(nbBytes for nbBytes, pattern in self.reservations.values())
+
+    def getStatus(self):
+        return "disk reserved %s by %d stages, available %s" % (formatSize(self.getReserved()), len(self.reservations), formatSize(max(0, self.available or 0)))
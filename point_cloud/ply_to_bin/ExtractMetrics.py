@@ -28,9 +28,100 @@ def parseArgs():
     parser = argparse.ArgumentParser(description='Extract metrics from encoding, decoding and mmetrics log files')
     parser.add_argument('--encoderFile', help="Input encoder log file")
     parser.add_argument('--decoderFile', help="Input decoder log file")
-    parser.add_argument('--mmFile',      help="Input mm log file")
+    parser.add_argument('--mmFile',      help="Input mm log files, one per metric family or a single one", nargs='+')
     return parser.parse_args()
 
+# metrics of mm log files (one per metric family or a single one) written into results, the lists
+# of extract_metrics: D1, D2, c[0], c[1], c[2] PSNRF at column 2, PCQM and PCQM-PSNR, CI95 and sampled frames
+def extract_mm_metrics(mmLogfile, results=None):
+    if results is None:
+        results = [[0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0,0]]
+        results += [["", "", "", "", "", ""], [""]]
+    for mmFile in (mmLogfile if isinstance(mmLogfile, (list, tuple)) else [mmLogfile]):
+        with open(mmFile, 'r') as mmlogfile:
+            for line in mmlogfile:
+                if 'mseF, PSNR(p2point) Mean=' in line:
+                    words = line.split("=")
+                    results[0][2] = float(words[1])
+                elif 'mseF, PSNR(p2plane) Mean=' in line:
+                    words = line.split("=")
+                    results[1][2] = float(words[1])
+                elif 'c[0],PSNRF          Mean=' in line:
+                    words = line.split("=")
+                    results[2][2] = float(words[1])
+                elif 'c[1],PSNRF          Mean=' in line:
+                    words = line.split("=")
+                    results[3][2] = float(words[1])
+                elif 'c[2],PSNRF          Mean=' in line:
+                    words = line.split("=")
+                    results[4][2] = float(words[1])
+                elif 'PCQM Mean=' in line:
+                    words = line.split("=")
+                    results[6][0] = float(words[1])
+                elif 'PCQM-PSNR Mean=' in line:
+                    words = line.split("=")
+                    results[6][1] = float(words[1])
+                elif 'CI95=' in line:
+                    for idx, label in enumerate(['mseF, PSNR(p2point) ', 'mseF, PSNR(p2plane) ', 'c[0],PSNRF          ', 'c[1],PSNRF          ', 'c[2],PSNRF          ', 'PCQM-PSNR ']):
+                        if line.startswith(label):
+                            results[7][idx] = float(line.split("=")[1])
+                elif line.startswith('# sampled frames'):
+                    words = line.split(":")[-1].split()
+                    results[8][0] = int(words[0])
+    return results
+
+# processing times (wall, user.self, user.children) and peak memory printed by a TMC2 tool in its log
+def extract_tool_times(logFile):
+    times = [0, 0, 0]
+    memory = 0
+    with open(logFile, 'r') as outlogfile:
+        for line in outlogfile:
+            if 'Processing time (wall):' in line:
+                words = line.split()
+                times[0] =  words[3]
+            elif 'Processing time (user.self):' in line:
+                words = line.split()
+                times[1] =  words[3]
+            elif 'Processing time (user.children):' in line:
+                words = line.split()
+                times[2] =  words[3]
+            elif 'Peak memory:' in line:
+                words = line.split()
+                memory =  words[2]
+    return times, memory
+
+# number of frames and of source points (summed over the frames) of an encoder log
+def extract_sizes(encLogfile):
+    nbFrame = 0
+    nbPoints = 0
+    with open(encLogfile, 'r') as outlogfile:
+        for line in outlogfile:
+            if 'frameCount                                 '    in line:
+                words = line.split()
+                nbFrame += int(words[1])
+            elif 'Point cloud sizes'   in line:
+                words = line.split()
+                nbPoints += int(words[12].replace(",",""))
+    return nbFrame, nbPoints
+
+# number of frames and bytes of the bitstream of an encoder log
+def extract_total(encLogfile):
+    nbFrame = 0
+    total = 0
+    with open(encLogfile, 'r') as outlogfile:
+        for line in outlogfile:
+            if 'frameCount                                 '    in line:
+                words = line.split()
+                nbFrame += int(words[1])
+            elif '  Total:            ' in line:
+                words = line.split()
+                total += int(words[1])
+    return nbFrame, total
+
+# bitrate in Mbps of a bitstream of total bytes coding nbFrame frames at fps frames per second
+def getBitrate(total, fps, nbFrame):
+    return int(total)*8 * int(fps) / int(nbFrame) / 1000000
+
 def extract_metrics(encLogfile, decLogfile, mmLogfile=""):
     metadata = 0
     geometry = 0
@@ -41,6 +132,8 @@ def extract_metrics(encLogfile, decLogfile, mmLogfile=""):
     decodingTimes = [0, 0, 0]
     memory = [0, 0]
     results = [[0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0, 0, 0], [0,0]]
+    # mm logs of sampled frames: 95% confidence interval of D1, D2, c[0], c[1], c[2], PCQM-PSNR and number of sampled frames
+    results += [["", "", "", "", "", ""], [""]]
     
     try:
         with open(encLogfile, 'r') as outlogfile:
@@ -80,20 +173,7 @@ def extract_metrics(encLogfile, decLogfile, mmLogfile=""):
                     words = line.split()
                     memory[0] =  words[2]
 
-        with open(decLogfile, 'r') as outlogfile:
-            for line in outlogfile:
-                if 'Processing time (wall):' in line:
-                    words = line.split()
-                    decodingTimes[0] =  words[3]
-                elif 'Processing time (user.self):' in line:
-                    words = line.split()
-                    decodingTimes[1] =  words[3]
-                elif 'Processing time (user.children):' in line:
-                    words = line.split()
-                    decodingTimes[2] =  words[3]
-                elif 'Peak memory:' in line:
-                    words = line.split()
-                    memory[1] =  words[2]
+        decodingTimes, memory[1] = extract_tool_times(decLogfile)
 
         if not mmLogfile:
             #print ("TMC2 should be taken")
@@ -153,29 +233,8 @@ def extract_metrics(encLogfile, decLogfile, mmLogfile=""):
             
         else:
             #print ("mm should be taken")
-            with open(mmLogfile, 'r') as mmlogfile:
-                for line in mmlogfile:
-                    if 'mseF, PSNR(p2point) Mean=' in line:
-                        words = line.split("=")
-                        results[0][2] = float(words[1])
-                    elif 'mseF, PSNR(p2plane) Mean=' in line:
-                        words = line.split("=")
-                        results[1][2] = float(words[1])
-                    elif 'c[0],PSNRF          Mean=' in line:
-                        words = line.split("=")
-                        results[2][2] = float(words[1])
-                    elif 'c[1],PSNRF          Mean=' in line:
-                        words = line.split("=")
-                        results[3][2] = float(words[1])
-                    elif 'c[2],PSNRF          Mean=' in line:
-                        words = line.split("=")
-                        results[4][2] = float(words[1])
-                    elif 'PCQM Mean=' in line:
-                        words = line.split("=")
-                        results[6][0] = float(words[1])
-                    elif 'PCQM-PSNR Mean=' in line:
-                        words = line.split("=")
-                        results[6][1] = float(words[1])
+            # one log per metric family or a single log with all of them
+            extract_mm_metrics(mmLogfile, results)
           
     except FileNotFoundError:
         print(utils.RED + "FileNotFoundError Exception:",encLogfile, "or", decLogfile, utils.ENDC)
@@ -198,6 +257,9 @@ def printMetrics(results, total, metadata, geometry, attribute, nbFrame, encodin
     print("\tPCQM                    = {:.7f}".format(results[6][0]));
     print("\tPCQM          (PSNR)    = {:.7f}".format(results[6][1]));
     print("\tNumPtOrg                =",results[5][0]);
+    if results[8][0] != "":
+        print("\tsampled frames          =",results[8][0]);
+        print("\tCI95 D1, D2, c[0], c[1], c[2], PCQM (PSNR) =",results[7]);
     print("\tNumPtDec                =",results[5][1]);
     print("\tMeanDup                 =",results[5][2]);
     print("\tEncTime (wall)          =",encodingTimes[0]);
@@ -212,12 +274,13 @@ def printMetrics(results, total, metadata, geometry, attribute, nbFrame, encodin
 def writeCsv(strSeq, condition, strRate, results, total, metadata, geometry, attribute, nbFrame, encodingTimes, decodingTimes, memory, bitrate, geoQP, attQP, occPrec, csvFile):
     #print("Metrics written to    :",csvFile)
     if not os.path.isfile(csvFile):
-        header = ['SeqId', 'CondId', 'RateId', 'nbFrame', 'NbInputPoints', 'NbOutputPoints', 'MeanOutputPoints', 'MeanDuplicatePoints', 'TotalBitstreamBits', 'geometryBits', 'metadataBits', 'attributeBits', 'D1Mean', 'D2Mean', 'LumaMean', 'CbMean', 'CrMean', 'PCQM', 'SelfEncoderRuntime', 'ChildEncoderRuntime', 'SelfDecoderRuntime', 'ChildDecoderRuntime', 'bitrate', 'geoQP', 'attQP', 'occPrec']
+        header = ['SeqId', 'CondId', 'RateId', 'nbFrame', 'NbInputPoints', 'NbOutputPoints', 'MeanOutputPoints', 'MeanDuplicatePoints', 'TotalBitstreamBits', 'geometryBits', 'metadataBits', 'attributeBits', 'D1Mean', 'D2Mean', 'LumaMean', 'CbMean', 'CrMean', 'PCQM', 'SelfEncoderRuntime', 'ChildEncoderRuntime', 'SelfDecoderRuntime', 'ChildDecoderRuntime', 'bitrate', 'geoQP', 'attQP', 'occPrec',
+                  'SampledFrames', 'D1MeanCI95', 'D2MeanCI95', 'LumaMeanCI95', 'CbMeanCI95', 'CrMeanCI95', 'PCQMCI95']
         with open(csvFile, 'w', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(header)
     
-    strResults = [strSeq, condition, strRate, nbFrame, results[5][0], results[5][1], results[5][1]/nbFrame, results[5][2]/nbFrame, total*8, geometry*8, metadata*8, attribute*8, results[0][2], results[1][2], results[2][2], results[3][2], results[4][2], results[6][1], encodingTimes[1], encodingTimes[2], decodingTimes[1], decodingTimes[2], bitrate, geoQP, attQP, occPrec]
+    strResults = [strSeq, condition, strRate, nbFrame, results[5][0], results[5][1], results[5][1]/nbFrame, results[5][2]/nbFrame, total*8, geometry*8, metadata*8, attribute*8, results[0][2], results[1][2], results[2][2], results[3][2], results[4][2], results[6][1], encodingTimes[1], encodingTimes[2], decodingTimes[1], decodingTimes[2], bitrate, geoQP, attQP, occPrec] + results[8] + results[7]
     with open(csvFile, 'a', newline='') as f:
         writer = csv.writer(f)
         writer.writerow(strResults)   
@@ -238,8 +301,9 @@ if __name__ == "__main__":
             raise ValueError("Check file :", args.encoderFile)
         if not os.path.exists(args.decoderFile) :
             raise ValueError("Check file :", args.decoderFile)
-        if not os.path.exists(args.mmFile) :
-            raise ValueError("Check file :", args.mmFile)
+        for mmFile in args.mmFile :
+            if not os.path.exists(mmFile) :
+                raise ValueError("Check file :", mmFile)
                     
         plt = platform.system()
         if plt == "Windows":
@@ -0,0 +1,211 @@
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import os, re, sys, csv, json, time, sqlite3
+from contextlib import closing
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+import MmLog
+
+FRAME_CACHE_FILE = "frames.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS frames (
+    frameKey TEXT NOT NULL PRIMARY KEY,
+    family   TEXT NOT NULL,
+    stats    TEXT NOT NULL,
+    time     REAL
+)
+"""
+
+# maximum number of keys in one query (SQLite limits the number of parameters)
+QUERY_SIZE = 500
+
+FRAME_PATTERN = "frame "
+# per frame values printed by mm: "compare --mode pcc" as pc_error ("   mse1,PSNR (p2point): <value>",
+# "   c[0],PSNR1         : <value>") and "compare --mode pcqm" ("PCQM-PSNR value is: <value>")
+MM_GEOMETRY_PATTERN = re.compile(r"^\s*(mse[12F])(,PSNR)?\s*\((p2point|p2plane)\)\s*:\s*(\S+)\s*$")
+MM_COLOR_PATTERN    = re.compile(r"^\s*(c\[[0-2]\]),\s*(PSNR)?\s*([12F])\s*:\s*(\S+)\s*$")
+MM_PCQM_PATTERN     = re.compile(r"^\s*(PCQM|PCQM-PSNR)\s+value\s+is\s*:\s*(\S+)\s*$")
+# frame range of the lines of a merged log (MmLog.mergeLogs) and of a range log (MmLog.getRangeLogFile)
+RANGE_PATTERN      = re.compile(r"^# frames (\d+)-(\d+)$")
+RANGE_NAME_PATTERN = re.compile(r"_(\d{4,})_(\d{4,})$")
+
+# Per frame metric values of the tests shared through the result cache directory: a row holds the
+# statistics of one metric family on one frame, keyed by a hash of the metric tools, the family and
+# the digests of the source and decoded frames. A frame decoded identically by several tests, or
+# measured again after a rerun, is only measured once and the sequence results are merged from
+# the cached frames, which also gives the per frame values of every test (its frame table).
+# The per frame values already found in logs and frame tables can be ingested.
+class FrameCache:
+
+    def __init__ (self, cacheDir, timeout=60):
+        self.dbFile  = Path(cacheDir).resolve().joinpath(FRAME_CACHE_FILE)
+        self.timeout = timeout
+        os.makedirs(self.dbFile.parent, exist_ok=True)
+        self.execute(SCHEMA)
+
+    def execute(self, query, params=(), many=False):
+        with closing(sqlite3.connect(str(self.dbFile), timeout=self.timeout)) as db:
+            with db:
+                if many:
+                    return db.executemany(query, params).fetchall()
+                return db.execute(query, params).fetchall()
+
+    # {frame key: {label: {stat: value}}} of the keys found in the cache
+    def get(self, frameKeys):
+        frameKeys = list(frameKeys)
+        found = {}
+        for start in range(0, len(frameKeys), QUERY_SIZE):
+            keys = frameKeys[start:start + QUERY_SIZE]
+            rows = self.execute("SELECT frameKey, stats FROM frames WHERE frameKey IN (%s)" % ",".join("?" * len(keys)), keys)
+            found.update({frameKey: json.loads(stats) for frameKey, stats in rows})
+        return found
+
+    # entries = {frame key: (family, {label: {stat: value}})}
+    def put(self, entries):
+        now = time.time()
+        self.execute("INSERT OR REPLACE INTO frames VALUES (?, ?, ?, ?)",
+                     [(frameKey, family, json.dumps(stats), now) for frameKey, (family, stats) in entries.items()], many=True)
+
+    # statistics of the frames of a sequence: frameKeys = {frame: {family: frame key}}, returns
+    # {frame: {label: {stat: value}}} of the frames whose families are all in the cache
+    def getFrames(self, frameKeys):
+        found = self.get(key for keys in frameKeys.values() for key in keys.values())
+        frames = {}
+        for frame, keys in frameKeys.items():
+            if all(key in found for key in keys.values()):
+                frames[frame] = {label: values for key in keys.values() for label, values in found[key].items()}
+        return frames
+
+    # store the statistics of frames: stats = {frame: {label: {stat: value}}}, the labels are
+    # split by family, a family without values in a frame is not stored
+    def putFrames(self, frameKeys, stats):
+        entries = {}
+        for frame, frameStats in stats.items():
+            for family, familyStats in splitFamilies(frameStats).items():
+                if family in frameKeys.get(frame, {}):
+                    entries[frameKeys[frame][family]] = (family, familyStats)
+        if entries:
+            self.put(entries)
+        return len(entries)
+
+    # store the per frame values found in logs or frame tables of the frames (see readFrameStats)
+    # whose families are not in the cache yet, returns the number of stored (frame, family)
+    def ingest(self, frameFiles, frameKeys, log=None, firstFrame=None):
+        found = self.get(key for keys in frameKeys.values() for key in keys.values())
+        nbStored = 0
+        for frameFile in frameFiles:
+            stats = readFrameStats(frameFile, firstFrame)
+            missing = {frame: {family: key for family, key in frameKeys[frame].items() if key not in found}
+                       for frame in stats if frame in frameKeys}
+            nbFrame = self.putFrames(missing, {frame: stats[frame] for frame in missing})
+            if nbFrame:
+                print(utils.GREEN + "Ingested %d frame values from" % nbFrame, frameFile, utils.ENDC, file=log or sys.stdout, flush=True)
+                found.update({key: None for keys in missing.values() for key in keys.values()})
+                nbStored += nbFrame
+        return nbStored
+
+# {family: {label: {stat: value}}} of the statistics of a frame
+def splitFamilies(stats):
+    families = {}
+    for label, values in stats.items():
+        family = MmLog.getFamily(label)
+        if family is not None:
+            families.setdefault(family, {})[label] = values
+    return families
+
+# per frame statistics {frame: {label: {"Mean": value}}} found in a file: a frame table of
+# ShardedMetrics/StreamingMetrics (only its single frame ranges), a log of PccMetrics with its
+# per frame values ("frame <n>" followed by "   <label>: <value>") or a log of mm (see
+# readMmFrames), firstFrame is the first frame of a mm log without frame range. The frame tables
+# of PccMetrics are not read, their labels lost the spacing of the mm labels.
+def readFrameStats(frameFile, firstFrame=None):
+    frameFile = Path(frameFile)
+    if not frameFile.exists():
+        return {}
+    if frameFile.suffix == ".csv":
+        return readFrameTable(frameFile)
+    lines = frameFile.read_text(errors="ignore").splitlines()
+    if not any(line.startswith(FRAME_PATTERN) for line in lines):
+        match = RANGE_NAME_PATTERN.search(frameFile.stem)
+        return readMmFrames(lines, int(match.group(1)) if match else firstFrame)
+    stats = {}
+    frameStats = None
+    for line in lines:
+        if line.startswith(FRAME_PATTERN) and line[len(FRAME_PATTERN):].strip().isdigit():
+            frameStats = stats.setdefault(int(line[len(FRAME_PATTERN):]), {})
+        elif frameStats is not None and line.startswith("   ") and ":" in line:
+            name, _, value = line.rpartition(":")
+            try:
+                frameStats[MmLog.getLabel(name)] = {"Mean": float(value)}
+            except ValueError:
+                frameStats = None
+        else:
+            frameStats = None
+    return stats
+
+# mm label and value of a per frame line of mm, (None, None) for the other lines
+def parseMmFrameLine(line):
+    match = MM_GEOMETRY_PATTERN.match(line)
+    if match:
+        name = "%s, PSNR(%s)" % (match.group(1), match.group(3)) if match.group(2) else "%s      (%s)" % (match.group(1), match.group(3))
+        value = match.group(4)
+    elif MM_COLOR_PATTERN.match(line):
+        match = MM_COLOR_PATTERN.match(line)
+        name = "%s,%s%s" % (match.group(1), "PSNR" if match.group(2) else "    ", match.group(3))
+        value = match.group(4)
+    elif MM_PCQM_PATTERN.match(line):
+        match = MM_PCQM_PATTERN.match(line)
+        name, value = match.group(1), match.group(2)
+    else:
+        return None, None
+    try:
+        return MmLog.getLabel(name), float(value)
+    except ValueError:
+        return None, None
+
+# per frame statistics of the lines of a mm log: mm prints the values of each frame in frame order
+# without the frame number, the n-th value of a label is the one of the n-th frame of the range
+# (from the "# frames <first>-<last>" lines of a merged log, or firstFrame)
+def readMmFrames(lines, firstFrame=None):
+    stats = {}
+    counts = {}
+    for line in lines:
+        match = RANGE_PATTERN.match(line)
+        if match:
+            firstFrame, counts = int(match.group(1)), {}
+            continue
+        label, value = parseMmFrameLine(line)
+        if label is None or firstFrame is None:
+            continue
+        frame = firstFrame + counts.get(label, 0)
+        counts[label] = counts.get(label, 0) + 1
+        stats.setdefault(frame, {})[label] = {"Mean": value}
+    return stats
+
+def readFrameTable(csvFile):
+    stats = {}
+    with open(csvFile, newline='') as f:
+        for row in csv.DictReader(f):
+            if row.get('FirstFrame') is None or row.get('FirstFrame') != row.get('LastFrame'):
+                continue
+            frame = row.pop('FirstFrame')
+            row.pop('LastFrame')
+            stats[int(frame)] = {MmLog.getLabel(name): {"Mean": float(value)} for name, value in row.items() if name and value not in ("", None)}
+    return stats
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Frame sampling of the metrics: the metrics of a sequence are estimated from a subset of its
+# frames, every k-th frame ("every:k") or one random frame in each of n strata of consecutive
+# frames ("random:n"), and each mean is reported with the half width of its 95% confidence
+# interval. The random frames only depend on the sampling and the frame range, such that every
+# rate of a sequence is measured on the same frames and the rates can be compared.
+
+import math, random
+
+SAMPLING_MODES = ["every", "random"]
+
+# 97.5% quantiles of the Student's t distribution for 1 to 30 degrees of freedom
+T_QUANTILES = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+               2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+               2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+Z_QUANTILE = 1.960
+
+# returns (mode, value) of a sampling such as "every:4" or "random:16", None for all the frames ("" or "all")
+def parseSampling(sampling):
+    if not sampling or sampling == "all":
+        return None
+    mode, _, value = sampling.partition(":")
+    if mode not in SAMPLING_MODES or not value.isdigit() or int(value) < 1:
+        raise ValueError("Unknown frame sampling, expected every:<k> or random:<n>:", sampling)
+    return mode, int(value)
+
+# frames of [firstFrame, firstFrame + nbFrame - 1] measured with the sampling
+def getSampledFrames(sampling, firstFrame, nbFrame):
+    frames = list(range(firstFrame, firstFrame + nbFrame))
+    parsed = parseSampling(sampling)
+    if parsed is None:
+        return frames
+    mode, value = parsed
+    if mode == "every":
+        return frames[::value]
+    if value >= nbFrame:
+        return frames
+    # one frame drawn in each stratum, the strata split the frames in value parts of (almost) the same size
+    rng = random.Random(":".join([sampling, str(firstFrame), str(nbFrame)]))
+    bounds = [firstFrame + (nbFrame * i) // value for i in range(value + 1)]
+    return [rng.randrange(bounds[i], bounds[i + 1]) for i in range(value)]
+
+def getQuantile(nbSample):
+    return T_QUANTILES[nbSample - 2] if nbSample - 1 <= len(T_QUANTILES) else Z_QUANTILE
+
+# half width of the 95% confidence interval of the mean of nbFrame frames estimated from the
+# values of the sampled frames, with the finite population correction (0 when all the frames are
+# measured, inf with a single frame)
+def getConfidence(values, nbFrame):
+    nbSample = len(values)
+    if nbSample >= nbFrame:
+        return 0.0
+    if nbSample < 2:
+        return math.inf
+    mean = sum(values) / nbSample
+    variance = sum((value - mean) ** 2 for value in values) / (nbSample - 1)
+    correction = (nbFrame - nbSample) / (nbFrame - 1)
+    return getQuantile(nbSample) * math.sqrt(variance / nbSample * correction)
@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import os, json, time, socket, sqlite3
+from contextlib import closing
+from pathlib import Path
+
+JOURNAL_FILE = "journal.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stages (
+    taskKey   TEXT NOT NULL,
+    stage     TEXT NOT NULL,
+    state     TEXT NOT NULL,
+    startTime REAL,
+    endTime   REAL,
+    exitCode  INTEGER,
+    host      TEXT,
+    pid       INTEGER,
+    artifacts TEXT,
+    sampling  TEXT,
+    PRIMARY KEY (taskKey, stage)
+)
+"""
+COLUMNS = ['taskKey', 'stage', 'state', 'startTime', 'endTime', 'exitCode', 'host', 'pid', 'artifacts', 'sampling']
+
+def getJournalFile(outputDir):
+    return Path(outputDir).joinpath(JOURNAL_FILE)
+
+# journal of the stages run in an output directory: one row per (task, stage) with its state
+# (running, done, failed), start/end time, exit code, host, artifacts (path, size, mtime) and
+# frame sampling of a metric stage (NULL for the other stages). Every update is one transaction, the rollback journal is used since WAL does not work on
+# network file systems.
+class JobJournal:
+
+    def __init__ (self, dbFile, timeout=60):
+        self.dbFile  = Path(dbFile)
+        self.timeout = timeout
+        os.makedirs(self.dbFile.parent, exist_ok=True)
+        self.execute(SCHEMA)
+        # journals written before the sampling was recorded
+        if "sampling" not in [row[1] for row in self.execute("PRAGMA table_info(stages)")]:
+            self.execute("ALTER TABLE stages ADD COLUMN sampling TEXT")
+
+    def execute(self, query, params=()):
+        with closing(sqlite3.connect(str(self.dbFile), timeout=self.timeout)) as db:
+            with db:
+                return db.execute(query, params).fetchall()
+
+    # sampling : frame sampling of a metric stage ("" for all the frames), None for the other stages
+    def startStage(self, taskKey, stage, artifacts, sampling=None):
+        self.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, 'running', ?, NULL, NULL, ?, ?, ?, ?)",
+                     (taskKey, stage, time.time(), socket.gethostname(), os.getpid(), json.dumps(self.statArtifacts(artifacts)), sampling))
+
+    def finishStage(self, taskKey, stage, exitCode, artifacts):
+        self.execute("UPDATE stages SET state = ?, endTime = ?, exitCode = ?, artifacts = ? WHERE taskKey = ? AND stage = ?",
+                     ("done" if exitCode == 0 else "failed", time.time(), exitCode, json.dumps(self.statArtifacts(artifacts)), taskKey, stage))
+
+    # record a stage found done without being run through the journal (e.g. from its log)
+    def recordStage(self, taskKey, stage, artifacts, sampling=None):
+        mtime = max(Path(path).stat().st_mtime for path in artifacts.values())
+        self.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, 'done', NULL, ?, 0, ?, NULL, ?, ?)",
+                     (taskKey, stage, mtime, socket.gethostname(), json.dumps(self.statArtifacts(artifacts)), sampling))
+
+    def getStage(self, taskKey, stage):
+        rows = self.execute("SELECT %s FROM stages WHERE taskKey = ? AND stage = ?" % ", ".join(COLUMNS), (taskKey, stage))
+        return self.rowToDict(rows[0]) if rows else None
+
+    def getStages(self, state=None):
+        if state is None:
+            rows = self.execute("SELECT %s FROM stages" % ", ".join(COLUMNS))
+        else:
+            rows = self.execute("SELECT %s FROM stages WHERE state = ?" % ", ".join(COLUMNS), (state,))
+        return [self.rowToDict(row) for row in rows]
+
+    # True when the stage is done (with this frame sampling when given) and its artifacts did not
+    # change since, False when it is running, failed, sampled otherwise or its artifacts changed,
+    # None when the stage, or the sampling of a done stage, is not in the journal
+    def isStageDone(self, taskKey, stage, sampling=None):
+        row = self.getStage(taskKey, stage)
+        if row is None:
+            return None
+        if row['state'] != "done":
+            return False
+        if sampling is not None and row['sampling'] is None:
+            return None
+        if sampling is not None and row['sampling'] != sampling:
+            return False
+        return all(self.statArtifact(artifact['path']) == artifact for artifact in row['artifacts'].values())
+
+    def statArtifacts(self, artifacts):
+        return {name: self.statArtifact(path) for name, path in artifacts.items()}
+
+    def statArtifact(self, path):
+        try:
+            stat = Path(path).stat()
+            return {'path': str(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
+        except FileNotFoundError:
+            return {'path': str(path), 'size': None, 'mtime': None}
+
+    def rowToDict(self, row):
+        values = dict(zip(COLUMNS, row))
+        values['artifacts'] = json.loads(values['artifacts'] or "{}")
+        return values
@@ -0,0 +1,113 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Peak memory of the stages of a test predicted from the runs of the same sequence, condition and
+# QPs found in output directories (the ones training CostModel.py): the "Peak memory" printed by
+# TMC2 in the encoder and decoder logs and the resource records of the stages (ResourceMonitor.py).
+# The peak of one process of a stage is kept, and multiplied by the processes the stage runs at the
+# same time (segments of an encode, shards of the metrics), which may differ from the past run. The
+# peak of a resource record is the sampled one of the process tree ("peakRss"): the "maxRss" of wait4
+# also counts the memory of the process spawning the tool (the scheduler, every stage being started
+# from one of its threads) and is not used. A stage not run with these QPs takes the largest peak of
+# the sequence and condition, a stage never run on the sequence a conservative default proportional
+# to the points of a frame.
+
+import re, sys
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import ResourceMonitor
+
+import ExtractMetrics
+import CostModel
+import MmLog
+
+# bytes per point of a source frame of a process of a stage never run on the sequence, TMC2 takes
+# a few GB for a vox10 frame of 1M points
+DEFAULT_MEMORY = {"encoder": 6144, "decoder": 2048, "normals": 1024, "mm": 1024}
+MIN_MEMORY = 512 * 1024 * 1024
+
+LOG_PATTERN = re.compile(r"^S(\d+)C2(AI|RA)R\d+_(.+)_encoder\.log$")
+
+# largest sampled peak (KB) of the process trees of a record, 0 when none was sampled (a tool
+# ending before the first sample)
+def getProcessPeak(records):
+    return max([record.get('peakRss') or 0 for record in records], default=0)
+
+# peak memory (KB) of a process of a stage from its log (TMC2 tools, the largest segment of a
+# segmented encode) and its resource record, 0 when unknown
+def readPeak(logFile, isTmc2=False):
+    peak = 0
+    if isTmc2 and Path(logFile).exists():
+        peak = int(float(ExtractMetrics.extract_tool_times(logFile)[1]))
+    return max(peak, getProcessPeak(ResourceMonitor.readRecords(ResourceMonitor.getRecordFile(logFile))))
+
+def getKey(seqId, name, condition, geoQP, attQP):
+    return (int(seqId), name, condition, float(geoQP), float(attQP))
+
+# {stage: {(seqId, name, condition, geoQP, attQP): peak of a process in KB}} of the tests of output directories
+def readPeaks(outputDirs):
+    peaks = {}
+    for outputDir in outputDirs:
+        for encoderFile in sorted(Path(outputDir).glob("*/*/*_encoder.log")):
+            match = LOG_PATTERN.match(encoderFile.name)
+            cmdFile = encoderFile.with_name(encoderFile.name.replace("_encoder.log", "_command.log"))
+            if not match or not cmdFile.exists():
+                continue
+            options = CostModel.parseOptions(cmdFile.read_text(errors="ignore"))
+            if "geometryQP" not in options or "attributeQP" not in options:
+                continue
+            key = getKey(match.group(1), match.group(3), match.group(2), options['geometryQP'], options['attributeQP'])
+            logFiles = [("encoder", encoderFile), ("decoder", encoderFile.with_name(encoderFile.name.replace("_encoder.log", "_decoder.log")))]
+            # the families computed together (streamed metrics) share the log and the record of their run
+            prefix = encoderFile.name[:-len("_encoder.log")]
+            for recordFile in encoderFile.parent.glob("%s_mm_*_resources.json" % prefix):
+                families = recordFile.name[len(prefix) + len("_mm_"):-len("_resources.json")].split("_")
+                logFiles += [("_".join(["mm", family]), recordFile.with_name("%s_mm_%s.log" % (prefix, "_".join(families)))) for family in families if family in MmLog.METRIC_FAMILIES]
+            for stage, logFile in logFiles:
+                try:
+                    peak = readPeak(logFile, stage in ("encoder", "decoder"))
+                except (OSError, ValueError, IndexError):
+                    continue
+                if peak > 0:
+                    stagePeaks = peaks.setdefault(stage, {})
+                    stagePeaks[key] = max(stagePeaks.get(key, 0), peak)
+    return peaks
+
+class MemoryModel:
+
+    def __init__ (self, peaks=None):
+        self.peaks = peaks or {}
+
+    # predicted peak in bytes of a stage of a test running nbJobs processes at the same time
+    def predict(self, stage, seqId, name, condition, geoQP, attQP, nbPoints, nbJobs=1):
+        return self.predictProcess(stage, seqId, name, condition, geoQP, attQP, nbPoints) * max(1, int(nbJobs))
+
+    # predicted peak in bytes of a process of a stage of a test
+    def predictProcess(self, stage, seqId, name, condition, geoQP, attQP, nbPoints):
+        stagePeaks = self.peaks.get(stage, {})
+        key = getKey(seqId, name, condition, geoQP, attQP)
+        if key in stagePeaks:
+            return stagePeaks[key] * 1024
+        sequencePeaks = [peak for peakKey, peak in stagePeaks.items() if peakKey[:3] == key[:3]]
+        if sequencePeaks:
+            return max(sequencePeaks) * 1024
+        rate = DEFAULT_MEMORY.get(stage, DEFAULT_MEMORY["mm"])
+        return max(MIN_MEMORY, int(rate * nbPoints))
+
+    def getPeakCount(self):
+        return sum(len(stagePeaks) for stagePeaks in self.peaks.values())
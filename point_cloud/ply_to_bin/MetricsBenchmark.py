@@ -0,0 +1,423 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Benchmark and accuracy suite of the metric backends: each metric family (geometry, color, pcqm)
+# is computed by each backend (mm and native, see compute.py) on synthetic voxelised clouds
+# of several sizes, on the small frames bundled in metrics_reference and on a few frames of the
+# sequences of sequences.json, with several numbers of jobs. Every run is a separate process whose wall time and peak RSS (including its workers) are
+# measured, its log is read by ExtractMetrics as the mm logs of the pipeline and the values are
+# compared with the ones of a mm reference log of the same frames. The reference logs are recorded
+# once with mm ("--reference record") together with the digests of the frames, the suite then runs
+# without mm ("--reference recorded"). The synthetic frames only depend on their size and number,
+# the bundled ones are fixed files such that their recorded logs (in metrics_reference too) hold
+# whatever the version of the generator. Besides synthetic ones, the bundled frames may be patches of
+# real frames ("SeqId" in the suite), written once from the sequences with "--bundle".
+
+import os, sys, csv, json, math, time, hashlib, argparse, subprocess
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+import MmLog
+import ExtractMetrics
+from compute import METRIC_BACKENDS, readSequenceCfg, extract_binary_ply_header
+from NormalEstimator import estimateNormals, writePly
+from PccMetrics import readPly
+
+REFERENCE_MODES = ["recorded", "record", "none"]
+# bundled frames (<name>/src_%04d.ply and <name>/dec_%04d.ply) and their recorded mm logs
+BUNDLED_DIR = Path(__file__).resolve().parent.joinpath("metrics_reference")
+# values compared with mm as read by ExtractMetrics: {family: [(name, row, column)]} of its results
+COMPARED_VALUES = {
+    "geometry": [("D1", 0, 2), ("D2", 1, 2)],
+    "color"   : [("Luma", 2, 2), ("Cb", 3, 2), ("Cr", 4, 2)],
+    "pcqm"    : [("PCQM", 6, 0), ("PCQM-PSNR", 6, 1)],
+    }
+# synthetic frames: bumpy sphere on a grid of at least 10 bits, directions drawn per point
+SYNTHETIC_BITS = 10
+SAMPLES_PER_POINT = 3
+BUMP = 0.15
+COLOR_PERIOD = 37.0
+COLOR_NOISE = 4.0
+# synthetic decoded frames: points dropped, points moved by one voxel, colour quantisation step
+DROPPED_RATIO = 0.1
+MOVED_RATIO = 0.3
+COLOR_STEP = 8
+
+CSV_HEADER = ['Case', 'NbFrame', 'NbPoints', 'Family', 'Backend', 'NbJobs', 'Time', 'PointsPerSecond', 'PeakRssMB', 'MaxDeviation']
+
+def parseArgs():
+    global parser
+    jsonDir = Path(__file__).resolve().parent.joinpath("jsons")
+    parser = argparse.ArgumentParser(description='Benchmark the metric backends (time, throughput, peak RSS) and their deviation versus mm on synthetic and real frames')
+    parser.add_argument('-o', '--outputDir',   help="Directory of the frames, logs and report (optional, default=metrics_benchmark)", default="metrics_benchmark", type=str)
+    parser.add_argument(      '--suite',       help="Suite description (optional, default=jsons/metrics_benchmark.json)", default=str(jsonDir.joinpath("metrics_benchmark.json")), type=str)
+    parser.add_argument(      '--sequences',   help="Sequence list of the real frames (optional, default=jsons/sequences.json)", default=str(jsonDir.joinpath("sequences.json")), type=str)
+    parser.add_argument(      '--cfgDir',      help="Directory of the sequence cfg files (optional, default=external_data/sequence_cfg)", default=str(Path(__file__).resolve().parent.joinpath("../external_data/sequence_cfg")), type=str)
+    parser.add_argument(      '--bundledDir',  help="Directory of the bundled frames, none to skip them (optional, default=metrics_reference)", default=str(BUNDLED_DIR), type=str)
+    parser.add_argument(      '--srcDir',      help="Directory replacing <src_ply_dir> in the sequence list, the real frames not found are skipped (optional)", default=None, type=str)
+    parser.add_argument(      '--bundle',      help="Write the missing bundled frames of real sequences from their frames in --srcDir (optional, default=False)", action='store_true')
+    parser.add_argument(      '--sizes',       help="Comma separated numbers of points of the synthetic frames, 0 for none (optional, default=from the suite)", default=None, type=str)
+    parser.add_argument(      '--nbFrame',     help="Number of synthetic frames of each size (optional, default=from the suite)", default=None, type=int)
+    parser.add_argument(      '--nbJobs',      help="Comma separated numbers of jobs of the native backend (optional, default=from the suite)", default=None, type=str)
+    parser.add_argument(      '--backends',    help="Comma separated backends among mm and native, mm requires --mmPath (optional, default=from the suite)", default=None, type=str)
+    parser.add_argument(      '--metrics',     help="Comma separated metric families among geometry, color and pcqm (optional, default=geometry,color,pcqm)", default=",".join(MmLog.METRIC_FAMILIES), type=str)
+    parser.add_argument(      '--reference',   help="recorded: compare with the recorded mm logs, record: record them with mm first, none: no comparison (optional, default=recorded)", default="recorded", type=str, choices=REFERENCE_MODES)
+    parser.add_argument(      '--referenceDir', help="Directory of the recorded mm logs (optional, default=the bundled directory)", default=None, type=str)
+    parser.add_argument(      '--mmPath',      help="mm binary, needed to record the references or benchmark mm (optional)", default=None, type=str)
+    parser.add_argument(      '--csvFile',     help="Output report (optional, default=<outputDir>/metrics_benchmark.csv)", default=None, type=str)
+    return parser.parse_args()
+
+def parseList(value, default, itemType=str):
+    if value is None:
+        return list(default)
+    return [itemType(item.strip()) for item in str(value).split(",") if item.strip()]
+
+def getFramePath(plyPath, frame):
+    return str(plyPath).replace("%04d", '%0*d' % (4, frame), 1)
+
+def getNbPoints(plyFile):
+    for line in extract_binary_ply_header(plyFile).splitlines():
+        if line.startswith("element vertex"):
+            return int(line.split()[2])
+    return 0
+
+# the frame is written to a temporary file and renamed, an interrupted run does not leave a partial frame
+def writeCloud(cloud, plyFile):
+    columns = {'x': cloud['positions'][:, 0], 'y': cloud['positions'][:, 1], 'z': cloud['positions'][:, 2]}
+    if cloud['normals'] is not None:
+        columns.update({'nx': cloud['normals'][:, 0], 'ny': cloud['normals'][:, 1], 'nz': cloud['normals'][:, 2]})
+    points = pd.DataFrame({name: values.astype(np.float32) for name, values in columns.items()})
+    if cloud['colors'] is not None:
+        points = points.assign(red=cloud['colors'][:, 0].astype(np.uint8), green=cloud['colors'][:, 1].astype(np.uint8), blue=cloud['colors'][:, 2].astype(np.uint8))
+    tmpFile = Path("".join([str(plyFile), ".tmp"]))
+    writePly(points, tmpFile)
+    os.replace(tmpFile, plyFile)
+    return plyFile
+
+# radius of a sphere with about nbPoints voxels on its surface and bits of the grid holding it
+def getSyntheticGrid(nbPoints):
+    radius = math.sqrt(nbPoints / (4 * math.pi))
+    return radius, max(SYNTHETIC_BITS, math.ceil(math.log2(2 * (1 + BUMP) * radius + 2)))
+
+# synthetic source frame of about nbPoints points: a bumpy sphere voxelised on the grid with smooth
+# colours and the normals estimated as for the sources without normals
+def makeSource(nbPoints, seed):
+    rng = np.random.default_rng(seed)
+    radius, bits = getSyntheticGrid(nbPoints)
+    directions = rng.normal(size=(SAMPLES_PER_POINT * nbPoints, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    radii = radius * (1 + BUMP * np.sin(5 * directions[:, 0] + seed) * np.sin(4 * directions[:, 1]))
+    positions = np.unique(np.round((1 << (bits - 1)) + directions * radii[:, None]), axis=0)
+    if len(positions) > nbPoints:
+        positions = positions[np.sort(rng.choice(len(positions), nbPoints, replace=False))]
+    colors = 128 + 100 * np.sin(positions / COLOR_PERIOD + seed) + rng.normal(0, COLOR_NOISE, positions.shape)
+    return {'positions': positions, 'normals': estimateNormals(positions), 'colors': np.clip(np.round(colors), 0, 255)}
+
+# decoded frame of a source: some points dropped or moved by one voxel and colours quantised
+def makeDecoded(source, seed):
+    rng = np.random.default_rng(seed)
+    isKept = rng.random(len(source['positions'])) >= DROPPED_RATIO
+    positions = source['positions'][isKept].copy()
+    isMoved = rng.random(len(positions)) < MOVED_RATIO
+    positions[isMoved] += rng.integers(-1, 2, size=(int(isMoved.sum()), 3))
+    positions, firsts = np.unique(positions, axis=0, return_index=True)
+    colors = None
+    if source['colors'] is not None:
+        colors = source['colors'][isKept][firsts]
+        colors = np.clip(np.round(np.round(colors / COLOR_STEP) * COLOR_STEP + rng.normal(0, COLOR_NOISE, colors.shape)), 0, 255)
+    return {'positions': positions, 'normals': None, 'colors': colors}
+
+def getCase(name, sourcePath, decodedPath, firstFrame, nbFrame, resolution):
+    frames = range(firstFrame, firstFrame + nbFrame)
+    nbPoints = sum(getNbPoints(getFramePath(sourcePath, frame)) + getNbPoints(getFramePath(decodedPath, frame)) for frame in frames)
+    return {'name': name, 'source': str(sourcePath), 'decoded': str(decodedPath), 'firstFrame': firstFrame, 'nbFrame': nbFrame, 'resolution': resolution, 'nbPoints': nbPoints}
+
+# synthetic frames of nbPoints points, generated once in the output directory
+def getSyntheticCase(outputDir, nbPoints, nbFrame):
+    caseDir = utils.createPath(Path(outputDir).joinpath("synthetic_%d" % nbPoints))
+    sourcePath = caseDir.joinpath("src_%04d.ply")
+    decodedPath = caseDir.joinpath("dec_%04d.ply")
+    for frame in range(nbFrame):
+        seed = nbPoints * 1000 + frame
+        sourceFile, decodedFile = Path(getFramePath(sourcePath, frame)), Path(getFramePath(decodedPath, frame))
+        if not sourceFile.exists() or not decodedFile.exists():
+            source = makeSource(nbPoints, seed)
+            writeCloud(makeDecoded(source, seed), decodedFile)
+            writeCloud(source, sourceFile)
+    return getCase("synthetic_%d" % nbPoints, sourcePath, decodedPath, 0, nbFrame, (1 << getSyntheticGrid(nbPoints)[1]) - 1)
+
+def getBundledPaths(bundledDir, bundled):
+    caseDir = Path(bundledDir).joinpath(bundled['Name'])
+    return caseDir.joinpath("src_%04d.ply"), caseDir.joinpath("dec_%04d.ply")
+
+# bundled frames of the suite, from frame 0 as the synthetic ones
+def getBundledCase(bundledDir, bundled):
+    sourcePath, decodedPath = getBundledPaths(bundledDir, bundled)
+    nbFrame = bundled.get('NbFrame', 1)
+    missing = [frame for frame in range(nbFrame) if not Path(getFramePath(sourcePath, frame)).exists() or not Path(getFramePath(decodedPath, frame)).exists()]
+    if missing:
+        print(utils.BLUE + "Bundled frames skipped, not found:", getFramePath(sourcePath, missing[0]), utils.ENDC, flush=True)
+        if 'SeqId' in bundled:
+            print(utils.BLUE + "They are written from the sequence frames with --bundle --srcDir", utils.ENDC, flush=True)
+        return None
+    return getCase(bundled['Name'], sourcePath, decodedPath, 0, nbFrame, bundled['Resolution'])
+
+# source frame of a bundled real case: the grid decimated to the bundled resolution (the coordinates
+# divided by a power of 2, one point per voxel) and the nbPoints points nearest to the centre, the same
+# centre for every frame such that the patches of consecutive frames overlap
+def decimateFrame(cloud, shift, nbPoints, centre=None):
+    positions, firsts = np.unique(np.floor(cloud['positions'] / (1 << shift)), axis=0, return_index=True)
+    if centre is None:
+        centre = positions[cKDTree(positions).query(positions.mean(axis=0))[1]]
+    kept = np.sort(cKDTree(positions).query(centre, k=min(nbPoints, len(positions)))[1])
+    positions = positions[kept]
+    colors = None if cloud['colors'] is None else cloud['colors'][firsts][kept]
+    return {'positions': positions, 'normals': estimateNormals(positions), 'colors': colors}, centre
+
+# writes the missing frames of a bundled real case (SeqId, FirstFrame, NbFrame, NbPoints, Resolution)
+# from the frames of its sequence, their decoded frames are made as the synthetic ones
+def bundleRealFrames(bundledDir, bundled, sequence, cfgDir, srcDir):
+    startFrameNb, uncompressedDataPath, resolution = readSequenceCfg(Path(cfgDir).joinpath(sequence['Config']))
+    plyDir = sequence['PlyPath'].replace("<src_ply_dir>", srcDir) if srcDir else sequence['PlyPath']
+    sequencePath = Path(plyDir).joinpath(uncompressedDataPath)
+    firstFrame = bundled.get('FirstFrame', startFrameNb)
+    nbFrame = bundled.get('NbFrame', 1)
+    sourcePath, decodedPath = getBundledPaths(bundledDir, bundled)
+    if all(Path(getFramePath(path, frame)).exists() for path in [sourcePath, decodedPath] for frame in range(nbFrame)):
+        return
+    shift = (resolution + 1).bit_length() - (bundled['Resolution'] + 1).bit_length()
+    if shift < 0:
+        raise ValueError("Bundled resolution %d above the one of %s" % (bundled['Resolution'], sequence['Name']))
+    missing = [frame for frame in range(firstFrame, firstFrame + nbFrame) if not Path(getFramePath(sequencePath, frame)).exists()]
+    if missing:
+        print(utils.RED + "Bundled frames of", bundled['Name'], "not written, not found:", getFramePath(sequencePath, missing[0]), utils.ENDC, flush=True)
+        return
+    utils.createPath(sourcePath.parent)
+    # all the frames are written again when one is missing, they share the centre of the first one
+    centre = None
+    for frame in range(nbFrame):
+        print(utils.GREEN + "Bundle frame", firstFrame + frame, "of", sequence['Name'], "as", bundled['Name'], utils.ENDC, flush=True)
+        source, centre = decimateFrame(readPly(getFramePath(sequencePath, firstFrame + frame)), shift, bundled['NbPoints'], centre)
+        writeCloud(makeDecoded(source, frame), Path(getFramePath(decodedPath, frame)))
+        writeCloud(source, Path(getFramePath(sourcePath, frame)))
+
+# frames of a sequence of the sequence list, their decoded frames are made from the source frames as the synthetic ones
+def getRealCase(outputDir, sequence, cfgDir, srcDir, firstFrame, nbFrame):
+    startFrameNb, uncompressedDataPath, resolution = readSequenceCfg(Path(cfgDir).joinpath(sequence['Config']))
+    plyDir = sequence['PlyPath'].replace("<src_ply_dir>", srcDir) if srcDir else sequence['PlyPath']
+    sourcePath = Path(plyDir).joinpath(uncompressedDataPath)
+    firstFrame = startFrameNb if firstFrame is None else firstFrame
+    missing = [frame for frame in range(firstFrame, firstFrame + nbFrame) if not Path(getFramePath(sourcePath, frame)).exists()]
+    if missing:
+        print(utils.BLUE + "Real frames skipped, not found:", getFramePath(sourcePath, missing[0]), utils.ENDC, flush=True)
+        return None
+    caseDir = utils.createPath(Path(outputDir).joinpath("real_%s" % sequence['Name']))
+    decodedPath = caseDir.joinpath("dec_%04d.ply")
+    for frame in range(firstFrame, firstFrame + nbFrame):
+        decodedFile = Path(getFramePath(decodedPath, frame))
+        if not decodedFile.exists():
+            writeCloud(makeDecoded(readPly(getFramePath(sourcePath, frame)), frame), decodedFile)
+    return getCase("real_%s" % sequence['Name'], sourcePath, decodedPath, firstFrame, nbFrame, resolution)
+
+# mm command line of the families, as the metric stage of compute.py
+def getMmCmd(mmPath, case, families):
+    cmd = [str(mmPath), "sequence", "--firstFrame", str(case['firstFrame']), "--lastFrame", str(case['firstFrame'] + case['nbFrame'] - 1)]
+    if "geometry" in families or "color" in families:
+        cmd += ["END", "compare", "--mode", "pcc",  "--inputModelA", case['source'], "--inputModelB", case['decoded']]
+    if "pcqm" in families:
+        cmd += ["END", "compare", "--mode", "pcqm", "--inputModelA", case['source'], "--inputModelB", case['decoded']]
+    return cmd
+
+def getCmd(backend, case, families, nbJobs, mmPath=None):
+    if backend == "mm":
+        return getMmCmd(mmPath, case, families)
+    return [
+        sys.executable, str(Path(__file__).resolve().parent.joinpath("PccMetrics.py")),
+        "-a", case['source'], "-b", case['decoded'],
+        "-f", str(case['firstFrame']), "-n", str(case['nbFrame']),
+        "--resolution", str(case['resolution']), "--nbJobs", str(nbJobs),
+        "--metrics", ",".join(families), "-o", "-",
+        ]
+
+# started instead of a measured command: it forks the command and writes the peak RSS (kB) of its
+# process tree to the fd given as first argument. A process keeps the peak RSS of the process it
+# was forked from, the command is forked from this small process instead of the benchmark.
+MEASURE_LAUNCHER = """import os, sys
+pid = os.fork()
+if pid == 0:
+    os.execvp(sys.argv[2], sys.argv[2:])
+status, usage = os.wait4(pid, 0)[1:]
+os.write(int(sys.argv[1]), str(usage.ru_maxrss).encode())
+code = os.waitstatus_to_exitcode(status)
+sys.exit(code if code >= 0 else 128 - code)
+"""
+
+# run cmd with its output written to logFile, returns its wall time in seconds and the peak RSS in
+# MB of its largest process (the command or one of its workers)
+def runMeasured(cmd, logFile):
+    readFd, writeFd = os.pipe()
+    start = time.perf_counter()
+    try:
+        with open(logFile, 'w') as logF:
+            process = subprocess.Popen([sys.executable, "-S", "-c", MEASURE_LAUNCHER, str(writeFd)] + [str(item) for item in cmd], stdout=logF, pass_fds=(writeFd,))
+            os.close(writeFd)
+            returncode = process.wait()
+        seconds = time.perf_counter() - start
+        peak = os.read(readFd, 64)
+    finally:
+        os.close(readFd)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    if not MmLog.isComplete(logFile):
+        raise ValueError("Metrics not computed, see", logFile)
+    return seconds, int(peak) / 1024
+
+# values of a family in a mm log, None when the log does not have the family
+def readValues(logFile, family):
+    stats = MmLog.parseStats(Path(logFile).read_text(errors="ignore").splitlines())
+    if not any(MmLog.getFamily(label) == family for label in stats):
+        return None
+    results = ExtractMetrics.extract_mm_metrics(str(logFile))
+    return {name: results[row][column] for name, row, column in COMPARED_VALUES[family]}
+
+def getMaxDeviation(values, reference):
+    return max(abs(values[name] - reference[name]) for name in values)
+
+# digests of the source and decoded frames of a case, a recorded reference is only used for the same frames
+def getFrameDigests(case):
+    digests = {}
+    for frame in range(case['firstFrame'], case['firstFrame'] + case['nbFrame']):
+        for path in [case['source'], case['decoded']]:
+            plyFile = getFramePath(path, frame)
+            digests[Path(plyFile).name if path == case['source'] else "".join(["decoded/", Path(plyFile).name])] = hashlib.sha256(Path(plyFile).read_bytes()).hexdigest()
+    return digests
+
+def getReferenceFiles(referenceDir, case):
+    return Path(referenceDir).joinpath("".join([case['name'], "_mm.log"])), Path(referenceDir).joinpath("".join([case['name'], "_frames.json"]))
+
+def recordReference(mmPath, case, families, referenceDir):
+    logFile, framesFile = getReferenceFiles(utils.createPath(referenceDir), case)
+    print(utils.GREEN + "Record the mm reference of", case['name'], utils.ENDC, flush=True)
+    runMeasured(getMmCmd(mmPath, case, families), logFile)
+    with open(framesFile, 'w') as f:
+        json.dump(getFrameDigests(case), f, indent=1, sort_keys=True)
+
+# recorded mm log of the frames of a case, None when there is none or it was recorded on other frames
+def getReference(referenceDir, case):
+    logFile, framesFile = getReferenceFiles(referenceDir, case)
+    if not logFile.exists() or not framesFile.exists():
+        print(utils.BLUE + "No mm reference of", case['name'], "in", referenceDir, utils.ENDC, flush=True)
+        return None
+    with open(framesFile, 'r') as f:
+        if json.load(f) != getFrameDigests(case):
+            print(utils.RED + "mm reference of", case['name'], "recorded on other frames, not compared:", logFile, utils.ENDC, flush=True)
+            return None
+    return logFile
+
+def formatValue(value, fmt):
+    return "" if value is None else fmt % value
+
+def printReport(rows):
+    print(utils.BLUE + "%-24s %-8s %-7s %5s %10s %14s %10s %13s" % ("case", "family", "backend", "jobs", "time (s)", "points/s", "peak (MB)", "max deviation"), utils.ENDC)
+    for row in rows:
+        print("%-24s %-8s %-7s %5d %10.3f %14.0f %10.1f %13s" % (row['Case'], row['Family'], row['Backend'], row['NbJobs'], row['Time'],
+                                                                row['PointsPerSecond'], row['PeakRssMB'], formatValue(row['MaxDeviation'], "%.6f")))
+
+def writeReport(rows, csvFile):
+    with open(csvFile, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for row in rows:
+            writer.writerow(["" if row[name] is None else row[name] for name in CSV_HEADER])
+    return csvFile
+
+def main():
+    args = parseArgs()
+    with open(args.suite, 'r') as f:
+        suite = json.load(f)
+    outputDir = utils.createPath(Path(args.outputDir).resolve())
+    bundledDir = None if args.bundledDir == "none" else Path(args.bundledDir).resolve()
+    referenceDir = Path(args.referenceDir).resolve() if args.referenceDir else (bundledDir or outputDir.joinpath("reference"))
+    families = MmLog.parseFamilies(args.metrics)
+    backends = parseList(args.backends, suite.get('Backends', ["native"]))
+    nbJobsList = parseList(args.nbJobs, suite.get('NbJobs', [1]), int)
+    sizes = [size for size in parseList(args.sizes, suite.get('Synthetic', {}).get('Sizes', []), int) if size > 0]
+    nbFrame = args.nbFrame or suite.get('Synthetic', {}).get('NbFrame', 1)
+    for backend in backends:
+        if backend not in METRIC_BACKENDS:
+            parser.error("Unknown metric backend: %s" % backend)
+    if ("mm" in backends or args.reference == "record") and not args.mmPath:
+        parser.error("--mmPath is required to benchmark mm or record the references")
+
+    with open(args.sequences, 'r') as f:
+        sequences = {sequence['SeqId']: sequence for sequence in json.load(f)['SequenceList']}
+    cases = [getSyntheticCase(outputDir, size, nbFrame) for size in sizes]
+    for bundled in (suite.get('Bundled', []) if bundledDir else []):
+        if args.bundle and 'SeqId' in bundled:
+            bundleRealFrames(bundledDir, bundled, sequences[bundled['SeqId']], args.cfgDir, args.srcDir)
+        case = getBundledCase(bundledDir, bundled)
+        if case is not None:
+            cases.append(case)
+    for real in suite.get('RealFrames', []):
+        case = getRealCase(outputDir, sequences[real['SeqId']], args.cfgDir, args.srcDir, real.get('FirstFrame'), real.get('NbFrame', 1))
+        if case is not None:
+            cases.append(case)
+
+    # the deviations are the point of a recorded run, it stops before measuring anything when one is missing
+    if args.reference == "recorded":
+        missing = [case['name'] for case in cases if getReference(referenceDir, case) is None]
+        if missing:
+            print(utils.RED + "No mm reference of", ", ".join(missing), "in", referenceDir, utils.ENDC, flush=True)
+            print(utils.RED + "Record them with --reference record --mmPath, or run with --reference none", utils.ENDC, flush=True)
+            sys.exit(1)
+
+    rows = []
+    for case in cases:
+        if args.reference == "record":
+            recordReference(args.mmPath, case, families, referenceDir)
+        reference = getReference(referenceDir, case) if args.reference != "none" else None
+        for family in families:
+            referenceValues = readValues(reference, family) if reference else None
+            for backend in backends:
+                # mm is single threaded
+                for nbJobs in ([1] if backend == "mm" else nbJobsList):
+                    logFile = outputDir.joinpath("logs", "_".join([case['name'], family, backend, str(nbJobs)]) + "_mm.log")
+                    utils.createPath(logFile.parent)
+                    print(utils.GREEN + "Compute", family, "of", case['name'], "with", backend, nbJobs, "jobs", utils.ENDC, flush=True)
+                    seconds, peak = runMeasured(getCmd(backend, case, [family], nbJobs, args.mmPath), logFile)
+                    values = readValues(logFile, family)
+                    rows.append({'Case': case['name'], 'NbFrame': case['nbFrame'], 'NbPoints': case['nbPoints'], 'Family': family, 'Backend': backend,
+                                 'NbJobs': nbJobs, 'Time': seconds, 'PointsPerSecond': case['nbPoints'] / seconds, 'PeakRssMB': peak,
+                                 'MaxDeviation': getMaxDeviation(values, referenceValues) if values and referenceValues else None})
+
+    printReport(rows)
+    csvFile = writeReport(rows, args.csvFile or outputDir.joinpath("metrics_benchmark.csv"))
+    print(utils.GREEN + "Benchmark report:", csvFile, utils.ENDC, flush=True)
+
+if __name__ == "__main__":
+    try:
+        main()
+    except subprocess.CalledProcessError as e:
+        print(utils.RED + "subprocess Exception:", e.returncode, utils.ENDC)
+        print(utils.RED + " ".join(e.cmd), utils.ENDC)
+        sys.exit(e.returncode)
@@ -0,0 +1,228 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Run, parse and merge mm logs computed on consecutive frame ranges of a sequence. The sequence
+# results of mm are per frame statistics printed as "<metric> Mean=<value>" (also Min=/Max=),
+# the merged statistics are weighted by the number of frames of each range such that they are
+# the ones of a single mm run on the whole sequence. When only sampled frames are measured, the
+# half width of the 95% confidence interval of each mean is written as "<metric> CI95=<value>".
+
+import os, re, sys, csv, shlex, subprocess
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import ResourceMonitor
+
+import FrameSampling
+
+END_MARKER = "Time on overall processing:"
+SAMPLING_MARKER = "# sampled frames"
+
+# metric families, each one has its own log and completion state, and the part of the label of
+# its sequence results: geometry (D1/D2) and colour are computed by "compare --mode pcc", PCQM
+# by "compare --mode pcqm"
+METRIC_FAMILIES = ["geometry", "color", "pcqm"]
+FAMILY_LABELS = {"geometry": ["(p2point)", "(p2plane)"], "color": ["c["], "pcqm": ["PCQM"]}
+
+STAT_PATTERN = re.compile(r"\b(Min|Max|Mean|CI95)=\s*([-+]?(?:[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?|inf|nan))", re.IGNORECASE)
+TIME_PATTERN = re.compile(r"Time on overall processing:\s*([0-9.]+)\s*(\S*)")
+SAMPLING_PATTERN = re.compile(r"^# sampled frames \((\S+)\):")
+
+# returns the statistic lines {metric label: {stat: value}}, the label keeps the spacing
+# before the first statistic such that the merged lines can be parsed as the mm ones
+def parseStats(lines):
+    stats = {}
+    for line in lines:
+        matches = list(STAT_PATTERN.finditer(line))
+        if not matches:
+            continue
+        label = line[:matches[0].start()]
+        # mm prints one statistic per line, several lines share the same label
+        stats.setdefault(label, {}).update({match.group(1): float(match.group(2)) for match in matches})
+    return stats
+
+def isStatLine(line):
+    return STAT_PATTERN.search(line) is not None
+
+def parseTime(lines):
+    for line in lines:
+        match = TIME_PATTERN.search(line)
+        if match:
+            return float(match.group(1)), match.group(2)
+    return None, ""
+
+def getRangeLogFile(mmFile, firstFrame, lastFrame):
+    mmFile = Path(mmFile)
+    return mmFile.with_name("".join([mmFile.stem, "_%04d_%04d" % (firstFrame, lastFrame), mmFile.suffix]))
+
+# run mm on a frame range, cmd is the mm command line of the range and its output is written to logFile,
+# its resource usage is added to recordFile (ResourceMonitor)
+def runRange(cmd, logFile, cmdFile=None, log=None, processes=None, recordFile=None):
+    log = log or sys.stdout
+    if cmdFile:
+        with open(cmdFile, 'a') as f:
+            print(shlex.join(cmd), ">", shlex.quote(str(logFile)), file=f)
+    print("CMD=", shlex.join(cmd), file=log, flush=True)
+    with open(logFile, 'w') as logF:
+        process = ResourceMonitor.MonitoredProcess(cmd, recordFile=recordFile, stdout=logF, stderr=None if log is sys.stdout else log)
+        if processes is not None:
+            processes.append(process)
+        try:
+            returncode = process.wait()
+        finally:
+            if processes is not None:
+                processes.remove(process)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    if not isComplete(logFile):
+        raise ValueError("Metrics not computed, see", logFile)
+    return logFile
+
+# label of the sequence results of a metric as printed by mm from its name without spaces around,
+# the colour labels are padded to 20 characters ("c[0],PSNRF          Mean=")
+def getLabel(name):
+    name = name.strip()
+    return "%-20s" % name if name.startswith("c[") else "".join([name, " "])
+
+# log of a single frame range with the given statistics {label: {stat: value}}
+def writeRangeLog(stats, logFile, firstFrame, lastFrame):
+    with open(logFile, 'w') as out:
+        print("# restored from the frame cache", file=out)
+        for label, values in stats.items():
+            print(formatStat(label, values), file=out)
+        print(END_MARKER, "0 ms", file=out)
+    return logFile
+
+def getFamily(label):
+    for family, patterns in FAMILY_LABELS.items():
+        if any(pattern in label for pattern in patterns):
+            return family
+    return None
+
+# comma separated list of families, e.g. "geometry,pcqm"
+def parseFamilies(metrics):
+    families = [family.strip() for family in metrics.split(",") if family.strip()] if isinstance(metrics, str) else list(metrics)
+    for family in families:
+        if family not in METRIC_FAMILIES:
+            raise ValueError("Unknown metric family:", family)
+    return [family for family in METRIC_FAMILIES if family in families]
+
+# write the log of each family from a log computing several of them: familyFiles = {family: log},
+# the sequence results of the other families are removed, the other lines are kept
+def splitLog(logFile, familyFiles):
+    lines = Path(logFile).read_text(errors="ignore").splitlines()
+    if not any(END_MARKER in line for line in lines):
+        raise ValueError("Incomplete mm log:", logFile)
+    for family, familyFile in familyFiles.items():
+        tmpFile = Path("".join([str(familyFile), ".tmp"]))
+        with open(tmpFile, 'w') as out:
+            for line in lines:
+                matches = list(STAT_PATTERN.finditer(line))
+                if not matches or getFamily(line[:matches[0].start()]) == family:
+                    print(line, file=out)
+        os.replace(tmpFile, familyFile)
+    return familyFiles
+
+def isComplete(mmFile):
+    mmFile = Path(mmFile)
+    return mmFile.exists() and END_MARKER in mmFile.read_text(errors="ignore")
+
+# parts = [(statistics of a frame range, number of frames)]
+def mergeStats(parts):
+    merged = {}
+    nbFrames = {}
+    for stats, nbFrame in parts:
+        for label, values in stats.items():
+            mergedValues = merged.setdefault(label, {})
+            nbFrames[label] = nbFrames.get(label, 0) + nbFrame
+            for stat, value in values.items():
+                if stat == "Mean":
+                    mergedValues[stat] = mergedValues.get(stat, 0.0) + value * nbFrame
+                elif stat == "Min":
+                    mergedValues[stat] = min(mergedValues.get(stat, value), value)
+                elif stat == "Max":
+                    mergedValues[stat] = max(mergedValues.get(stat, value), value)
+    for label, values in merged.items():
+        if "Mean" in values:
+            values["Mean"] = values["Mean"] / nbFrames[label]
+    return merged
+
+# table of the means of each frame range: logs = [(mm log, first frame, last frame)]
+def writeFrameTable(logs, csvFile):
+    rows = []
+    labels = []
+    for logFile, firstFrame, lastFrame in logs:
+        stats = parseStats(Path(logFile).read_text(errors="ignore").splitlines())
+        for label in stats:
+            if label not in labels:
+                labels.append(label)
+        rows.append([firstFrame, lastFrame] + [stats[label].get("Mean", "") if label in stats else "" for label in labels])
+    with open(csvFile, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['FirstFrame', 'LastFrame'] + [label.strip() for label in labels])
+        for row in rows:
+            writer.writerow(row + [""] * (len(labels) + 2 - len(row)))
+    return csvFile
+
+# one line per statistic as mm does, ExtractMetrics reads the value after "Mean="
+def formatStat(label, values):
+    return "\n".join("".join([label, stat, "=", repr(value)]) for stat, value in values.items())
+
+# sampling of the frames measured in a log, "" when all the frames are measured
+def getSampling(mmFile):
+    mmFile = Path(mmFile)
+    if mmFile.exists():
+        for line in mmFile.read_text(errors="ignore").splitlines():
+            match = SAMPLING_PATTERN.match(line)
+            if match:
+                return match.group(1)
+    return ""
+
+# write the log of the whole sequence from the logs of its frame ranges: logs = [(mm log, first frame, last frame)]
+# the lines of each range are kept except their statistics and end marker, the merged statistics
+# and the end marker (with the sum of the processing times) are written at the end. With a
+# sampling, the ranges are the sampled frames of a sequence of nbFrame frames and the confidence
+# interval of each mean is added.
+def mergeLogs(logs, mmFile, sampling="", nbFrame=None):
+    parts = []
+    totalTime = 0.0
+    timeUnit = ""
+    with open(mmFile, 'w') as out:
+        for logFile, firstFrame, lastFrame in logs:
+            lines = Path(logFile).read_text(errors="ignore").splitlines()
+            if not any(END_MARKER in line for line in lines):
+                raise ValueError("Incomplete mm log:", logFile)
+            parts.append((parseStats(lines), lastFrame - firstFrame + 1))
+            time, unit = parseTime(lines)
+            totalTime += time or 0.0
+            timeUnit = timeUnit or unit
+            print("# frames %d-%d" % (firstFrame, lastFrame), file=out)
+            for line in lines:
+                if not isStatLine(line) and END_MARKER not in line:
+                    print(line, file=out)
+
+        print("# sequence results of %d frame ranges" % len(logs), file=out)
+        merged = mergeStats(parts)
+        if sampling:
+            print("%s (%s): %d of %d" % (SAMPLING_MARKER, sampling, sum(nbRange for stats, nbRange in parts), nbFrame), file=out)
+            for label, values in merged.items():
+                if "Mean" in values:
+                    values["CI95"] = FrameSampling.getConfidence([stats[label]["Mean"] for stats, nbRange in parts if "Mean" in stats.get(label, {})], nbFrame)
+        for label, values in merged.items():
+            print(formatStat(label, values), file=out)
+        print(" ".join([END_MARKER, "%g" % totalTime, timeUnit]).strip(), file=out)
+    return mmFile
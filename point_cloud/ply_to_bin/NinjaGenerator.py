@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import sys, shlex
+from pathlib import Path
+from ninja.ninja_syntax import Writer as NinjaWriter, escape as ninjaEscape
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+import MmLog
+import compute
+
+LINE_WIDTH = 100
+STAGE_FORCE_OPTION = {"encoder": "forceEncode", "decoder": "forceDecode", "mm": "forceMetric"}
+
+# write a build.ninja with encode -> decode -> metrics -> CSV -> XLSM edges for every test of the
+# test configuration, such that "ninja -C outputDir -jN" rebuilds only what is out of date
+class NinjaGenerator:
+
+    def __init__ (self, config_manager, bin_generator, xls_generator, cleanDecoded=False):
+
+        self.config_manager = config_manager
+        self.bin_generator  = bin_generator
+        self.xls_generator  = xls_generator
+        self.cleanDecoded   = cleanDecoded
+        self.ninjaFile      = Path(config_manager.outputDir).joinpath("build.ninja")
+
+    def write(self):
+        utils.createPath(Path(self.config_manager.outputDir))
+        with open(self.ninjaFile, mode="w") as stream:
+            self.writer = NinjaWriter(stream, width=LINE_WIDTH)
+            self.writePreamble()
+            self.writeRules()
+            stageFiles = self.writeTestSteps()
+            self.writeReportSteps(stageFiles)
+        print(utils.GREEN + "Ninja build file written:", self.ninjaFile, utils.ENDC, flush=True)
+        print(utils.GREEN + "Run: ninja -C", self.config_manager.outputDir, "-j <nbJobs> [target]", utils.ENDC, flush=True)
+        return self.ninjaFile
+
+    def writePreamble(self):
+        self.writer.comment("generated by exec_binGenerator.py --mode ninja, do not edit")
+        self.writer.variable("ninja_required_version", "1.11")
+        self.writer.variable("builddir", utils.pathStr(self.config_manager.cmdDir))
+        self.writer.variable("python", ninjaEscape(sys.executable))
+        self.writer.newline()
+
+    def writeRules(self):
+        # compute.py stage command, built per test by BinGenerator
+        self.writer.rule(
+            name="compute",
+            command="$cmd",
+            description="$desc",
+        )
+        self.writer.newline()
+
+        execScript = Path(self.config_manager.scriptDir).joinpath("exec_binGenerator.py").resolve()
+        self.writer.rule(
+            name="report",
+            command="$python " + ninjaEscape(shlex.join([
+                str(execScript),
+                "-i", str(self.config_manager.sequenceJson),
+                "-o", str(self.config_manager.outputDir),
+                "-t", str(self.config_manager.testConfigJson),
+            ])) + " --mode $mode",
+            description="Generate $mode files",
+        )
+        self.writer.newline()
+
+    def writeTestSteps(self):
+        stageFiles = {"encoder": [], "decoder": [], "mm": []}
+        outputs    = {"encoder": "encoderFile", "decoder": "decoderFile"}
+
+        for idx, task in enumerate(self.bin_generator.taskList):
+            files = self.getStageFiles(task)
+            computeTask = self.bin_generator.computeTasks[idx]
+            metricOutputs = [utils.pathStr(files[compute.getMetricFileKey(family)]) for family in computeTask.metrics]
+            previousOutput = []
+            # a streaming decoder also writes the logs of the metric families, there is no mm edge
+            isStreamed = computeTask.isStreamed()
+            for stage in ["encoder", "decoder"]:
+                stageOutputs = [utils.pathStr(files[outputs[stage]])]
+                if stage == "encoder":
+                    stageOutputs.append(utils.pathStr(files['compressBinFile']))
+                elif isStreamed:
+                    stageOutputs += metricOutputs
+                # keep decoded PLY such that the metrics of one rate can be rebuilt alone
+                self.writeComputeStep(idx, stageOutputs, previousOutput, " ".join([stage.capitalize(), task['name']]), stage=stage, **{STAGE_FORCE_OPTION[stage]: True})
+                self.writer.build(outputs="_".join([task['name'], stage]), rule="phony", inputs=stageOutputs[0])
+                stageFiles[stage].append(stageOutputs[0])
+                # the decoder reads the bitstream, the metrics read the decoded frames
+                previousOutput = stageOutputs[1:] if stage == "encoder" else stageOutputs[:1]
+
+            # one edge per metric task such that a family is computed again alone, geometry and
+            # colour of mm sharing one edge (compute.getMetricTasks)
+            if not isStreamed:
+                for stage, families in compute.getMetricTasks(computeTask.metrics, computeTask.metricBackend):
+                    stageOutputs = [utils.pathStr(files[compute.getMetricFileKey(family)]) for family in families]
+                    self.writeComputeStep(idx, stageOutputs, previousOutput, " ".join(["Metrics", ",".join(families), task['name']]), stage=stage, forceMetric=True)
+            for family, metricOutput in zip(computeTask.metrics, metricOutputs):
+                self.writer.build(outputs="_".join([task['name'], compute.getMetricStage(family)]), rule="phony", inputs=metricOutput)
+            self.writer.build(outputs="_".join([task['name'], "mm"]), rule="phony", inputs=metricOutputs)
+            stageFiles["mm"] += metricOutputs
+            self.writer.build(outputs=task['name'], rule="phony", inputs=metricOutputs or previousOutput)
+            self.writer.newline()
+
+        return stageFiles
+
+    def writeComputeStep(self, idx, outputs, implicit, desc, **options):
+        cmd = self.bin_generator.buildCmd(idx, forceClean=self.cleanDecoded, **options)
+        self.writer.build(
+            outputs=outputs,
+            rule="compute",
+            implicit=implicit,
+            variables={
+                "cmd": ninjaEscape(shlex.join(cmd)),
+                "desc": desc,
+            },
+        )
+
+    def writeReportSteps(self, stageFiles):
+        csvFiles, workbookFiles = self.xls_generator.getOutputFiles()
+        csvFiles      = [utils.pathStr(f) for f in csvFiles]
+        workbookFiles = [utils.pathStr(f) for f in workbookFiles]
+
+        self.writer.build(
+            outputs=csvFiles,
+            rule="report",
+            implicit=stageFiles["encoder"] + stageFiles["decoder"] + stageFiles["mm"],
+            variables={"mode": "csv"},
+        )
+        self.writer.build(outputs="csv", rule="phony", inputs=csvFiles)
+        self.writer.newline()
+
+        self.writer.build(
+            outputs=workbookFiles,
+            rule="report",
+            implicit=csvFiles,
+            variables={"mode": "xlsm"},
+        )
+        self.writer.build(outputs="xlsm", rule="phony", inputs=workbookFiles)
+        self.writer.newline()
+
+        self.writer.default("xlsm")
+
+    def getStageFiles(self, task):
+        # same naming than ConfigManager.getCompressedFilePath / getOutputPrefix (and compute.py)
+        test = task['test']
+        compressedPath = self.config_manager.getCompressedFilePath(test['testName'], str(test['seqId']), str(test['nbFrame']), test['condition'], test['name'])
+        outputPrefix   = self.config_manager.getOutputPrefix(str(test['seqId']), str(test['nbFrame']), test['condition'], str(test['rateId']), test['name'])
+        return {
+            'compressBinFile' : compressedPath.joinpath("".join([outputPrefix, "_enc.bin"])),
+            'encoderFile'     : compressedPath.joinpath("".join([outputPrefix, "_encoder.log"])),
+            'decoderFile'     : compressedPath.joinpath("".join([outputPrefix, "_decoder.log"])),
+        } | {compute.getMetricFileKey(family): compressedPath.joinpath("".join([outputPrefix, "_mm_", family, ".log"])) for family in MmLog.METRIC_FAMILIES}
@@ -0,0 +1,194 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Normals of the source frames without normals, estimated once per frame and kept in a sidecar
+# directory reused by every rate and every rerun: TMC2 reads them with --normalDataPath and the
+# metrics compare the decoded frames with them (D2 point to plane). The normal of a point is the
+# eigenvector of the lowest eigenvalue of the covariance of its k nearest neighbours (PCA),
+# computed with numpy on blocks of points, and is oriented away from the centroid of the frame.
+# The frames are estimated in parallel by a process pool. A sidecar frame is the source frame
+# with the nx, ny, nz properties added, the sidecar directory of a source is shared by every frame
+# range (e.g. the frame counts of a FrameNbList) and each frame is checked on its own.
+#   <normalsDir>/<key>/<source name with %04d> : key hashes the source path, k and this script
+#   <normalsDir>/<key>/frames.json              : {frame: [size, mtime]} of the source frame
+#                                                each sidecar frame was estimated from
+
+import os, sys, json, time, hashlib, argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+from pyntcloud import PyntCloud
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+from ResultCache import ResultCache
+
+# neighbours of the PCA
+NB_NEIGHBOURS = 16
+# points whose normals are computed at once, bounds the memory of the neighbourhoods
+BLOCK_SIZE = 1 << 18
+# PLY types of the numpy kinds and sizes
+PLY_TYPES = {"i1": "char", "u1": "uchar", "i2": "short", "u2": "ushort", "i4": "int", "u4": "uint", "f4": "float", "f8": "double"}
+
+def parseArgs():
+    global parser
+    parser = argparse.ArgumentParser(description='estimate the normals of source PLY frames without normals, the frames with normals are written to a sidecar directory')
+    parser.add_argument('-a', '--sourcePath',  help="Source PLY path with %%04d for the frame number", type=str, required=True)
+    parser.add_argument('-f', '--firstFrame',  help="First frame number (optional, default=0)", default=0, type=int)
+    parser.add_argument('-n', '--frameNumber', help="Number of frames (optional, default=1)", default=1, type=int)
+    parser.add_argument('-o', '--normalsDir',  help="Directory of the estimated normals", type=str, required=True)
+    parser.add_argument('-k', '--neighbours',  help="Number of neighbours of the PCA (optional, default=%d)" % NB_NEIGHBOURS, default=NB_NEIGHBOURS, type=int)
+    parser.add_argument(      '--nbJobs',      help="Number of frames estimated in parallel (optional, default=1)", default=1, type=int)
+    return parser.parse_args()
+
+def getFramePath(plyPath, frame):
+    return str(plyPath).replace("%04d", '%0*d' % (4, frame), 1)
+
+# unit normals of the points, oriented away from the centroid
+def estimateNormals(positions, k=NB_NEIGHBOURS):
+    tree = cKDTree(positions)
+    k = min(k, len(positions))
+    centroid = positions.mean(axis=0)
+    normals = np.zeros_like(positions)
+    for start in range(0, len(positions), BLOCK_SIZE):
+        block = positions[start:start + BLOCK_SIZE]
+        indices = tree.query(block, k=k)[1]
+        if indices.ndim == 1:
+            indices = indices[:, None]
+        neighbours = positions[indices]
+        centered = neighbours - neighbours.mean(axis=1, keepdims=True)
+        covariances = np.einsum('ijk,ijl->ikl', centered, centered) / k
+        # eigenvalues in ascending order, the normal is the first eigenvector
+        blockNormals = np.linalg.eigh(covariances)[1][:, :, 0]
+        isInward = np.einsum('ij,ij->i', blockNormals, block - centroid) < 0
+        blockNormals[isInward] *= -1
+        normals[start:start + BLOCK_SIZE] = blockNormals
+    return normals
+
+# binary little endian PLY of the columns of points (pyntcloud's writer does not support pandas 2)
+def writePly(points, plyFile):
+    columns = list(points.columns)
+    dtype = np.dtype([(column, points[column].dtype.newbyteorder('<')) for column in columns])
+    vertices = np.empty(len(points), dtype=dtype)
+    for column in columns:
+        vertices[column] = points[column].to_numpy()
+    header = ["ply", "format binary_little_endian 1.0", "element vertex %d" % len(points)]
+    header += ["property %s %s" % (PLY_TYPES[dtype[column].kind + str(dtype[column].itemsize)], column) for column in columns]
+    header += ["end_header"]
+    with open(plyFile, 'wb') as f:
+        f.write("".join([line + "\n" for line in header]).encode("ascii"))
+        f.write(vertices.tobytes())
+    return plyFile
+
+# write the source frame with its estimated normals, the file is renamed once written
+def estimateFrame(sourceFile, normalsFile, k=NB_NEIGHBOURS):
+    points = PyntCloud.from_file(str(sourceFile)).points
+    normals = estimateNormals(points[["x", "y", "z"]].to_numpy(dtype=np.float64), k).astype(np.float32)
+    points = points.assign(nx=normals[:, 0], ny=normals[:, 1], nz=normals[:, 2])
+    tmpFile = Path("".join([str(normalsFile), ".", str(os.getpid()), ".tmp"]))
+    writePly(points, tmpFile)
+    os.replace(tmpFile, normalsFile)
+    return normalsFile
+
+class NormalEstimator:
+
+    def __init__ (self, plySourcePath, firstFrame, nbFrame, normalsDir, k=NB_NEIGHBOURS, nbJobs=1, log=None):
+        self.plySourcePath = str(plySourcePath)
+        self.firstFrame    = int(firstFrame)
+        self.nbFrame       = int(nbFrame)
+        self.normalsDir    = Path(normalsDir).resolve()
+        self.k             = int(k)
+        self.nbJobs        = max(1, int(nbJobs))
+        self.log           = log or sys.stdout
+
+    def getFrames(self):
+        return list(range(self.firstFrame, self.firstFrame + self.nbFrame))
+
+    # [size, mtime] of a source frame
+    def getFrameStat(self, frame):
+        stat = Path(getFramePath(self.plySourcePath, frame)).stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    # key of the sidecar directory, changes when the source, k or the estimation changes
+    def getSourceKey(self):
+        content = json.dumps({'source': str(Path(self.plySourcePath).resolve()), 'k': self.k,
+                              'estimator': hashlib.sha256(Path(__file__).read_bytes()).hexdigest()}, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    # the key changes when a source frame of the range, k or the estimation changes
+    def getKey(self):
+        content = json.dumps({'source': self.getSourceKey(), 'frames': [self.getFrameStat(frame) for frame in self.getFrames()]})
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    # path with %04d of the source frames with normals
+    def getNormalsPath(self):
+        return self.normalsDir.joinpath(self.getSourceKey()[:16], Path(self.plySourcePath).name)
+
+    def getManifestFile(self):
+        return self.getNormalsPath().parent.joinpath("frames.json")
+
+    def readManifest(self):
+        try:
+            return json.loads(self.getManifestFile().read_text())
+        except (OSError, ValueError):
+            return {}
+
+    # frames without a sidecar frame estimated from the current source frame
+    def getMissingFrames(self):
+        normalsPath = self.getNormalsPath()
+        manifest = self.readManifest()
+        return [frame for frame in self.getFrames() if not Path(getFramePath(normalsPath, frame)).exists() or manifest.get(str(frame)) != self.getFrameStat(frame)]
+
+    def isDone(self):
+        return len(self.getMissingFrames()) == 0
+
+    # estimate the missing frames, the tasks estimating the same frames wait for the first one
+    def run(self):
+        normalsPath = self.getNormalsPath()
+        with ResultCache(self.normalsDir, log=self.log).lock(normalsPath.parent.name):
+            frames = self.getMissingFrames()
+            if not frames:
+                print(utils.GREEN + "Normals already estimated:", normalsPath, utils.ENDC, file=self.log, flush=True)
+                return normalsPath
+            start = time.time()
+            os.makedirs(normalsPath.parent, exist_ok=True)
+            stats   = {str(frame): self.getFrameStat(frame) for frame in frames}
+            sources = [getFramePath(self.plySourcePath, frame) for frame in frames]
+            outputs = [getFramePath(normalsPath, frame) for frame in frames]
+            if self.nbJobs == 1 or len(frames) == 1:
+                for source, output in zip(sources, outputs):
+                    estimateFrame(source, output, self.k)
+            else:
+                with ProcessPoolExecutor(max_workers=min(self.nbJobs, len(frames))) as executor:
+                    list(executor.map(estimateFrame, sources, outputs, [self.k] * len(frames)))
+            # the manifest is only updated under the lock, once the frames are written
+            manifestFile = self.getManifestFile()
+            tmpFile = Path("".join([str(manifestFile), ".", str(os.getpid()), ".tmp"]))
+            tmpFile.write_text(json.dumps(self.readManifest() | stats, indent="\t", sort_keys=True))
+            os.replace(tmpFile, manifestFile)
+            print(utils.GREEN + "Normals of %d frames estimated in %.1f s by %d jobs:" % (len(frames), time.time() - start, self.nbJobs), normalsPath, utils.ENDC, file=self.log, flush=True)
+        return normalsPath
+
+def main():
+    args = parseArgs()
+    NormalEstimator(args.sourcePath, args.firstFrame, args.frameNumber, args.normalsDir, args.neighbours, args.nbJobs).run()
+
+if __name__ == "__main__":
+    main()
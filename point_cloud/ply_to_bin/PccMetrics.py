@@ -0,0 +1,344 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Native computation of the metrics of mm "compare --mode pcc": geometry (D1 point to point and
+# D2 point to plane) and colour (PSNR of Y, Cb, Cr) with a KD-tree, the frames of a sequence are
+# computed in parallel by a process pool. The log written has the sequence results of mm such
+# that it is read by ExtractMetrics and MmLog.
+#   mse1 : decoded points versus their nearest source point, planes given by the source normals
+#   mse2 : source points versus their nearest decoded point, normals transferred from the source
+#   mseF : max(mse1, mse2), PSNR = 10 log10(3 peak^2 / mse) with peak 1023 (vox10) or 2047 (vox11)
+#   c[i] : colour of a point versus the mean colour of its nearest neighbours at the same distance,
+#          in BT.709 YCbCr, PSNR = 10 log10(255^2 / mse), PSNRF is the min of both directions
+# PCQM (mm "compare --mode pcqm") is computed too, see Pcqm.py. The metric families computed
+# (geometry, color, pcqm) are selected as in compute.py. Several decoded sequences of the same
+# source (the rates of a sequence) can be measured at once: each source frame is read and its
+# KD-tree and PCQM features are built once for all of them, one log is written per decoded sequence.
+
+import os, sys, csv, math, time, argparse, contextlib
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial import cKDTree
+from pyntcloud import PyntCloud
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+import MmLog
+import Pcqm
+
+# neighbours searched to find the ones at the same distance than the nearest one, their normals
+# and colours are averaged
+NB_SAME_DISTANCE = 8
+# RGB to YCbCr BT.709, 8 bits
+RGB_TO_YCBCR = np.array([[ 0.2126,  0.7152,  0.0722],
+                         [-0.1146, -0.3854,  0.5   ],
+                         [ 0.5,    -0.4542, -0.0458]])
+YCBCR_OFFSET = np.array([0.0, 128.0, 128.0])
+COLOR_PEAK = 255.0
+# PSNR of identical clouds (mse = 0)
+PSNR_MAX = 999.99
+
+GEOMETRY_LABELS = [
+    "mse1      (p2point) ", "mse1, PSNR(p2point) ",
+    "mse2      (p2point) ", "mse2, PSNR(p2point) ",
+    "mseF      (p2point) ", "mseF, PSNR(p2point) ",
+    ]
+PLANE_LABELS = [
+    "mse1      (p2plane) ", "mse1, PSNR(p2plane) ",
+    "mse2      (p2plane) ", "mse2, PSNR(p2plane) ",
+    "mseF      (p2plane) ", "mseF, PSNR(p2plane) ",
+    ]
+# ExtractMetrics reads "c[0],PSNRF          Mean="
+COLOR_LABELS = [["%-20s" % "".join(["c[", str(channel), "],", name]) for name in ["    1", "PSNR1", "    2", "PSNR2", "    F", "PSNRF"]] for channel in range(3)]
+
+def parseArgs():
+    global parser
+    parser = argparse.ArgumentParser(description='compute the geometry metrics (D1/D2 PSNR) of decoded point clouds versus their source, as mm --mode pcc')
+    parser.add_argument('-a', '--sourcePath',  help="Source PLY path with %%04d for the frame number", type=str, required=True)
+    parser.add_argument('-b', '--decodedPath', help="Decoded PLY paths with %%04d for the frame number, one per decoded sequence of the same source (e.g. one per rate)", type=str, required=True, nargs='+')
+    parser.add_argument('-f', '--firstFrame',  help="First frame number (optional, default=0)", default=0, type=int)
+    parser.add_argument('-n', '--frameNumber', help="Number of frames (optional, default=1)", default=1, type=int)
+    parser.add_argument(      '--resolution',  help="Peak value of the geometry, 1023 for vox10 and 2047 for vox11 (optional, default=read from seqCfgFile)", default=None, type=int)
+    parser.add_argument(      '--seqCfgFile',  help="TMC2 sequence cfg file giving geometry3dCoordinatesBitdepth (optional)", default=None, type=str)
+    parser.add_argument(      '--nbJobs',      help="Number of frames computed in parallel (optional, default=number of cores)", default=os.cpu_count(), type=int)
+    parser.add_argument('-o', '--mmFile',      help="Output logs, one per decoded path, same sequence results than mm, - for the standard output (optional, default=print only)", default=None, type=str, nargs='+')
+    parser.add_argument(      '--frameTable',  help="Output CSV with the values of each frame, one per decoded path (optional)", default=None, type=str, nargs='+')
+    parser.add_argument(      '--metrics',     help="Comma separated metric families among geometry, color and pcqm (optional, default=geometry,color,pcqm)", default=",".join(MmLog.METRIC_FAMILIES), type=str)
+    parser.add_argument(      '--referenceLog', help="mm log of the same frames, the deviation of the means versus mm is printed (optional)", default=None, type=str)
+    return parser.parse_args()
+
+# peak value as in compute.py: 1023 for 10 bits geometry, 2047 otherwise
+def getResolution(seqCfgFile):
+    with open(seqCfgFile) as f:
+        for line in f:
+            if "geometry3dCoordinatesBitdepth" in line:
+                return 1023 if int(line.split(":")[1]) == 10 else 2047
+    raise ValueError("geometry3dCoordinatesBitdepth not found in", seqCfgFile)
+
+def getFramePath(plyPath, frame):
+    return str(plyPath).replace("%04d", '%0*d' % (4, frame), 1)
+
+# returns {positions, normals, colors} as float64 arrays, normals and colors are None when the PLY does not have them
+def readPly(plyFile):
+    points = PyntCloud.from_file(str(plyFile)).points
+    cloud = {'positions': points[["x", "y", "z"]].to_numpy(dtype=np.float64), 'normals': None, 'colors': None}
+    if "nx" in points.columns:
+        cloud['normals'] = points[["nx", "ny", "nz"]].to_numpy(dtype=np.float64)
+    if "red" in points.columns:
+        cloud['colors'] = points[["red", "green", "blue"]].to_numpy(dtype=np.float64)
+    return cloud
+
+def rgbToYCbCr(colors):
+    return colors @ RGB_TO_YCBCR.T + YCBCR_OFFSET
+
+def psnr(mse, peak, factor=3.0):
+    if mse <= 0:
+        return PSNR_MAX
+    return 10.0 * math.log10(factor * peak * peak / mse)
+
+# mean of the values of the neighbours at the same distance than the nearest one
+# (dists, indices : k nearest neighbours of each query point, values : per point values of the searched cloud)
+def averageSameDistance(dists, indices, values):
+    isSame = dists <= dists[:, :1]
+    isSame &= indices < len(values)
+    weights = isSame.astype(np.float64)
+    sums = np.einsum('ij,ijk->ik', weights, values[np.minimum(indices, len(values) - 1)])
+    return sums / weights.sum(axis=1, keepdims=True)
+
+# normals of the decoded points: mean of the normals of the source points having this point as
+# nearest neighbour, or the normal of the nearest source point when there are none
+def transferNormals(sourceNormals, sourceToDecoded, decodedToSource, nbDecoded):
+    normals = np.zeros((nbDecoded, 3))
+    np.add.at(normals, sourceToDecoded, sourceNormals)
+    counts = np.bincount(sourceToDecoded, minlength=nbDecoded)
+    hasSource = counts > 0
+    normals[hasSource] /= counts[hasSource, None]
+    normals[~hasSource] = sourceNormals[decodedToSource[~hasSource]]
+    return normals
+
+# k nearest neighbours in the tree of each query point, as (nbPoints, k) arrays
+def queryNeighbours(tree, queryPositions, k):
+    dists, indices = tree.query(queryPositions, k=min(k, tree.n))
+    if dists.ndim == 1:
+        dists, indices = dists[:, None], indices[:, None]
+    return dists, indices
+
+# mean of the squared errors of the query points versus their nearest neighbour in the other
+# cloud, point to point and, when planeNormals is given, point to plane
+def computeMse(dists, indices, treePositions, queryPositions, planeNormals=None):
+    mse = np.mean(dists[:, 0] * dists[:, 0])
+    if planeNormals is None:
+        return mse, None
+    errors = queryPositions - treePositions[indices[:, 0]]
+    normals = averageSameDistance(dists, indices, planeNormals)
+    projected = np.einsum('ij,ij->i', errors, normals)
+    return mse, np.mean(projected * projected)
+
+# nearest neighbours of the decoded points in the source and of the source points in the decoded
+# cloud, sourceTree is the KD-tree of the source when it is shared by several decoded clouds
+def findNeighbours(source, decoded, k, sourceTree=None):
+    sourceTree = sourceTree if sourceTree is not None else cKDTree(source['positions'])
+    decodedToSource = queryNeighbours(sourceTree, decoded['positions'], k)
+    sourceToDecoded = queryNeighbours(cKDTree(decoded['positions']), source['positions'], k)
+    return decodedToSource, sourceToDecoded
+
+# {label: value} of both directions and of the worst one
+def getValues(labels, errors, peak, factor):
+    mseF = max(errors)
+    return {label: float(value) for label, value in zip(labels, [errors[0], psnr(errors[0], peak, factor), errors[1], psnr(errors[1], peak, factor), mseF, psnr(mseF, peak, factor)])}
+
+# geometry metrics of one frame: {label: value}, p2plane only when the source has normals
+def computeGeometry(source, decoded, neighbours, peak, useNormals=True):
+    decodedToSource, sourceToDecoded = neighbours
+    useNormals = useNormals and source['normals'] is not None
+    decodedNormals = decoded['normals']
+    if useNormals and decodedNormals is None:
+        decodedNormals = transferNormals(source['normals'], sourceToDecoded[1][:, 0], decodedToSource[1][:, 0], len(decoded['positions']))
+
+    mse1, plane1 = computeMse(*decodedToSource, source['positions'], decoded['positions'], source['normals'] if useNormals else None)
+    mse2, plane2 = computeMse(*sourceToDecoded, decoded['positions'], source['positions'], decodedNormals if useNormals else None)
+
+    values = getValues(GEOMETRY_LABELS, (mse1, mse2), peak, 3.0)
+    if useNormals:
+        values.update(getValues(PLANE_LABELS, (plane1, plane2), peak, 3.0))
+    return values
+
+# colour metrics of one frame: {label: value}, the colour of each point is compared with the mean
+# colour of its nearest neighbours in the other cloud, Y, Cb and Cr are computed at once
+def computeColor(source, decoded, neighbours):
+    decodedToSource, sourceToDecoded = neighbours
+    sourceYCbCr  = rgbToYCbCr(source['colors'])
+    decodedYCbCr = rgbToYCbCr(decoded['colors'])
+    errors1 = decodedYCbCr - averageSameDistance(*decodedToSource, sourceYCbCr)
+    errors2 = sourceYCbCr - averageSameDistance(*sourceToDecoded, decodedYCbCr)
+    mse1 = np.mean(errors1 * errors1, axis=0)
+    mse2 = np.mean(errors2 * errors2, axis=0)
+    values = {}
+    for channel in range(3):
+        values.update(getValues(COLOR_LABELS[channel], (mse1[channel], mse2[channel]), COLOR_PEAK, 1.0))
+    return values
+
+# metrics of the families of one frame, run by the worker processes, the colour metrics and PCQM
+# are computed when both clouds have colours
+def computeFrame(sourceFile, decodedFile, peak, useNormals=True, families=MmLog.METRIC_FAMILIES):
+    return computeFrames(sourceFile, [decodedFile], peak, useNormals, families)[0]
+
+# metrics of several decoded frames of the same source frame: [{label: value}], the source frame
+# is read and its KD-tree and PCQM features are built once
+def computeFrames(sourceFile, decodedFiles, peak, useNormals=True, families=MmLog.METRIC_FAMILIES):
+    source = readPly(sourceFile)
+    sourceTree = cKDTree(source['positions'])
+    prepared = None
+    frames = []
+    for decodedFile in decodedFiles:
+        decoded = readPly(decodedFile)
+        useFrameNormals = useNormals and source['normals'] is not None and "geometry" in families
+        useColors = source['colors'] is not None and decoded['colors'] is not None
+        values = {}
+        if "geometry" in families or ("color" in families and useColors):
+            neighbours = findNeighbours(source, decoded, NB_SAME_DISTANCE if useFrameNormals or useColors else 1, sourceTree)
+            if "geometry" in families:
+                values.update(computeGeometry(source, decoded, neighbours, peak, useFrameNormals))
+            if "color" in families and useColors:
+                values.update(computeColor(source, decoded, neighbours))
+        if "pcqm" in families and useColors:
+            prepared = prepared or Pcqm.prepareSource(source, sourceTree)
+            values.update(Pcqm.computePcqm(source, decoded, prepared))
+        frames.append(values)
+    return frames
+
+# metrics of the frames [firstFrame, firstFrame + nbFrame - 1] of a decoded sequence
+class PccMetrics:
+
+    def __init__ (self, plySourcePath, plyDecPath, firstFrame, nbFrame, resolution, nbJobs=1, useNormals=True, log=None, families=MmLog.METRIC_FAMILIES):
+        self.plySourcePath = str(plySourcePath)
+        self.plyDecPath    = str(plyDecPath)
+        self.firstFrame    = firstFrame
+        self.nbFrame       = nbFrame
+        self.resolution    = resolution
+        self.nbJobs        = max(1, int(nbJobs))
+        self.useNormals    = useNormals
+        self.families      = MmLog.parseFamilies(families)
+        self.log           = log or sys.stdout
+        self.frames        = []
+        self.processingTime = 0.0
+
+    def getFrames(self):
+        return list(range(self.firstFrame, self.firstFrame + self.nbFrame))
+
+    # returns [{label: value}] of each frame, the frames are computed in parallel by nbJobs processes
+    def run(self):
+        runBatch([self])
+        return self.frames
+
+    # sequence results {label: {Min, Max, Mean}} of the frames computed
+    def getStats(self):
+        return MmLog.mergeStats([({label: {"Min": value, "Max": value, "Mean": value} for label, value in values.items()}, 1) for values in self.frames])
+
+    def getMeans(self):
+        return {label.strip(): values["Mean"] for label, values in self.getStats().items()}
+
+    # log with the per frame values and the sequence results as written by mm
+    def writeLog(self, mmFile):
+        with (contextlib.nullcontext(sys.stdout) if str(mmFile) == "-" else open(mmFile, 'w')) as f:
+            for frame, values in zip(self.getFrames(), self.frames):
+                print("frame %d" % frame, file=f)
+                for label, value in values.items():
+                    print("   %s: %r" % (label.rstrip(), value), file=f)
+            for label, values in self.getStats().items():
+                print(MmLog.formatStat(label, values), file=f)
+            print(MmLog.END_MARKER, "%d ms" % round(self.processingTime * 1000), file=f)
+        return mmFile
+
+    # {label: (mean, mean of mm, deviation)} of the labels found in a mm log of the same frames
+    def compareWithLog(self, mmFile):
+        reference = MmLog.parseStats(Path(mmFile).read_text(errors="ignore").splitlines())
+        deviations = {}
+        for label, values in self.getStats().items():
+            if label in reference and "Mean" in reference[label]:
+                deviations[label.strip()] = (values["Mean"], reference[label]["Mean"], values["Mean"] - reference[label]["Mean"])
+        return deviations
+
+    # table of the values of each frame
+    def writeFrameTable(self, csvFile):
+        labels = []
+        for values in self.frames:
+            labels += [label for label in values if label not in labels]
+        with open(csvFile, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['Frame'] + [" ".join(label.split()) for label in labels])
+            for frame, values in zip(self.getFrames(), self.frames):
+                writer.writerow([frame] + [values.get(label, "") for label in labels])
+        return csvFile
+
+# compute the frames of several PccMetrics of the same source frames (e.g. the rates of a sequence)
+# at once: the frames are computed in parallel by nbJobs processes and each source frame is read
+# and indexed once for all the decoded sequences
+def runBatch(metricsList):
+    start = time.time()
+    first = metricsList[0]
+    frames = first.getFrames()
+    sources  = [getFramePath(first.plySourcePath, frame) for frame in frames]
+    decodeds = [[getFramePath(metrics.plyDecPath, frame) for metrics in metricsList] for frame in frames]
+    for path in sources + [path for paths in decodeds for path in paths]:
+        if not Path(path).exists():
+            raise ValueError("PLY file not found:", path)
+    if first.nbJobs == 1 or len(frames) == 1:
+        results = [computeFrames(source, decoded, first.resolution, first.useNormals, first.families) for source, decoded in zip(sources, decodeds)]
+    else:
+        with ProcessPoolExecutor(max_workers=min(first.nbJobs, len(frames))) as executor:
+            nbFrame = len(frames)
+            results = list(executor.map(computeFrames, sources, decodeds, [first.resolution] * nbFrame, [first.useNormals] * nbFrame, [first.families] * nbFrame))
+    processingTime = time.time() - start
+    for idx, metrics in enumerate(metricsList):
+        metrics.frames = [values[idx] for values in results]
+        metrics.processingTime = processingTime / len(metricsList)
+    print(utils.GREEN + "Metrics of %d frames of %d decoded sequences computed in %.1f s by %d jobs" % (len(frames), len(metricsList), processingTime, first.nbJobs), utils.ENDC, file=first.log, flush=True)
+    return metricsList
+
+def main():
+    args = parseArgs()
+    resolution = args.resolution or (getResolution(args.seqCfgFile) if args.seqCfgFile else None)
+    if resolution is None:
+        parser.error("--resolution or --seqCfgFile is required")
+    for option, values in [("-o", args.mmFile), ("--frameTable", args.frameTable)]:
+        if values and len(values) != len(args.decodedPath):
+            parser.error(" ".join([option, "needs one file per decoded path"]))
+    if args.mmFile and "-" in args.mmFile and len(args.decodedPath) > 1:
+        parser.error("-o - needs a single decoded path")
+    metricsList = [PccMetrics(args.sourcePath, decodedPath, args.firstFrame, args.frameNumber, resolution, args.nbJobs, families=args.metrics) for decodedPath in args.decodedPath]
+    runBatch(metricsList)
+    for idx, metrics in enumerate(metricsList):
+        if args.mmFile != ["-"]:
+            if len(metricsList) > 1:
+                print(utils.BLUE + metrics.plyDecPath, utils.ENDC)
+            for label, value in metrics.getMeans().items():
+                print("%-20s Mean= %f" % (label, value))
+        if args.mmFile:
+            metrics.writeLog(args.mmFile[idx])
+        if args.frameTable:
+            metrics.writeFrameTable(args.frameTable[idx])
+        if args.referenceLog:
+            print(utils.BLUE + "Deviation versus", args.referenceLog, utils.ENDC)
+            for label, (value, reference, deviation) in metrics.compareWithLog(args.referenceLog).items():
+                print("%-20s %f mm= %f deviation= %+f" % (label, value, reference, deviation))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# PCQM of a decoded point cloud versus its source (Meynet et al., "PCQM: A Full-Reference Quality
+# Metric for Colored 3D Point Clouds", QoMEX 2020), computed with numpy on chunks of points. The
+# curvature of a point is the mean curvature of the quadric fitted by least squares to its
+# neighbours within the radius (at least MIN_NEIGHBOURS of them, as the knn fallback of the
+# reference) in the frame of their principal axes. Each decoded point gets the curvature and colour
+# of the source surface at its position (its nearest source point). Around each source point, all
+# the decoded points within the radius are weighted by a gaussian and 8 features compare the decoded
+# and source signals: curvature (comparison, contrast, structure), lightness (comparison, contrast,
+# structure), chroma and hue. PCQM is the weighted sum of the features averaged over the source
+# points, 0 for identical clouds. The neighbourhoods are kept as flat arrays of (owner, neighbour)
+# pairs, queried by chunks of at most MAX_PAIRS pairs such that the memory does not depend on the
+# size of the frame.
+
+import math, itertools
+import numpy as np
+from scipy.spatial import cKDTree
+
+# neighbourhood radius relative to the largest dimension of the source bounding box
+RADIUS_FACTOR = 0.004
+# minimum number of neighbours of the curvature, the nearest ones when the radius has fewer
+MIN_NEIGHBOURS = 20
+# (point, neighbour) pairs of a chunk of neighbourhoods
+MAX_PAIRS = 1 << 19
+# regularisation of the least squares fit of the quadric, relative to the trace of its normal matrix
+QUADRIC_RIDGE = 1e-9
+# stabilisation constants of the features, curvature in 1/voxel and lightness in [0, 100]
+CURVATURE_CONSTANTS = (1e-4, 1e-4, 1e-4)
+LIGHTNESS_CONSTANTS = (1.0, 1.0, 1.0)
+CHROMA_CONSTANT     = 1.0
+HUE_CONSTANT        = 1.0
+# weights of the features: curvature (comparison, contrast, structure), lightness (comparison, contrast, structure), chroma, hue
+PCQM_WEIGHTS = np.array([0.0057, 0.0910, 0.0042, 0.0631, 0.0504, 0.0055, 0.5640, 0.2161])
+# PCQM-PSNR is the PSNR of PCQM with a peak of 1
+PSNR_MAX = 999.99
+
+LABELS = ["PCQM ", "PCQM-PSNR "]
+
+# neighbourhoods of the query points: all the points of the tree within radius, or the
+# minNeighbours nearest ones when there are fewer. Yields by chunks of at most MAX_PAIRS pairs (and
+# at least one query point) (start, stop, owners, indices, dists): the pairs of the query points
+# [start, stop) sorted by query point, owners being the query point of each pair relative to start
+def queryRadius(tree, queryPositions, radius, minNeighbours=1):
+    minNeighbours = min(minNeighbours, tree.n)
+    lengths = tree.query_ball_point(queryPositions, radius, return_length=True)
+    counts = np.maximum(lengths, minNeighbours)
+    ends = np.cumsum(counts)
+    start = 0
+    while start < len(queryPositions):
+        stop = max(start + 1, int(np.searchsorted(ends, ends[start] - counts[start] + MAX_PAIRS, side='right')))
+        block = queryPositions[start:stop]
+        # the balls with enough points, the nearest points for the other ones
+        ballRows = np.flatnonzero(lengths[start:stop] >= minNeighbours)
+        fewRows = np.flatnonzero(lengths[start:stop] < minNeighbours)
+        balls = tree.query_ball_point(block[ballRows], radius, return_sorted=False)
+        owners = np.concatenate([np.repeat(ballRows, lengths[start:stop][ballRows]), np.repeat(fewRows, minNeighbours)])
+        indices = np.fromiter(itertools.chain.from_iterable(balls), dtype=np.intp, count=int(lengths[start:stop][ballRows].sum()))
+        if len(fewRows):
+            nearest = tree.query(block[fewRows], k=minNeighbours)[1].reshape(len(fewRows), minNeighbours)
+            indices = np.concatenate([indices, nearest.ravel()])
+            order = np.argsort(owners, kind='stable')
+            owners, indices = owners[order], indices[order]
+        dists = np.linalg.norm(tree.data[indices] - block[owners], axis=1)
+        yield start, stop, owners, indices, dists
+        start = stop
+
+# sums of the values of the pairs of each query point
+def sumPairs(owners, values, nbRows):
+    return np.bincount(owners, weights=values, minlength=nbRows)
+
+# absolute mean curvature of each point: its neighbours are expressed in the frame of their principal
+# axes centred on the point, the quadric z = a x^2 + b xy + c y^2 + d x + e y + f is fitted by least
+# squares and H = ((1 + e^2) 2a - 2 d e b + (1 + d^2) 2c) / (2 (1 + d^2 + e^2)^(3/2)) at the point;
+# the sign of H depends on the orientation of the normal, which is arbitrary
+def computeCurvature(positions, tree, radius):
+    curvature = np.zeros(len(positions))
+    for start, stop, owners, indices, dists in queryRadius(tree, positions, radius, MIN_NEIGHBOURS):
+        nbRows = stop - start
+        offsets = tree.data[indices] - positions[start:stop][owners]
+        counts = np.bincount(owners, minlength=nbRows).astype(np.float64)
+        means = np.stack([sumPairs(owners, offsets[:, i], nbRows) for i in range(3)], axis=1) / counts[:, None]
+        covariances = np.empty((nbRows, 3, 3))
+        for i in range(3):
+            for j in range(i, 3):
+                covariances[:, i, j] = covariances[:, j, i] = sumPairs(owners, offsets[:, i] * offsets[:, j], nbRows) / counts - means[:, i] * means[:, j]
+        axes = np.linalg.eigh(covariances)[1]
+        # largest, middle and lowest axes, the last one being the normal
+        local = np.einsum('ij,ijk->ik', offsets, axes[owners][:, :, ::-1])
+        x, y, z = local[:, 0], local[:, 1], local[:, 2]
+        monomials = [x * x, x * y, y * y, x, y, np.ones(len(x))]
+        normal = np.empty((nbRows, 6, 6))
+        for i in range(6):
+            for j in range(i, 6):
+                normal[:, i, j] = normal[:, j, i] = sumPairs(owners, monomials[i] * monomials[j], nbRows)
+        rhs = np.stack([sumPairs(owners, monomial * z, nbRows) for monomial in monomials], axis=1)
+        # the ridge keeps the system of a degenerate neighbourhood (collinear points) solvable
+        normal += np.eye(6) * (QUADRIC_RIDGE * np.trace(normal, axis1=1, axis2=2))[:, None, None]
+        a, b, c, d, e, f = np.linalg.solve(normal, rhs[:, :, None])[:, :, 0].T
+        h = ((1 + e * e) * 2 * a - 2 * d * e * b + (1 + d * d) * 2 * c) / (2 * (1 + d * d + e * e) ** 1.5)
+        curvature[start:stop] = np.abs(h)
+    return curvature
+
+# CIE L*a*b* (D65) of sRGB colours in [0, 255]
+def rgbToLab(colors):
+    rgb = colors / 255.0
+    rgb = np.where(rgb > 0.04045, ((rgb + 0.055) / 1.055) ** 2.4, rgb / 12.92)
+    xyz = rgb @ np.array([[0.4124, 0.3576, 0.1805],
+                          [0.2126, 0.7152, 0.0722],
+                          [0.0193, 0.1192, 0.9505]]).T
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > 216 / 24389, np.cbrt(xyz), (24389 / 27 * xyz + 16) / 116)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+# weighted mean, standard deviation of both signals and their covariance over the neighbourhoods,
+# the values and weights being the ones of the pairs of owners
+def getStatistics(owners, weights, valuesR, valuesD, nbRows):
+    meanR = sumPairs(owners, weights * valuesR, nbRows)
+    meanD = sumPairs(owners, weights * valuesD, nbRows)
+    centeredR = valuesR - meanR[owners]
+    centeredD = valuesD - meanD[owners]
+    stdR = np.sqrt(sumPairs(owners, weights * centeredR * centeredR, nbRows))
+    stdD = np.sqrt(sumPairs(owners, weights * centeredD * centeredD, nbRows))
+    covariance = sumPairs(owners, weights * centeredR * centeredD, nbRows)
+    return meanR, meanD, stdR, stdD, covariance
+
+# comparison, contrast and structure features of a signal
+def getFeatures(owners, weights, valuesR, valuesD, constants, nbRows):
+    meanR, meanD, stdR, stdD, covariance = getStatistics(owners, weights, valuesR, valuesD, nbRows)
+    c1, c2, c3 = constants
+    comparison = 1 - (2 * meanR * meanD + c1) / (meanR * meanR + meanD * meanD + c1)
+    contrast   = 1 - (2 * stdR * stdD + c2) / (stdR * stdR + stdD * stdD + c2)
+    structure  = 1 - (np.abs(covariance) + c3) / (stdR * stdD + c3)
+    return [comparison, contrast, np.clip(structure, 0, 1)]
+
+# everything PCQM needs from the source frame, computed once when several decoded frames (e.g. the
+# rates of a sequence) are compared with the same source; sourceTree is an optional KD-tree of the source positions
+def prepareSource(source, sourceTree=None):
+    positions = source['positions']
+    radius = max(RADIUS_FACTOR * np.max(np.ptp(positions, axis=0)), 1.0)
+    tree = sourceTree if sourceTree is not None else cKDTree(positions)
+    return {'tree': tree, 'radius': radius, 'curvature': computeCurvature(positions, tree, radius), 'lab': rgbToLab(source['colors'])}
+
+# PCQM of one frame: {label: value}, source and decoded are clouds of PccMetrics.readPly with colours,
+# prepared is the result of prepareSource(source) when it is shared by several decoded frames
+def computePcqm(source, decoded, prepared=None):
+    prepared = prepared or prepareSource(source)
+    sourcePositions  = source['positions']
+    decodedPositions = decoded['positions']
+    radius = prepared['radius']
+    sourceTree  = prepared['tree']
+    decodedTree = cKDTree(decodedPositions)
+
+    # signals of the decoded points and of the source surface at the decoded points
+    decodedCurvature = computeCurvature(decodedPositions, decodedTree, radius)
+    sourceCurvature  = prepared['curvature']
+    decodedLab = rgbToLab(decoded['colors'])
+    sourceLab  = prepared['lab']
+    nearestSource = sourceTree.query(decodedPositions, k=1)[1]
+    signalsD = [decodedCurvature, decodedLab[:, 0], decodedLab[:, 1], decodedLab[:, 2]]
+    signalsR = [sourceCurvature[nearestSource], sourceLab[nearestSource, 0], sourceLab[nearestSource, 1], sourceLab[nearestSource, 2]]
+
+    # features of the source points from the gaussian weights of the decoded points around them
+    total = 0.0
+    sigma = radius / 2
+    for start, stop, owners, indices, dists in queryRadius(decodedTree, sourcePositions, radius):
+        nbRows = stop - start
+        weights = np.exp(-dists * dists / (2 * sigma * sigma))
+        weights /= sumPairs(owners, weights, nbRows)[owners]
+        curvatureR, lightnessR, aR, bR = [signal[indices] for signal in signalsR]
+        curvatureD, lightnessD, aD, bD = [signal[indices] for signal in signalsD]
+
+        features  = getFeatures(owners, weights, curvatureR, curvatureD, CURVATURE_CONSTANTS, nbRows)
+        features += getFeatures(owners, weights, lightnessR, lightnessD, LIGHTNESS_CONSTANTS, nbRows)
+        chromaR = sumPairs(owners, weights * np.hypot(aR, bR), nbRows)
+        chromaD = sumPairs(owners, weights * np.hypot(aD, bD), nbRows)
+        features.append(1 - (2 * chromaR * chromaD + CHROMA_CONSTANT) / (chromaR * chromaR + chromaD * chromaD + CHROMA_CONSTANT))
+        deltaA = sumPairs(owners, weights * (aR - aD), nbRows)
+        deltaB = sumPairs(owners, weights * (bR - bD), nbRows)
+        deltaHue2 = np.maximum(deltaA * deltaA + deltaB * deltaB - (chromaR - chromaD) ** 2, 0)
+        features.append(1 - 1 / (1 + deltaHue2 / HUE_CONSTANT))
+        total += float(np.sum(PCQM_WEIGHTS @ np.stack(features)))
+
+    pcqm = total / len(sourcePositions)
+    return {LABELS[0]: pcqm, LABELS[1]: psnr(pcqm)}
+
+def psnr(pcqm):
+    if pcqm <= 0:
+        return PSNR_MAX
+    return 10.0 * math.log10(1.0 / pcqm)
@@ -0,0 +1,197 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Search of the QPs hitting target bitrates: the "TargetRateList" of a sequence of the test
+# configuration ([{"RateId", "bitrate"}], in Mbps as in the CSV) is matched by probe encodes of its
+# first frames. The QP pairs are taken on the ladder given by the "RateList" of the sequence (the
+# CTC rates without one): the search variable is the geometry QP, the attribute QP is interpolated
+# between the pairs of the ladder (offset as the nearest pair outside of it) and the occupancy
+# precision is the one of the nearest pair. The first round encodes the pairs of the ladder, then
+# the logarithm of the bitrate is close to linear in the QP: a target takes a secant step between
+# the two probes bracketing it, or a step of the line fitted on the probes of the sequence when no
+# probe is on one of its sides. The steps of all the targets are encoded in parallel in the next
+# round, until a probe is within the tolerance of the target or the bracket is two consecutive QPs.
+# The test configuration is then written with a RateList of the found pairs for the full run.
+
+import sys, json, copy, math
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+import ExtractMetrics
+
+# (geometryQP, attributeQP, occupancyPrecision) of the CTC rates R1 to R5
+DEFAULT_LADDER = [(16, 22, 2), (20, 27, 2), (24, 32, 4), (28, 37, 4), (32, 42, 4)]
+QP_RANGE = (0, 51)
+# log bitrate per QP when the probes of a sequence do not give a decreasing line: half the bitrate every 6 QPs
+DEFAULT_SLOPE = -math.log(2) / 6
+TOLERANCE = 0.05
+MAX_ROUNDS = 8
+
+# [(geometryQP, attributeQP, occupancyPrecision)] of a RateList sorted by geometry QP
+def getLadder(rateList):
+    ladder = {int(rate['geometryQP']): (int(rate['attributeQP']), int(rate['occupancyPrecision'])) for rate in rateList}
+    return sorted((geoQP, attQP, occPrec) for geoQP, (attQP, occPrec) in ladder.items()) or list(DEFAULT_LADDER)
+
+# QP pair and occupancy precision of a geometry QP on a ladder
+def getQpPair(ladder, geoQP):
+    nearest = min(ladder, key=lambda pair: abs(pair[0] - geoQP))
+    attQP = geoQP + nearest[1] - nearest[0]
+    for (geo0, att0, occ0), (geo1, att1, occ1) in zip(ladder, ladder[1:]):
+        if geo0 <= geoQP <= geo1:
+            attQP = round(att0 + (att1 - att0) * (geoQP - geo0) / (geo1 - geo0))
+    return geoQP, min(max(attQP, QP_RANGE[0]), QP_RANGE[1]), nearest[2]
+
+# slope of the least squares line of the log bitrate on the geometry QP of the probes
+def getSlope(probes):
+    if len(probes) < 2:
+        return DEFAULT_SLOPE
+    meanQp = sum(probes) / len(probes)
+    meanLog = sum(math.log(bitrate) for bitrate in probes.values()) / len(probes)
+    slope = sum((qp - meanQp) * (math.log(bitrate) - meanLog) for qp, bitrate in probes.items()) / sum((qp - meanQp) ** 2 for qp in probes)
+    return slope if slope < 0 else DEFAULT_SLOPE
+
+# next geometry QP to probe for a target bitrate and whether the search ended, probes = {geometryQP: bitrate}
+def getNextQp(probes, target, tolerance=TOLERANCE):
+    best = min(probes, key=lambda qp: abs(math.log(probes[qp] / target)))
+    if abs(probes[best] / target - 1) <= tolerance:
+        return best, True
+    above = [qp for qp in probes if probes[qp] >= target]
+    below = [qp for qp in probes if probes[qp] < target]
+    if above and below:
+        qpA, qpB = max(above), min(below)
+        if qpB - qpA <= 1:
+            # consecutive QPs, or a bitrate not decreasing with the QP
+            return best, True
+        logA, logB = math.log(probes[qpA]), math.log(probes[qpB])
+        qp = qpA + (logA - math.log(target)) * (qpB - qpA) / (logA - logB)
+        return min(max(round(qp), qpA + 1), qpB - 1), False
+    # extrapolate from the probe nearest to the target
+    ref = max(probes) if above else min(probes)
+    qp = round(ref + (math.log(target) - math.log(probes[ref])) / getSlope(probes))
+    qp = max(qp, ref + 1) if above else min(qp, ref - 1)
+    qp = min(max(qp, QP_RANGE[0]), QP_RANGE[1])
+    return (best, True) if qp == ref else (qp, False)
+
+class RateMatcher:
+
+    # binGen      : BinGenerator adding and running the probe encodes
+    # probeFrames : frames of the probe encodes, the first ones of the sequence
+    # tolerance   : relative distance to the target accepted
+    # rateConfig  : test configuration written with the found RateList
+    def __init__ (self, config_manager, binGen, nbThreads=1, probeFrames=8, tolerance=TOLERANCE, rateConfig=None):
+        self.config_manager = config_manager
+        self.binGen         = binGen
+        self.nbThreads      = nbThreads
+        self.probeFrames    = max(1, int(probeFrames))
+        self.tolerance      = tolerance
+        self.rateConfig     = Path(rateConfig) if rateConfig else Path(config_manager.outputDir).joinpath("".join([Path(config_manager.testConfigJson).stem, "_rates.json"]))
+        self.testConfigData = copy.deepcopy(config_manager.testConfigData)
+
+    # one search per sequence of a test with a TargetRateList
+    def getSearches(self):
+        searches = []
+        for test in self.testConfigData['TestList']:
+            for seq in test['SeqList']:
+                if not seq.get('TargetRateList'):
+                    continue
+                name, fps, config, ply, maxNbFrame = self.config_manager.getSequenceInfo(seq['SeqId'], self.config_manager.sequenceData)
+                searches.append({'test': test, 'seq': seq, 'name': name, 'fps': fps, 'config': config, 'ply': ply,
+                                 'nbFrame': min(self.probeFrames, maxNbFrame), 'ladder': getLadder(seq.get('RateList', [])),
+                                 'targets': [(int(rate['RateId']), float(rate['bitrate'])) for rate in seq['TargetRateList']],
+                                 # geometryQP: bitrate of the probe, None when its encode failed
+                                 'probes': {}, 'found': {}})
+        return searches
+
+    # encode the probes [(search, geometryQP)] in parallel and read their bitrates
+    def probe(self, requests, coreBudget=None):
+        indices = {}
+        for search, geoQP in requests:
+            if geoQP in search['probes'] or (id(search), geoQP) in indices:
+                continue
+            geoQP, attQP, occPrec = getQpPair(search['ladder'], geoQP)
+            test = search['test']
+            # the rate id of a probe is given by its QPs, a probe already encoded is not run again
+            rateId = geoQP * 100 + attQP
+            self.binGen.addTest(search['seq']['SeqId'], search['name'], search['fps'], search['config'], search['ply'],
+                                search['seq']['Condition'], search['nbFrame'], rateId, geoQP, attQP, occPrec,
+                                False, False, False, True, "_".join([test['TestName'], "probe"]), test['EncoderParams'], self.nbThreads, test['Profile'])
+            indices[(id(search), geoQP)] = (search, geoQP, len(self.binGen.computeTasks) - 1)
+        if not indices:
+            return
+        print(utils.BLUE + "Rate matching: %d probe encodes of %d frames" % (len(indices), self.probeFrames), utils.ENDC, flush=True)
+        self.binGen.runEncoders([idx for search, geoQP, idx in indices.values()], coreBudget)
+        for search, geoQP, idx in indices.values():
+            encoderFile = self.binGen.taskList[idx]['files']['encoderFile']
+            try:
+                nbFrame, total = ExtractMetrics.extract_total(encoderFile)
+                search['probes'][geoQP] = ExtractMetrics.getBitrate(total, search['fps'], nbFrame) if nbFrame and total else None
+            except OSError:
+                search['probes'][geoQP] = None
+
+    # probed QPs and bitrates of a search, without the failed encodes
+    def getProbes(self, search):
+        return {geoQP: bitrate for geoQP, bitrate in search['probes'].items() if bitrate}
+
+    def run(self, coreBudget=None):
+        searches = self.getSearches()
+        if not searches:
+            print(utils.RED + "Rate matching: no sequence with a TargetRateList in", self.config_manager.testConfigJson, utils.ENDC, flush=True)
+            return False
+        requests = [(search, geoQP) for search in searches for geoQP, attQP, occPrec in search['ladder']]
+        for rounds in range(MAX_ROUNDS):
+            self.probe(requests, coreBudget)
+            requests = []
+            for search in searches:
+                probes = self.getProbes(search)
+                for rateId, target in search['targets']:
+                    if rateId in search['found'] or not probes:
+                        continue
+                    geoQP, isDone = getNextQp(probes, target, self.tolerance)
+                    if isDone or geoQP in search['probes']:
+                        search['found'][rateId] = min(probes, key=lambda qp: abs(math.log(probes[qp] / target)))
+                    else:
+                        requests.append((search, geoQP))
+            if not requests:
+                break
+
+        isSuccess = True
+        print(utils.BLUE + "Rate matching summary:", utils.ENDC)
+        for search in searches:
+            probes = self.getProbes(search)
+            rateList = []
+            for rateId, target in search['targets']:
+                if rateId not in search['found'] and probes:
+                    # not converged in MAX_ROUNDS rounds
+                    search['found'][rateId] = min(probes, key=lambda qp: abs(math.log(probes[qp] / target)))
+                if rateId not in search['found']:
+                    isSuccess = False
+                    print(utils.RED + "  - S%s C2%s R%04d target %.3f Mbps: no probe encoded" % (search['seq']['SeqId'], search['seq']['Condition'], rateId, target), utils.ENDC)
+                    continue
+                geoQP, attQP, occPrec = getQpPair(search['ladder'], search['found'][rateId])
+                bitrate = probes[geoQP]
+                isMatched = abs(bitrate / target - 1) <= self.tolerance
+                color = utils.GREEN if isMatched else utils.RED
+                print(color + "  - S%s C2%s R%04d target %.3f Mbps: geometryQP %d attributeQP %d occupancyPrecision %d, probe %.3f Mbps (%+.1f%%)"
+                      % (search['seq']['SeqId'], search['seq']['Condition'], rateId, target, geoQP, attQP, occPrec, bitrate, 100 * (bitrate / target - 1)), utils.ENDC)
+                rateList.append({"RateId": rateId, "geometryQP": str(geoQP), "attributeQP": str(attQP), "occupancyPrecision": str(occPrec)})
+            search['seq']['RateList'] = rateList
+        with open(self.rateConfig, 'w') as f:
+            json.dump(self.testConfigData, f, indent="\t")
+        print(utils.GREEN + "Test configuration with the matched rates:", self.rateConfig, utils.ENDC, flush=True)
+        return isSuccess
@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import os, sys, json, time, shutil, socket, hashlib, platform, threading
+from contextlib import contextmanager
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+# Content addressed cache of the stage results (bitstream, logs): an entry is keyed by a hash
+# of everything that determines the result (configuration contents, options, tool binaries,
+# source frames), so a hit can always be restored and identical tasks share one result.
+#   <cacheDir>/objects/<key[:2]>/<key>/<artifact> : stored artifacts
+#   <cacheDir>/digests/<hash of path>.json        : file digests, reused while size and mtime are unchanged
+#   <cacheDir>/locks/<key>.lock                   : held while an entry is computed
+class ResultCache:
+
+    def __init__ (self, cacheDir, pollInterval=5, log=None):
+        self.cacheDir     = utils.createPath(Path(cacheDir).resolve())
+        self.pollInterval = pollInterval
+        self.log          = log or sys.stdout
+
+    def fileDigest(self, path):
+        path = Path(path).resolve()
+        stat = path.stat()
+        memoFile = utils.createPath(self.cacheDir.joinpath("digests")).joinpath("".join([hashlib.sha1(str(path).encode()).hexdigest(), ".json"]))
+        if memoFile.exists():
+            try:
+                with open(memoFile, 'r') as f:
+                    memo = json.load(f)
+                if memo['size'] == stat.st_size and memo['mtime'] == stat.st_mtime_ns:
+                    return memo['digest']
+            except (ValueError, KeyError):
+                pass
+
+        hasher = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        self.writeJson(memoFile, {'path': str(path), 'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'digest': digest})
+        return digest
+
+    def frameDigests(self, plyPath, firstFrame, nbFrame):
+        return [self.fileDigest(str(plyPath).replace("%04d", '%0*d' % (4, frame), 1)) for frame in range(firstFrame, firstFrame + nbFrame)]
+
+    def key(self, kind, items):
+        content = json.dumps({'kind': kind, 'items': items}, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def entryDir(self, key):
+        return self.cacheDir.joinpath("objects", key[:2], key)
+
+    def has(self, key):
+        return self.entryDir(key).is_dir()
+
+    # artifacts = {name: path}, returns False when the entry does not exist
+    def restore(self, key, artifacts):
+        entryDir = self.entryDir(key)
+        if not entryDir.is_dir():
+            return False
+        if not all(entryDir.joinpath(name).exists() for name in artifacts):
+            return False
+        for name, path in artifacts.items():
+            os.makedirs(Path(path).parent, exist_ok=True)
+            shutil.copyfile(entryDir.joinpath(name), path)
+        return True
+
+    def store(self, key, artifacts):
+        entryDir = self.entryDir(key)
+        tmpDir = self.tmpPath(entryDir)
+        shutil.rmtree(tmpDir, ignore_errors=True)
+        os.makedirs(tmpDir)
+        for name, path in artifacts.items():
+            shutil.copyfile(path, tmpDir.joinpath(name))
+        shutil.rmtree(entryDir, ignore_errors=True)
+        os.replace(tmpDir, entryDir)
+
+    # only one process computes an entry, the others wait and restore it
+    @contextmanager
+    def lock(self, key):
+        lockFile = utils.createPath(self.cacheDir.joinpath("locks")).joinpath("".join([key, ".lock"]))
+        owner = " ".join([socket.gethostname(), str(os.getpid()), str(threading.get_ident())])
+        isWaiting = False
+        while True:
+            try:
+                fd = os.open(lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, owner.encode())
+                os.close(fd)
+                break
+            except FileExistsError:
+                if self.isStaleLock(lockFile):
+                    print(utils.RED + "Remove stale cache lock", lockFile, utils.ENDC, file=self.log, flush=True)
+                    self.removeFile(lockFile)
+                    continue
+                if not isWaiting:
+                    print(utils.BLUE + "Wait for the same result computed by another task", key, utils.ENDC, file=self.log, flush=True)
+                    isWaiting = True
+                time.sleep(self.pollInterval)
+        try:
+            yield
+        finally:
+            self.removeFile(lockFile)
+
+    def isStaleLock(self, lockFile):
+        # a lock can only be checked when it is owned by a process of this host
+        if platform.system() == "Windows":
+            return False
+        try:
+            host, pid = lockFile.read_text().split()[:2]
+        except (FileNotFoundError, ValueError):
+            return False
+        if host != socket.gethostname():
+            return False
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+        return False
+
+    def removeFile(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    # temporary file unique per host, process and thread, renamed once written
+    def tmpPath(self, path):
+        return Path("".join([str(path), ".", socket.gethostname(), ".", str(os.getpid()), ".", str(threading.get_ident()), ".tmp"]))
+
+    def writeJson(self, path, data):
+        tmpPath = self.tmpPath(path)
+        with open(tmpPath, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmpPath, path)
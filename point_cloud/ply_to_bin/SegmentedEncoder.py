@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Frame-parallel encoding of the all intra condition: the frames are coded independently, so the
+# frames of a test are split into segments of consecutive frames encoded by TMC2 processes running
+# at the same time (startFrameNumber and frameCount of each segment). A segment is a multiple of
+# the group of frames size of the sequence: TMC2 codes each group of frames on its own (with its
+# own parameter sets and video sizes), the segments then give the same V3C units than a single
+# encode. The V3C sample streams of the segments are merged into the bitstream of the test and
+# their logs into the encoder log: the frame and bit counts of the segments are summed by
+# ExtractMetrics as they are, the processing time and peak memory lines of the segments are
+# replaced by the ones of the whole encode.
+
+import os, sys, math, time, shlex, subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+import ResourceMonitor
+
+END_MARKER = "Processing time (wall):"
+USER_SELF_MARKER = "Processing time (user.self):"
+USER_CHILDREN_MARKER = "Processing time (user.children):"
+MEMORY_MARKER = "Peak memory:"
+SEGMENT_MARKER = "# segment frames"
+
+# V3C units of a V3C sample stream (ISO/IEC 23090-5 annex C): a header byte whose 3 most
+# significant bits are the size precision in bytes minus 1, then each unit preceded by its size
+def readSampleStream(binFile):
+    data = Path(binFile).read_bytes()
+    if not data:
+        raise ValueError("Empty V3C sample stream:", binFile)
+    precision = (data[0] >> 5) + 1
+    units = []
+    pos = 1
+    while pos < len(data):
+        size = int.from_bytes(data[pos:pos + precision], 'big')
+        pos += precision
+        if pos > len(data) or pos + size > len(data):
+            raise ValueError("Truncated V3C sample stream:", binFile)
+        units.append(data[pos:pos + size])
+        pos += size
+    return units
+
+# the precision is the smallest one holding the size of the largest unit, as TMC2 does
+def writeSampleStream(units, binFile):
+    precision = max([1] + [(len(unit).bit_length() + 7) // 8 for unit in units])
+    tmpFile = Path("".join([str(binFile), ".tmp"]))
+    with open(tmpFile, 'wb') as f:
+        f.write(bytes([(precision - 1) << 5]))
+        for unit in units:
+            f.write(len(unit).to_bytes(precision, 'big'))
+            f.write(unit)
+    os.replace(tmpFile, binFile)
+    return binFile
+
+def mergeBitstreams(segmentFiles, binFile):
+    return writeSampleStream([unit for segmentFile in segmentFiles for unit in readSampleStream(segmentFile)], binFile)
+
+def parseValue(line, marker):
+    return float(line.split(marker)[1].split()[0])
+
+# encoder log of the test from the logs of its segments: logs = [(log, first frame, last frame)],
+# wallTime is the time of the whole encode, the user times are summed and the peak memory is the
+# largest one of the segments (each one is a process)
+def mergeLogs(logs, logFile, wallTime):
+    userSelf = userChildren = 0.0
+    peakMemory = 0
+    tmpFile = Path("".join([str(logFile), ".tmp"]))
+    with open(tmpFile, 'w') as out:
+        for segmentLog, firstFrame, lastFrame in logs:
+            print("%s %d-%d" % (SEGMENT_MARKER, firstFrame, lastFrame), file=out)
+            for line in Path(segmentLog).read_text(errors="ignore").splitlines():
+                if END_MARKER in line:
+                    continue
+                elif USER_SELF_MARKER in line:
+                    userSelf += parseValue(line, USER_SELF_MARKER)
+                elif USER_CHILDREN_MARKER in line:
+                    userChildren += parseValue(line, USER_CHILDREN_MARKER)
+                elif MEMORY_MARKER in line:
+                    peakMemory = max(peakMemory, int(parseValue(line, MEMORY_MARKER)))
+                else:
+                    print(line, file=out)
+        print("# %d segments merged" % len(logs), file=out)
+        print(END_MARKER, "%.3f s" % wallTime, file=out)
+        print(USER_SELF_MARKER, "%.3f s" % userSelf, file=out)
+        print(USER_CHILDREN_MARKER, "%.3f s" % userChildren, file=out)
+        print(MEMORY_MARKER, "%d KB" % peakMemory, file=out)
+    os.replace(tmpFile, logFile)
+    return logFile
+
+def getSegmentFile(path, firstFrame, lastFrame):
+    path = Path(path)
+    return path.with_name("".join([path.stem, "_seg_%04d_%04d" % (firstFrame, lastFrame), path.suffix]))
+
+class SegmentedEncoder:
+
+    # encoderCmd : function (startFrameNumber, frameCount, compressedStreamPath, nbThread) returning
+    #              the encoder command line of a segment
+    # nbThreads  : threads of the whole encode, shared by the segments running at the same time
+    def __init__ (self, encoderCmd, compressBinFile, encoderFile, firstFrame, nbFrame, segmentSize, nbThreads,
+                  groupSize=1, cmdFile=None, log=None, processes=None):
+        self.encoderCmd      = encoderCmd
+        self.compressBinFile = Path(compressBinFile)
+        self.encoderFile     = Path(encoderFile)
+        self.firstFrame      = int(firstFrame)
+        self.nbFrame         = int(nbFrame)
+        self.groupSize       = max(1, int(groupSize))
+        # rounded up to a multiple of the group of frames size
+        self.segmentSize     = self.groupSize * math.ceil(max(1, int(segmentSize)) / self.groupSize)
+        self.nbThreads       = max(1, int(nbThreads))
+        self.cmdFile         = cmdFile
+        self.log             = log or sys.stdout
+        self.processes       = processes if processes is not None else []
+        # resource usage of the segment encoders
+        self.recordFile      = ResourceMonitor.getRecordFile(self.encoderFile)
+
+    # [(first frame, last frame)] of the segments
+    def getSegments(self):
+        lastFrame = self.firstFrame + self.nbFrame - 1
+        return [(first, min(first + self.segmentSize - 1, lastFrame)) for first in range(self.firstFrame, lastFrame + 1, self.segmentSize)]
+
+    def encode(self, firstFrame, lastFrame, nbThread):
+        binFile = getSegmentFile(self.compressBinFile, firstFrame, lastFrame)
+        logFile = getSegmentFile(self.encoderFile, firstFrame, lastFrame)
+        cmd = self.encoderCmd(firstFrame, lastFrame - firstFrame + 1, binFile, nbThread)
+        if self.cmdFile:
+            with open(self.cmdFile, 'a') as f:
+                print(shlex.join(cmd), ">", shlex.quote(str(logFile)), file=f)
+        print("CMD=", shlex.join(cmd), file=self.log, flush=True)
+        with open(logFile, 'w') as logF:
+            process = ResourceMonitor.MonitoredProcess(cmd, recordFile=self.recordFile, stdout=logF, stderr=None if self.log is sys.stdout else self.log)
+            self.processes.append(process)
+            try:
+                returncode = process.wait()
+            finally:
+                self.processes.remove(process)
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd)
+        if END_MARKER not in logFile.read_text(errors="ignore") or not binFile.exists():
+            raise ValueError("Segment not encoded, see", logFile)
+        return binFile, logFile, firstFrame, lastFrame
+
+    def run(self):
+        segments = self.getSegments()
+        nbJobs = min(len(segments), self.nbThreads)
+        nbThread = max(1, self.nbThreads // nbJobs)
+        if self.cmdFile:
+            # the encoder starts the command log of the test
+            open(self.cmdFile, 'w').close()
+        ResourceMonitor.clearRecord(self.recordFile)
+        encoded = []
+        start = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=nbJobs)
+        try:
+            futures = [executor.submit(self.encode, first, last, nbThread) for first, last in segments]
+            for future in as_completed(futures):
+                encoded.append(future.result())
+        except BaseException:
+            # stop the other segments once one failed
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in list(self.processes):
+                process.terminate()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+        wallTime = time.perf_counter() - start
+
+        encoded.sort(key=lambda item: item[2])
+        mergeBitstreams([binFile for binFile, logFile, first, last in encoded], self.compressBinFile)
+        mergeLogs([(logFile, first, last) for binFile, logFile, first, last in encoded], self.encoderFile, wallTime)
+        for binFile, logFile, first, last in encoded:
+            os.remove(binFile)
+            os.remove(logFile)
+        print(utils.GREEN + "%d frames encoded in %d segments by %d jobs:" % (self.nbFrame, len(segments), nbJobs), self.compressBinFile, utils.ENDC, file=self.log, flush=True)
+        return self.compressBinFile
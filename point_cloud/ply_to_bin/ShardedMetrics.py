@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import os, sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+import ResourceMonitor
+
+import MmLog
+import FrameSampling
+
+# Compute the metrics of a sequence with nbJobs mm processes running at the same time, each one
+# on a range of shardSize frames (one frame by default, which gives the per frame values and
+# balances the load). The logs of the ranges are merged into the mm log and their means are
+# written to the frame table. With a sampling (see FrameSampling.py), only the sampled frames are
+# measured, one per shard, and the means are estimated with their confidence interval. Logs of
+# frames already measured (e.g. restored from FrameCache) are merged with the computed ones.
+class ShardedMetrics:
+
+    # mmCmd     : function (firstFrame, lastFrame) returning the mm command line of a frame range
+    # frames    : frames to compute, one per shard (optional, default=all the frames or the sampled ones)
+    # extraLogs : [(mm log, first frame, last frame)] already computed, merged with the computed ones
+    def __init__ (self, mmCmd, mmFile, firstFrame, nbFrame, nbJobs, shardSize=1,
+                  frameTable=None, cmdFile=None, log=None, processes=None, sampling="", frames=None, extraLogs=None):
+        self.mmCmd      = mmCmd
+        self.mmFile     = Path(mmFile)
+        self.firstFrame = firstFrame
+        self.lastFrame  = firstFrame + nbFrame - 1
+        self.nbJobs     = max(1, int(nbJobs))
+        self.shardSize  = max(1, int(shardSize))
+        self.frameTable = frameTable
+        self.cmdFile    = cmdFile
+        self.log        = log or sys.stdout
+        self.processes  = processes if processes is not None else []
+        self.sampling   = sampling
+        self.frames     = frames
+        self.extraLogs  = list(extraLogs or [])
+        # resource usage of the mm processes
+        self.recordFile = ResourceMonitor.getRecordFile(self.mmFile)
+
+    def getShards(self):
+        if self.frames is not None:
+            return [(frame, frame) for frame in self.frames]
+        if FrameSampling.parseSampling(self.sampling):
+            return [(frame, frame) for frame in FrameSampling.getSampledFrames(self.sampling, self.firstFrame, self.lastFrame - self.firstFrame + 1)]
+        return [(first, min(first + self.shardSize - 1, self.lastFrame)) for first in range(self.firstFrame, self.lastFrame + 1, self.shardSize)]
+
+    def measure(self, firstFrame, lastFrame):
+        logFile = MmLog.getRangeLogFile(self.mmFile, firstFrame, lastFrame)
+        MmLog.runRange(self.mmCmd(firstFrame, lastFrame), logFile, self.cmdFile, self.log, self.processes, self.recordFile)
+        return logFile, firstFrame, lastFrame
+
+    # returns [(statistics, first frame, last frame)] of the computed shards
+    def run(self):
+        shards = self.getShards()
+        logs = []
+        ResourceMonitor.clearRecord(self.recordFile)
+        executor = ThreadPoolExecutor(max_workers=self.nbJobs)
+        try:
+            futures = [executor.submit(self.measure, first, last) for first, last in shards]
+            for future in as_completed(futures):
+                logs.append(future.result())
+        except BaseException:
+            # stop the other shards once one failed
+            executor.shutdown(wait=False, cancel_futures=True)
+            for process in list(self.processes):
+                process.terminate()
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+        computed = [(MmLog.parseStats(Path(logFile).read_text(errors="ignore").splitlines()), firstFrame, lastFrame) for logFile, firstFrame, lastFrame in logs]
+        logs = sorted(logs + self.extraLogs, key=lambda item: item[1])
+        MmLog.mergeLogs(logs, self.mmFile, self.sampling if FrameSampling.parseSampling(self.sampling) else "", self.lastFrame - self.firstFrame + 1)
+        if self.frameTable:
+            MmLog.writeFrameTable(logs, self.frameTable)
+        for logFile, firstFrame, lastFrame in logs:
+            os.remove(logFile)
+        print(utils.GREEN + "Metrics of %d frames computed in %d shards by %d jobs:" % (sum(last - first + 1 for first, last in shards), len(shards), self.nbJobs), self.mmFile, utils.ENDC, file=self.log, flush=True)
+        return computed
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import os, sys, time, shlex, signal, platform, subprocess
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+import ResourceMonitor
+
+import MmLog
+
+# Decode a bitstream and compute the metrics of the decoded frames while they are written:
+# frames are measured by batches of consecutive frames as soon as the decoder wrote them, then
+# removed. When the decoded frames on disk exceed the scratch limit, the decoder is paused until
+# the ready frames are measured. The logs of the batches are merged into the mm log.
+class StreamingMetrics:
+
+    # decoderCmd : decoder command line, its output is written to decoderFile
+    # mmCmd      : function (firstFrame, lastFrame) returning the mm command line of a batch
+    # frameTable : optional CSV file with the means of each batch
+    def __init__ (self, decoderCmd, decoderFile, mmCmd, mmFile, plyDecPath, firstFrame, nbFrame,
+                  batchSize=8, scratchLimit=0, cmdFile=None, log=None, processes=None, pollInterval=0.5, frameTable=None):
+        self.decoderCmd   = decoderCmd
+        self.decoderFile  = Path(decoderFile)
+        self.mmCmd        = mmCmd
+        self.mmFile       = Path(mmFile)
+        self.plyDecPath   = str(plyDecPath)
+        self.firstFrame   = firstFrame
+        self.lastFrame    = firstFrame + nbFrame - 1
+        self.batchSize    = max(1, int(batchSize))
+        self.scratchLimit = int(scratchLimit) * 1024 * 1024
+        self.cmdFile      = cmdFile
+        self.log          = log or sys.stdout
+        self.processes    = processes if processes is not None else []
+        self.pollInterval = pollInterval
+        self.canPause     = platform.system() != "Windows"
+        self.frameTable   = frameTable
+
+    def framePath(self, frame):
+        return Path(self.plyDecPath.replace("%04d", '%0*d' % (4, frame), 1))
+
+    # number of consecutive frames from nextFrame that are completely written (the decoder writes
+    # the frames in order, a frame is complete once the next one is created or the decoder ended)
+    # and size of the decoded frames on disk
+    def scanFrames(self, nextFrame, isDecoderDone):
+        nbReady = 0
+        scratch = 0
+        frame = nextFrame
+        while frame <= self.lastFrame and self.framePath(frame).exists():
+            scratch += self.framePath(frame).stat().st_size
+            if isDecoderDone or self.framePath(frame + 1).exists():
+                nbReady += 1
+            frame += 1
+        return nbReady, scratch
+
+    def run(self):
+        self.writeCmd(self.decoderCmd, self.decoderFile)
+        batchLogs = []
+        nextFrame = self.firstFrame
+        decoderRecord = ResourceMonitor.getRecordFile(self.decoderFile)
+        ResourceMonitor.clearRecord(decoderRecord)
+        ResourceMonitor.clearRecord(ResourceMonitor.getRecordFile(self.mmFile))
+        with open(self.decoderFile, 'w') as decoderF:
+            decoder = ResourceMonitor.MonitoredProcess(self.decoderCmd, recordFile=decoderRecord, stdout=decoderF, stderr=None if self.log is sys.stdout else self.log)
+        self.processes.append(decoder)
+        try:
+            while nextFrame <= self.lastFrame:
+                isDecoderDone = decoder.poll() is not None
+                if isDecoderDone and decoder.returncode != 0:
+                    raise subprocess.CalledProcessError(decoder.returncode, self.decoderCmd)
+                nbReady, scratch = self.scanFrames(nextFrame, isDecoderDone)
+                isOverLimit = self.scratchLimit > 0 and scratch > self.scratchLimit
+                if nbReady >= self.batchSize or (nbReady > 0 and (isDecoderDone or isOverLimit)):
+                    lastFrame = nextFrame + min(nbReady, self.batchSize) - 1
+                    isPaused = isOverLimit and not isDecoderDone and self.pause(decoder, scratch)
+                    try:
+                        batchLogs.append(self.measure(nextFrame, lastFrame))
+                    finally:
+                        if isPaused:
+                            self.resume(decoder)
+                    nextFrame = lastFrame + 1
+                elif isDecoderDone:
+                    raise ValueError("Decoded frames are missing from frame", nextFrame)
+                else:
+                    time.sleep(self.pollInterval)
+
+            if decoder.wait() != 0:
+                raise subprocess.CalledProcessError(decoder.returncode, self.decoderCmd)
+        finally:
+            if decoder.poll() is None:
+                self.resume(decoder)
+                decoder.terminate()
+                decoder.wait()
+            self.processes.remove(decoder)
+
+        MmLog.mergeLogs(batchLogs, self.mmFile)
+        if self.frameTable:
+            MmLog.writeFrameTable(batchLogs, self.frameTable)
+        for logFile, firstFrame, lastFrame in batchLogs:
+            os.remove(logFile)
+        print(utils.GREEN + "Metrics of %d frames computed in %d batches:" % (self.lastFrame - self.firstFrame + 1, len(batchLogs)), self.mmFile, utils.ENDC, file=self.log, flush=True)
+
+    # compute the metrics of the frames [firstFrame, lastFrame] then remove them
+    def measure(self, firstFrame, lastFrame):
+        logFile = MmLog.getRangeLogFile(self.mmFile, firstFrame, lastFrame)
+        MmLog.runRange(self.mmCmd(firstFrame, lastFrame), logFile, self.cmdFile, self.log, self.processes, ResourceMonitor.getRecordFile(self.mmFile))
+        for frame in range(firstFrame, lastFrame + 1):
+            os.remove(self.framePath(frame))
+        print(utils.BLUE + "Measured frames %d-%d" % (firstFrame, lastFrame), utils.ENDC, file=self.log, flush=True)
+        return logFile, firstFrame, lastFrame
+
+    def pause(self, decoder, scratch):
+        if not self.canPause:
+            return False
+        print(utils.BLUE + "Pause the decoder, scratch %d MB over the limit" % (scratch // (1024 * 1024)), utils.ENDC, file=self.log, flush=True)
+        decoder.send_signal(signal.SIGSTOP)
+        return True
+
+    def resume(self, decoder):
+        if self.canPause and decoder.poll() is None:
+            decoder.send_signal(signal.SIGCONT)
+
+    def writeCmd(self, cmd, outFile):
+        if self.cmdFile:
+            with open(self.cmdFile, 'a') as f:
+                print(shlex.join(cmd), ">", shlex.quote(str(outFile)), file=f)
+        print("CMD=", shlex.join(cmd), file=self.log, flush=True)
@@ -0,0 +1,341 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+import subprocess, sys, os, time, threading, traceback
+from pathlib import Path
+
+commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
+sys.path.append(str(Path(commonDir)))
+import utils as utils
+
+import DiskBudget
+
+class Task:
+
+    # cmd    : command line, or a callable run in a thread as cmd(log, processes)
+    # deps   : tasks that shall succeed before this one starts
+    # isDone : optional completion check, the task is skipped when it returns True
+    # cost   : optional predicted duration in seconds (see CostModel.py)
+    # scratch      : bytes written in the output directory and reserved until the task and the
+    #                tasks depending on it ended (see DiskBudget.py)
+    # scratchFiles : glob pattern of these files, what they already take is not reserved twice
+    # memory       : predicted peak memory in bytes of the task (see MemoryModel.py)
+    def __init__ (self, name, cmd, logFile, nbThreads=1, deps=None, isDone=None, cost=None, scratch=0, scratchFiles=None, memory=0):
+        self.name      = name
+        self.cmd       = cmd
+        self.logFile   = Path(logFile)
+        self.nbThreads = max(1, int(nbThreads))
+        self.deps      = list(deps or [])
+        self.isDone    = isDone
+        self.cost      = cost
+        self.scratch      = max(0, int(scratch or 0))
+        self.scratchFiles = scratchFiles
+        self.memory       = max(0, int(memory or 0))
+
+        self.status     = "pending"
+        self.process    = None
+        self.returncode = None
+        self.startTime  = None
+        self.endTime    = None
+
+    def isRunning(self):
+        return self.status == "running"
+
+    def isSuccess(self):
+        return self.status in ("done", "skipped")
+
+    def isReady(self):
+        return all(dep.isSuccess() for dep in self.deps)
+
+    def isBlocked(self):
+        return any(dep.status in ("failed", "cancelled") for dep in self.deps)
+
+    def duration(self):
+        if self.startTime is None:
+            return 0
+        endTime = self.endTime if self.endTime is not None else time.time()
+        return endTime - self.startTime
+
+def formatDuration(seconds):
+    seconds = int(round(seconds))
+    return "%dh%02dm%02ds" % (seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+# run a callable in a thread behind the subset of the subprocess.Popen interface used by the
+# scheduler, the callable appends the tools it starts to processes such that they can be terminated
+class ThreadProcess:
+
+    def __init__ (self, func, logF):
+        self.logF       = logF
+        self.processes  = []
+        self.returncode = None
+        self.thread     = threading.Thread(target=self.run, args=(func,), daemon=True)
+        self.thread.start()
+
+    def run(self, func):
+        try:
+            func(self.logF, self.processes)
+            returncode = 0
+        except subprocess.CalledProcessError as e:
+            print(utils.RED + "subprocess Exception:", e.returncode, utils.ENDC, file=self.logF, flush=True)
+            returncode = e.returncode or 1
+        except BaseException:
+            traceback.print_exc(file=self.logF)
+            returncode = 1
+        finally:
+            self.logF.close()
+        self.returncode = returncode
+
+    def poll(self):
+        return None if self.thread.is_alive() else self.returncode
+
+    def wait(self):
+        self.thread.join()
+        return self.returncode
+
+    def terminate(self):
+        for process in list(self.processes):
+            process.terminate()
+
+# run a graph of tasks concurrently: a task starts as soon as its dependencies succeeded
+# and the sum of the threads of the running tasks stays under the core budget. When the tasks
+# have a predicted cost, the ready tasks are started longest first: by decreasing length of the
+# longest path of predicted costs from the task to the end of the graph, such that a long encode
+# and the stages after it are not started last. With a disk budget, a task writing scratch files
+# is only started when the free space of the output volume holds them; when nothing runs and it
+# still does not fit, it fails instead of filling the volume. With a memory budget, a task is only
+# started when the sum of the predicted peak memories of the running tasks and its own stays under
+# the budget, a task predicted above the budget runs alone.
+class TaskScheduler:
+
+    # memoryBudget : bytes of RAM shared by the running tasks, None for no limit
+    def __init__ (self, coreBudget=None, pollInterval=1.0, diskBudget=None, memoryBudget=None):
+        self.coreBudget   = max(1, int(coreBudget or os.cpu_count() or 1))
+        self.pollInterval = pollInterval
+        self.diskBudget   = diskBudget
+        self.memoryBudget = int(memoryBudget) if memoryBudget else None
+        self.taskList     = []
+        # (task, resource) of the tasks waiting for disk space or memory, reported once
+        self.waiting      = set()
+
+    def addTask(self, task):
+        self.taskList.append(task)
+        return task
+
+    def usedCores(self):
+        return sum(self.taskCost(task) for task in self.taskList if task.isRunning())
+
+    def taskCost(self, task):
+        # a task asking for more threads than the budget runs alone
+        return min(task.nbThreads, self.coreBudget)
+
+    def usedMemory(self):
+        return sum(self.taskMemory(task) for task in self.taskList if task.isRunning())
+
+    def taskMemory(self, task):
+        # a task predicted above the budget runs alone
+        return min(task.memory, self.memoryBudget) if self.memoryBudget is not None else 0
+
+    def fitsMemory(self, tasks, task):
+        return self.memoryBudget is None or sum(self.taskMemory(other) for other in tasks) + self.taskMemory(task) <= self.memoryBudget
+
+    # {task: [tasks depending on it]}
+    def getChildren(self):
+        children = {task: [] for task in self.taskList}
+        for task in self.taskList:
+            for dep in task.deps:
+                children.setdefault(dep, []).append(task)
+        return children
+
+    # {task: predicted cost of the task and of the longest chain of tasks depending on it}
+    def getRanks(self):
+        children = self.getChildren()
+        ranks = {}
+        def getRank(task):
+            if task not in ranks:
+                ranks[task] = (task.cost or 0.0) + max([getRank(child) for child in children.get(task, [])], default=0.0)
+            return ranks[task]
+        for task in self.taskList:
+            getRank(task)
+        return ranks
+
+    # completion time of the tasks run in their order with their predicted costs under the core
+    # and memory budgets, the tasks already done take no time
+    def predictMakespan(self, tasks):
+        durations = {task: 0.0 if task.isDone is not None and task.isDone() else (task.cost or 0.0) for task in tasks}
+        waiting = list(tasks)
+        running = []
+        finished = set()
+        now = 0.0
+        while waiting:
+            for task in list(waiting):
+                isReady = all(dep in finished or dep not in durations for dep in task.deps)
+                isFitting = sum(self.taskCost(other) for end, other in running) + self.taskCost(task) <= self.coreBudget
+                if isReady and isFitting and self.fitsMemory([other for end, other in running], task):
+                    running.append((now + durations[task], task))
+                    waiting.remove(task)
+            if not running:
+                break
+            end, task = min(running, key=lambda item: item[0])
+            running.remove((end, task))
+            finished.add(task)
+            now = end
+        return max([now] + [end for end, task in running])
+
+    def run(self):
+        pending = list(self.taskList)
+        running = []
+        memory = ", memory budget = %s" % DiskBudget.formatSize(self.memoryBudget) if self.memoryBudget is not None else ""
+        print(utils.BLUE + "Scheduler: %d tasks, core budget = %d%s" % (len(pending), self.coreBudget, memory), utils.ENDC, flush=True)
+        isPredicted = any(task.cost is not None for task in pending)
+        if isPredicted:
+            ranks = self.getRanks()
+            pending.sort(key=lambda task: -ranks[task])
+            predicted = self.predictMakespan(pending)
+            print(utils.BLUE + "Predicted makespan: %s (longest tasks first)" % formatDuration(predicted), utils.ENDC, flush=True)
+        startTime = time.time()
+        children = self.getChildren()
+        try:
+            while pending or running:
+                # start every ready task that fits in the remaining budget
+                hasChanged = False
+                refused = []
+                if self.diskBudget is not None:
+                    self.diskBudget.update()
+                for task in list(pending):
+                    if task.isBlocked():
+                        self.cancelTask(task)
+                    elif not task.isReady():
+                        continue
+                    elif task.isDone is not None and task.isDone():
+                        self.skipTask(task)
+                    elif self.usedCores() + self.taskCost(task) > self.coreBudget:
+                        continue
+                    elif not self.hasMemory(task):
+                        continue
+                    elif not self.hasSpace(task):
+                        refused.append(task)
+                        continue
+                    else:
+                        self.startTask(task)
+                        running.append(task)
+                    pending.remove(task)
+                    hasChanged = True
+
+                if running:
+                    time.sleep(self.pollInterval)
+                elif refused and not hasChanged:
+                    # nothing runs that could free space
+                    for task in refused:
+                        self.failTask(task, "not enough disk space")
+                        pending.remove(task)
+                elif pending and not hasChanged:
+                    raise ValueError("Unresolved task dependencies: " + ", ".join(task.name for task in pending))
+
+                for task in list(running):
+                    if task.process.poll() is not None:
+                        self.finishTask(task)
+                        running.remove(task)
+                self.releaseScratch(children)
+        except KeyboardInterrupt:
+            for task in running:
+                task.process.terminate()
+            for task in running:
+                task.process.wait()
+                self.finishTask(task)
+            raise
+
+        self.printSummary()
+        if isPredicted:
+            print(utils.BLUE + "  makespan %s, predicted %s" % (formatDuration(time.time() - startTime), formatDuration(predicted)), utils.ENDC, flush=True)
+        return all(task.isSuccess() for task in self.taskList)
+
+    def hasMemory(self, task):
+        if self.fitsMemory([other for other in self.taskList if other.isRunning()], task):
+            return True
+        if (task, "memory") not in self.waiting:
+            self.waiting.add((task, "memory"))
+            print(utils.BLUE + "wait  :", task.name, "needs %s of memory," % DiskBudget.formatSize(task.memory), "used %s/%s" % (DiskBudget.formatSize(self.usedMemory()), DiskBudget.formatSize(self.memoryBudget)), utils.ENDC, flush=True)
+        return False
+
+    def hasSpace(self, task):
+        if self.diskBudget is None or task.scratch == 0 or self.diskBudget.fits(task.scratch):
+            return True
+        if (task, "disk") not in self.waiting:
+            self.waiting.add((task, "disk"))
+            print(utils.BLUE + "wait  :", task.name, "needs %s of disk," % DiskBudget.formatSize(task.scratch), self.diskBudget.getStatus(), utils.ENDC, flush=True)
+        return False
+
+    # release the disk reserved by the tasks that ended once the tasks reading their files ended too
+    def releaseScratch(self, children):
+        if self.diskBudget is None:
+            return
+        for task in self.taskList:
+            if task.name in self.diskBudget.reservations and not any(other.status in ("pending", "running") for other in [task] + children.get(task, [])):
+                self.diskBudget.release(task.name)
+                print(utils.BLUE + "free  :", task.name, "scratch released,", self.diskBudget.getStatus(), utils.ENDC, flush=True)
+
+    def startTask(self, task):
+        os.makedirs(task.logFile.parent, exist_ok=True)
+        logF = open(task.logFile, 'w')
+        task.startTime = time.time()
+        task.status  = "running"
+        if callable(task.cmd):
+            print(task.name, file=logF, flush=True)
+            task.process = ThreadProcess(task.cmd, logF)
+        else:
+            print(" ".join(str(arg) for arg in task.cmd), file=logF, flush=True)
+            task.process = subprocess.Popen(task.cmd, stdout=logF, stderr=subprocess.STDOUT)
+            logF.close()
+        disk = ""
+        if self.diskBudget is not None and task.scratch > 0:
+            self.diskBudget.reserve(task.name, task.scratch, task.scratchFiles)
+            disk = ", scratch %s, %s" % (DiskBudget.formatSize(task.scratch), self.diskBudget.getStatus())
+        memory = ""
+        if self.memoryBudget is not None:
+            memory = ", memory %s, used %s/%s" % (DiskBudget.formatSize(task.memory), DiskBudget.formatSize(self.usedMemory()), DiskBudget.formatSize(self.memoryBudget))
+        print(utils.BLUE + "start :", task.name, "(threads=%d, used cores=%d/%d%s%s)" % (task.nbThreads, self.usedCores(), self.coreBudget, memory, disk), utils.ENDC, flush=True)
+
+    def finishTask(self, task):
+        task.returncode = task.process.wait()
+        task.endTime = time.time()
+        task.status  = "done" if task.returncode == 0 else "failed"
+        color = utils.GREEN if task.returncode == 0 else utils.RED
+        predicted = ", predicted %.1fs" % task.cost if task.cost is not None else ""
+        print(color + "done  :", task.name, "exit=%d" % task.returncode, "(%.1fs%s)" % (task.duration(), predicted), "log:", task.logFile, utils.ENDC, flush=True)
+
+    def skipTask(self, task):
+        task.status = "skipped"
+        print(utils.GREEN + "skip  :", task.name, "already done", utils.ENDC, flush=True)
+
+    def failTask(self, task, reason):
+        task.status = "failed"
+        print(utils.RED + "fail  :", task.name, reason, utils.ENDC, flush=True)
+
+    def cancelTask(self, task):
+        task.status = "cancelled"
+        print(utils.RED + "cancel:", task.name, "a dependency failed", utils.ENDC, flush=True)
+
+    def printSummary(self):
+        nbFailed = 0
+        print(utils.BLUE + "Scheduler summary:", utils.ENDC)
+        for task in self.taskList:
+            if task.status == "done":
+                print(utils.GREEN + "  - %-50s exit=%d %10.1fs" % (task.name, task.returncode, task.duration()), utils.ENDC)
+            elif task.status == "skipped":
+                print(utils.GREEN + "  - %-50s skipped (already done)" % (task.name), utils.ENDC)
+            else:
+                nbFailed += 1
+                print(utils.RED + "  - %-50s %s exit=%s %10.1fs log: %s" % (task.name, task.status, task.returncode, task.duration(), task.logFile), utils.ENDC)
+        print(utils.BLUE + "  %d tasks, %d failed or cancelled" % (len(self.taskList), nbFailed), utils.ENDC, flush=True)
@@ -34,18 +34,23 @@ class XlsSheetGenerator:
         self.argList   = []
         self.encParams = []
 
-    def run(self):
+    def run(self, createCsv=True, createXlsm=True):
         for test in self.config_manager.testConfigData['TestList']:
             profile = test['Profile']
             seqList = test['SeqList']
             nbTests, nbSuccess = self.config_manager.getTestResults(profile, seqList)
             forceMetrics = True
             
-            # create CSV
+            # create CSV (or only list the existing ones when the workbooks are generated alone)
             self.csvFileList = []
-            if nbTests == nbSuccess or forceMetrics:
+            if not createCsv:
+                sIdx, fIdx, rIdx = self.csvList(profile, seqList)
+            elif nbTests == nbSuccess or forceMetrics:
                 sIdx, fIdx, rIdx = self.csvCreate(profile, seqList)
             
+            if not createXlsm:
+                continue
+
             # file XLSM sheet (this only works if we got 5 rates per sequence per profile)
             if nbSuccess == (sIdx+1)*(rIdx+1)*(fIdx+1): # number to fill per profile = 5 sequences * 5 rates minimum
                 self.createWorkbook(profile, seqList)
@@ -63,7 +68,7 @@ class XlsSheetGenerator:
             strSeq="".join(["S", str(seqId)])
             strRate="".join(["R%02d" % rate])       
             #print("CSV File :", csvFile)
-            bitrate = int(total)*8 * int(fps) / int(nbFrame) / 1000000
+            bitrate = metrics.getBitrate(total, fps, nbFrame)
             #print(profile, strSeq, strRate, "geoQP", geoQP, "attQP", attQP, "occPrec", occPrec, "rate", bitrate, "Mbps")
             
             #print (f"{profile:10}", f"S{int(seqId):02}", f"F{int(nbFrame):03}", " C2", condition, f"R{int(rate):04}","geoQP", geoQP, "attQP", attQP, "occPrec", occPrec, "rate", bitrate, "Mbps")
@@ -127,6 +132,31 @@ class XlsSheetGenerator:
                     self.csvFileList.append(csvFile)
         return sIdx, fIdx, rIdx
 
+    def csvList(self, profile, seqList):
+        for sIdx, seq in enumerate(seqList) :
+            condition = seq['Condition']
+            rIdx      = len(seq['RateList']) - 1
+            for fIdx, nbFrame in enumerate(seq['FrameNbList']):
+                csvFile, csvFileTmc2 = self.config_manager.getCsvPath(fIdx, profile, condition)
+                if csvFile not in self.csvFileList:
+                    self.csvFileList.append(csvFile)
+        return sIdx, fIdx, rIdx
+
+    def getOutputFiles(self):
+        csvFiles      = []
+        workbookFiles = []
+        for test in self.config_manager.testConfigData['TestList']:
+            profile = test['Profile']
+            for seq in test['SeqList']:
+                for fIdx, nbFrame in enumerate(seq['FrameNbList']):
+                    csvFile, csvFileTmc2 = self.config_manager.getCsvPath(fIdx, profile, seq['Condition'])
+                    workbookFile = self.config_manager.getWorkbookPath(fIdx, profile, seq['Condition'])
+                    if csvFile not in csvFiles:
+                        csvFiles.append(csvFile)
+                    if workbookFile not in workbookFiles:
+                        workbookFiles.append(workbookFile)
+        return csvFiles, workbookFiles
+
     def createWorkbook(self, profile, seqList):
 
         sourceXlsm=Path(self.config_manager.scriptDir).joinpath("templates", "".join(["FALL_3GPP_template.xlsm"])).resolve(strict=True)
@@ -14,14 +14,23 @@
 # under the License.
 #--------------------------------------------------------------------------------
 
-import os, platform, sys, argparse, glob
+import os, platform, sys, argparse, glob, shlex, copy
 from pathlib import Path
 import subprocess
 #local
 import compute as metrics
+from ResultCache import ResultCache
+from JobJournal import JobJournal, getJournalFile
+from StreamingMetrics import StreamingMetrics
+from ShardedMetrics import ShardedMetrics
+from SegmentedEncoder import SegmentedEncoder
+from FrameCache import FrameCache
+import MmLog
+import FrameSampling
 commonDir = Path(__file__).resolve(strict=True).parent.joinpath("../common")
 sys.path.append(str(Path(commonDir)))
 import utils as utils
+import ResourceMonitor
 
 def parseArgs():
     global parser
@@ -43,8 +52,170 @@ def parseArgs():
     parser.add_argument(      '--forceClean',  help="Force the clean of decoded PLY (optional, default=False)", nargs="?", default=False, const=True, type=utils.str2bool)
     parser.add_argument(      '--testName',    help="Set test Name", nargs="?", required=True, type=str)
     parser.add_argument(      '--encOptions',  help="Option to set to the encoder (optional, default="")", nargs="?", default="", type=str)
+    parser.add_argument(      '--stage',       help="Stage to run: normals (estimation only), encoder, decoder, mm (all the metric families), mm_<family>, mm_pcc (geometry and color) or all of them (optional, default=all)", nargs="?", default="all", type=str, choices=STAGES)
+    parser.add_argument(      '--cacheDir',    help="Directory of the result cache shared by the tests, the cache is not used when empty (optional, default="")", nargs="?", default="", type=str)
+    parser.add_argument(      '--streamMetrics', help="Compute the metrics of the decoded frames while decoding and remove them once measured (optional, default=False)", nargs="?", default=False, const=True, type=utils.str2bool)
+    parser.add_argument(      '--streamBatch', help="Number of frames measured by each mm run when streaming (optional, default=8)", nargs="?", default=8, type=int)
+    parser.add_argument(      '--scratchLimit', help="Size in MB of the decoded frames above which the decoder is paused when streaming, 0 for no limit (optional, default=0)", nargs="?", default=0, type=int)
+    parser.add_argument(      '--mmJobs',      help="Number of mm processes computing the metrics of the frames in parallel, the means are merged (optional, default=1)", nargs="?", default=1, type=int)
+    parser.add_argument(      '--metrics',     help="Comma separated metric families to compute among geometry, color and pcqm, each one has its own log (optional, default=geometry,color,pcqm)", nargs="?", default=",".join(MmLog.METRIC_FAMILIES), type=str)
+    parser.add_argument(      '--metricBackend', help="Metric computation: mm or native (PccMetrics.py) (optional, default=mm)", nargs="?", default="mm", type=str, choices=METRIC_BACKENDS)
+    parser.add_argument(      '--metricSampling', help="Frames measured: all, every:<k> (every k-th frame) or random:<n> (one random frame in each of n strata), the sampled means are reported with a 95%% confidence interval (optional, default=all)", nargs="?", default="all", type=str)
+    parser.add_argument(      '--estimateNormals', help="Estimate the normals of a source without normals once per frame, they are given to the encoder and the metrics (optional, default=False)", nargs="?", default=False, const=True, type=utils.str2bool)
+    parser.add_argument(      '--frameCache',  help="Keep the metric values of each frame in the cache directory, only the frames not measured yet are computed (optional, default=False)", nargs="?", default=False, const=True, type=utils.str2bool)
+    parser.add_argument(      '--aiSegmentSize', help="With the AI condition, encode segments of this number of frames (rounded up to a multiple of groupOfFramesSize) in parallel on nbThreads and merge them, 0 for a single encoder (optional, default=0)", nargs="?", default=0, type=int)
     return parser.parse_args()
 
+# the families computed by one mm "compare --mode pcc" run and the stage computing them together
+PCC_FAMILIES = ["geometry", "color"]
+PCC_STAGE = "mm_pcc"
+STAGES = ["all", "normals", "encoder", "decoder", "mm"] + ["_".join(["mm", family]) for family in MmLog.METRIC_FAMILIES] + [PCC_STAGE]
+METRIC_BACKENDS = ["mm", "native"]
+
+# test to compute, same options than the command line of this script except encOptions that is a list
+# of encoder arguments. compute.runTask(ComputeTask(...)) runs it without starting a new interpreter.
+class ComputeTask:
+
+    def __init__ (self, seq, seqCfgFile, name, inputDir, outputDir, tmc2Dir, mmDir, testName,
+                  frameNumber=1, rate=5, condition="RA", nbThreads=1, encOptions=None,
+                  forceEncode=False, forceDecode=False, forceMetric=False, forceClean=False,
+                  stage="all", cacheDir="", streamMetrics=False, streamBatch=8, scratchLimit=0, mmJobs=1,
+                  metrics=None, metricBackend="mm", metricSampling="", frameCache=False, estimateNormals=False, aiSegmentSize=0):
+        self.seq         = str(seq)
+        self.seqCfgFile  = str(seqCfgFile)
+        self.name        = name
+        self.inputDir    = str(inputDir)
+        self.outputDir   = str(outputDir)
+        self.frameNumber = int(frameNumber)
+        self.rate        = int(rate)
+        self.condition   = condition
+        self.nbThreads   = int(nbThreads)
+        self.tmc2Dir     = str(tmc2Dir)
+        self.mmDir       = str(mmDir)
+        self.forceEncode = forceEncode
+        self.forceDecode = forceDecode
+        self.forceMetric = forceMetric
+        self.forceClean  = forceClean
+        self.testName    = testName
+        self.encOptions  = list(encOptions or [])
+        self.stage       = stage
+        self.cacheDir    = str(cacheDir or "")
+        self.streamMetrics = streamMetrics
+        self.streamBatch   = int(streamBatch)
+        self.scratchLimit  = int(scratchLimit)
+        self.mmJobs        = int(mmJobs)
+        self.metrics       = MmLog.parseFamilies(metrics or MmLog.METRIC_FAMILIES)
+        self.metricBackend = metricBackend
+        self.metricSampling = metricSampling if FrameSampling.parseSampling(metricSampling) else ""
+        self.frameCache    = frameCache
+        self.estimateNormals = estimateNormals
+        self.aiSegmentSize = int(aiSegmentSize)
+
+    @staticmethod
+    def fromArgs(args):
+        return ComputeTask(args.seq, args.seqCfgFile, args.name, args.inputDir, args.outputDir, args.tmc2Dir, args.mmDir, args.testName,
+                           args.frameNumber, args.rate, args.condition, args.nbThreads, shlex.split(args.encOptions),
+                           args.forceEncode, args.forceDecode, args.forceMetric, args.forceClean,
+                           args.stage, args.cacheDir, args.streamMetrics, args.streamBatch, args.scratchLimit, args.mmJobs,
+                           MmLog.parseFamilies(args.metrics), args.metricBackend, args.metricSampling, args.frameCache, args.estimateNormals, args.aiSegmentSize)
+
+    # the decoder computes the metrics while decoding, except when only sampled frames are measured
+    def isStreamed(self):
+        return bool(self.streamMetrics) and not self.metricSampling
+
+    # the frames of an all intra encode are coded independently, they can be encoded by segments
+    def isSegmented(self):
+        return self.aiSegmentSize > 0 and self.condition == "AI"
+
+    # the frames are measured one by one through the frame cache, not when streamed
+    def usesFrameCache(self):
+        return bool(self.frameCache) and bool(self.cacheDir) and not self.isStreamed()
+
+    # copy of the task with some options changed, e.g. task.withOptions(stage="mm")
+    def withOptions(self, **options):
+        task = copy.copy(self)
+        task.encOptions = list(self.encOptions)
+        for key, value in options.items():
+            if not hasattr(task, key):
+                raise ValueError("Unknown task option:", key)
+            setattr(task, key, value)
+        return task
+
+    # arguments of the command line of this script running the task
+    def toArgs(self):
+        args = [
+            "-s", self.seq,
+            "-o", self.outputDir,
+            "--name", self.name,
+            "-i", self.inputDir,
+            "--seqCfgFile", self.seqCfgFile,
+            "-n", str(self.frameNumber),
+            "-r", str(self.rate),
+            "--condition", self.condition,
+            "--nbThreads", str(self.nbThreads),
+            "--tmc2Dir", self.tmc2Dir,
+            "--mmDir", self.mmDir,
+            "--forceEncode", str(self.forceEncode),
+            "--forceDecode", str(self.forceDecode),
+            "--forceMetric", str(self.forceMetric),
+            "--forceClean", str(self.forceClean),
+            "--testName", self.testName,
+            "".join(["--encOptions=", shlex.join(self.encOptions)]),
+            "--stage", self.stage,
+            ]
+        if self.cacheDir:
+            args += ["--cacheDir", self.cacheDir]
+        if self.streamMetrics:
+            args += ["--streamMetrics", "True", "--streamBatch", str(self.streamBatch), "--scratchLimit", str(self.scratchLimit)]
+        if self.mmJobs > 1:
+            args += ["--mmJobs", str(self.mmJobs)]
+        if self.metrics != MmLog.METRIC_FAMILIES:
+            args += ["--metrics", ",".join(self.metrics)]
+        if self.metricBackend != "mm":
+            args += ["--metricBackend", self.metricBackend]
+        if self.metricSampling:
+            args += ["--metricSampling", self.metricSampling]
+        if self.frameCache:
+            args += ["--frameCache", "True"]
+        if self.estimateNormals:
+            args += ["--estimateNormals", "True"]
+        if self.aiSegmentSize > 0:
+            args += ["--aiSegmentSize", str(self.aiSegmentSize)]
+        return args
+
+# the metrics stage is made of one stage per metric family (mm_geometry, mm_color, mm_pcqm)
+def getMetricStage(family):
+    return "_".join(["mm", family])
+
+# key of the log of a metric family in getOutputFiles (mmGeometryFile, ...)
+def getMetricFileKey(family):
+    return "".join(["mm", family.capitalize(), "File"])
+
+METRIC_STAGES = [getMetricStage(family) for family in MmLog.METRIC_FAMILIES]
+
+# metric tasks of the families of a test [(stage, families)]: mm computes geometry and colour in the
+# same pcc run, they are one task (mm_pcc) instead of two runs reading the same decoded frames; each
+# family is its own task with the native backend
+def getMetricTasks(families, metricBackend):
+    pccFamilies = [family for family in families if family in PCC_FAMILIES]
+    if metricBackend == "mm" and len(pccFamilies) > 1:
+        return [(PCC_STAGE, pccFamilies)] + [(getMetricStage(family), [family]) for family in families if family not in PCC_FAMILIES]
+    return [(getMetricStage(family), [family]) for family in families]
+
+# families computed by a stage of a test computing the families
+def getStageFamilies(stage, families):
+    if stage in ("all", "mm"):
+        return list(families)
+    if stage == PCC_STAGE:
+        return [family for family in families if family in PCC_FAMILIES]
+    return [family for family in families if getMetricStage(family) == stage]
+# files produced by each stage (keys of getOutputFiles), the first one is the stage log
+STAGE_ARTIFACTS = {"encoder": ['encoderFile', 'compressBinFile'], "decoder": ['decoderFile']}
+STAGE_ARTIFACTS.update({getMetricStage(family): [getMetricFileKey(family)] for family in MmLog.METRIC_FAMILIES})
+# file consumed by each stage, the stage is out of date when it is newer than the stage log
+STAGE_INPUT     = {"decoder": 'compressBinFile'}
+STAGE_INPUT.update({stage: 'decoderFile' for stage in METRIC_STAGES})
+
 def getConditionFileName(condition):
     condInfo = {
     'RA':"ctc-random-access.cfg",
@@ -52,7 +223,14 @@ def getConditionFileName(condition):
     }
     return condInfo[condition]
 
+def isNewerThan(outputFile, inputFile):
+    # an output is out of date when its input has been regenerated after it
+    if not Path(inputFile).exists():
+        return True
+    return Path(outputFile).stat().st_mtime >= Path(inputFile).stat().st_mtime
+
 def isEncodeProcessSuccess(compressBinFile, encoderFile):
+    isSuccess = False
     if encoderFile.exists():
         with open(encoderFile, 'r') as file:
             content = file.read()
@@ -66,23 +244,233 @@ def isEncodeProcessSuccess(compressBinFile, encoderFile):
     else:
         return False
 
-def isDecodeProcessSuccess(decoderFile):
+def isDecodeProcessSuccess(decoderFile, compressBinFile=None):
     if decoderFile.exists():
+        if compressBinFile and not isNewerThan(decoderFile, compressBinFile):
+            return False
         with open(decoderFile, 'r') as file:
             content = file.read()
             if 'Processing time (wall):' in content:
                 return True
             else:
                 return False
+    return False
 
-def isMetricProcessSuccess(mmFile):
+def isMetricProcessSuccess(mmFile, decoderFile=None):
     if mmFile.exists():
+        if decoderFile and not isNewerThan(mmFile, decoderFile):
+            return False
         with open(mmFile, 'r') as file:
             content = file.read()
             if 'Time on overall processing:' in content:
                 return True
             else:
                 return False
+    return False
+
+# paths of the files produced by each stage of a test, shared by compute.py and the stage scheduler
+def getOutputFiles(outputDir, seq, frameNumber, condition, rate, name, testName):
+    testDir         = "".join(["F", str(frameNumber), "_", testName])
+    seqDir          = "".join(["S", str(seq), "C2", condition, "_", name])
+    ## ! outputPrefix shall be the same than in XlsSheetGenerator.py named "outputPrefix"
+    outputPrefix    = "".join(["S", str(seq), "C2", condition, "R%04d" % int(rate), "_", name])
+    compressedPath  = Path(outputDir).joinpath(testDir, seqDir)
+    files = {
+        'compressedPath'  : compressedPath,
+        'outputPrefix'    : outputPrefix,
+        'cmdFile'         : compressedPath.joinpath("".join([outputPrefix, "_command.log"])),
+        'encoderFile'     : compressedPath.joinpath("".join([outputPrefix, "_encoder.log"])),
+        'decoderFile'     : compressedPath.joinpath("".join([outputPrefix, "_decoder.log"])),
+        'mmFile'          : compressedPath.joinpath("".join([outputPrefix, "_mm.log"])),
+        'compressBinFile' : compressedPath.joinpath("".join([outputPrefix, "_enc.bin"])),
+        'plyDecPath'      : compressedPath.joinpath("".join([outputPrefix, "_dec_%04d.ply"])),
+        'journalKey'      : "/".join([testDir, seqDir, outputPrefix]),
+    }
+    # one log per metric family, _mm.log is the log of the previous versions computing all of them
+    for family in MmLog.METRIC_FAMILIES:
+        files[getMetricFileKey(family)] = compressedPath.joinpath("".join([outputPrefix, "_mm_", family, ".log"]))
+    return files
+
+# log written by a metric run computing several families, split afterwards in the family logs
+def getMetricRunFile(files, families):
+    if len(families) == 1:
+        return files[getMetricFileKey(families[0])]
+    return files['compressedPath'].joinpath("".join([files['outputPrefix'], "_mm_", "_".join(families), ".log"]))
+
+def getStageArtifacts(stage, files):
+    return {key: files[key] for key in STAGE_ARTIFACTS[stage]}
+
+# per stage completion check, a stage is done when its log is complete and newer than its input.
+# The journal is looked up first, the log is only read for stages unknown to the journal and
+# the stages found done this way are recorded in the journal. The mm (and mm_pcc) stage is done
+# when the stages of its metric families are done, a metric stage is only done for the frame sampling it
+# was computed with, recorded in the journal (read from the log for the stages recorded without).
+def isStageDone(stage, files, journal=None, families=MmLog.METRIC_FAMILIES, sampling=""):
+    if stage == "all":
+        return all(isStageDone(s, files, journal, families, sampling) for s in ["encoder", "decoder", "mm"])
+    if stage in ("mm", PCC_STAGE):
+        return all(isStageDone(getMetricStage(family), files, journal, sampling=sampling) for family in getStageFamilies(stage, families))
+    stageSampling = sampling if stage in METRIC_STAGES else None
+    isDone = journal.isStageDone(files['journalKey'], stage, stageSampling) if journal else None
+    if isDone is None:
+        isDone = isStageLogDone(stage, files)
+        if isDone and stageSampling is not None:
+            isDone = MmLog.getSampling(files[STAGE_ARTIFACTS[stage][0]]) == stageSampling
+        if isDone and journal:
+            journal.recordStage(files['journalKey'], stage, getStageArtifacts(stage, files), stageSampling)
+        return isDone
+    return isDone and (stage not in STAGE_INPUT or isNewerThan(files[STAGE_ARTIFACTS[stage][0]], files[STAGE_INPUT[stage]]))
+
+# the decoded PLY are removed once the metrics are computed: a decoded test is decoded again when
+# some metrics are missing and its PLY were removed (e.g. all the frames measured after a sampled run)
+def isDecodedForMetrics(files, journal=None, families=MmLog.METRIC_FAMILIES, sampling=""):
+    if not isStageDone("decoder", files, journal):
+        return False
+    return isStageDone("mm", files, journal, families, sampling) or len(glob.glob(str(files['plyDecPath']).replace("%04d", "*"))) > 0
+
+def isStageLogDone(stage, files):
+    if stage == "encoder":
+        return isEncodeProcessSuccess(files['compressBinFile'], files['encoderFile'])
+    elif stage == "decoder":
+        return isDecodeProcessSuccess(files['decoderFile'], files['compressBinFile'])
+    else:
+        return isMetricProcessSuccess(files[STAGE_ARTIFACTS[stage][0]], files['decoderFile'])
+
+# run a stage (or several stages computed together) and record its state and artifacts in the journal,
+# with the frame sampling of the metric stages
+def runJournaled(journal, stage, files, run, sampling=""):
+    stages = [stage] if isinstance(stage, str) else stage
+    for s in stages:
+        journal.startStage(files['journalKey'], s, getStageArtifacts(s, files), sampling if s in METRIC_STAGES else None)
+    def finish(exitCode):
+        for s in stages:
+            journal.finishStage(files['journalKey'], s, exitCode, getStageArtifacts(s, files))
+    try:
+        run()
+    except subprocess.CalledProcessError as e:
+        finish(e.returncode)
+        raise
+    except BaseException:
+        finish(-1)
+        raise
+    finish(0)
+
+# compute metric families: the ones found in the cache are restored, the other ones are computed
+# by run(families, runFile) writing one log with all of them, split afterwards in the family logs
+def runMetricFamilies(journal, cache, cacheKeys, files, families, run, log=None, canRestore=True, sampling=""):
+    familyFiles = {family: files[getMetricFileKey(family)] for family in families}
+    def runFamilies():
+        missing = families
+        if cache is not None and canRestore:
+            missing = [family for family in families if not cache.restore(cacheKeys[getMetricStage(family)], {'mm.log': familyFiles[family]})]
+            for family in families:
+                if family not in missing:
+                    print (utils.GREEN  + "Restored from cache:", family, cacheKeys[getMetricStage(family)], utils.ENDC, file=log or sys.stdout, flush=True)
+        if not missing:
+            return
+        runFile = getMetricRunFile(files, missing)
+        run(missing, runFile)
+        MmLog.splitLog(runFile, {family: familyFiles[family] for family in missing})
+        if len(missing) > 1:
+            os.remove(runFile)
+        if cache is not None:
+            for family in missing:
+                cache.store(cacheKeys[getMetricStage(family)], {'mm.log': familyFiles[family]})
+    runJournaled(journal, [getMetricStage(family) for family in families], files, runFamilies, sampling)
+
+# cache keys of the stages, a key hashes the contents of everything that changes the result of
+# the stage, the decoder and metrics keys chain the key of the previous stage
+def getCacheKeys(cache, task, encoder, decoder, metricTools, tmc2Dir, plySourcePath, startFrameNb, frameNumber, resolution, nrmSourcePath, normalsKey=""):
+    encoderKey = cache.key("encoder", {
+        'seqCfg'       : Path(task.seqCfgFile).read_text(),
+        'commonCfg'    : Path(tmc2Dir).joinpath("cfg", "common", "ctc-common.cfg").read_text(),
+        'conditionCfg' : Path(tmc2Dir).joinpath("cfg", "condition", getConditionFileName(task.condition)).read_text(),
+        'encOptions'   : shlex.join(task.encOptions),
+        'encoder'      : cache.fileDigest(encoder),
+        'sourceFrames' : cache.frameDigests(plySourcePath, startFrameNb, frameNumber),
+        'frameCount'   : frameNumber,
+        'resolution'   : resolution,
+        'normals'      : normalsKey or nrmSourcePath != "",
+        } | ({'segmentSize': task.aiSegmentSize} if task.isSegmented() else {}))
+    decoderKey = cache.key("decoder", {
+        'encoderKey'   : encoderKey,
+        'decoder'      : cache.fileDigest(decoder),
+        'hdrconvert'   : Path(tmc2Dir).joinpath("cfg", "hdrconvert", "yuv420toyuv444_16bit.cfg").read_text(),
+        'startFrame'   : startFrameNb,
+        })
+    keys = {'encoder': encoderKey, 'decoder': decoderKey}
+    for family in MmLog.METRIC_FAMILIES:
+        keys[getMetricStage(family)] = cache.key("mm", {
+            'decoderKey'   : decoderKey,
+            'backend'      : task.metricBackend,
+            'tools'        : [cache.fileDigest(tool) for tool in metricTools],
+            'firstFrame'   : startFrameNb,
+            'lastFrame'    : startFrameNb + frameNumber - 1,
+            'family'       : family,
+            'resolution'   : resolution,
+            } | ({'sampling': task.metricSampling} if task.metricSampling else {}) | ({'normals': normalsKey} if normalsKey else {}))
+    return keys
+
+# frame cache keys {frame: {family: key}}, a key hashes the metric tools, the family and the
+# contents of the source and decoded frames (not the test that decoded them)
+def getFrameKeys(cache, task, metricTools, plySourcePath, plyDecPath, frames, families, resolution):
+    toolItems = {
+        'backend'    : task.metricBackend,
+        'tools'      : [cache.fileDigest(tool) for tool in metricTools],
+        'resolution' : resolution,
+        }
+    frameKeys = {}
+    for frame in frames:
+        source  = cache.fileDigest(getFramePath(plySourcePath, frame))
+        decoded = cache.fileDigest(getFramePath(plyDecPath, frame))
+        frameKeys[frame] = {family: cache.key("frame", toolItems | {'family': family, 'source': source, 'decoded': decoded}) for family in families}
+    return frameKeys
+
+# logs and frame tables of a test whose per frame values can be ingested in the frame cache: the
+# ones written after the decoded frames and the metric tools they measured
+def getFrameFiles(files, inputFiles):
+    frameFiles = []
+    for frameFile in sorted(glob.glob(str(files['compressedPath'].joinpath("".join([files['outputPrefix'], "_mm*"]))))):
+        if (frameFile.endswith(".log") or frameFile.endswith("_frames.csv")) and all(isNewerThan(frameFile, inputFile) for inputFile in inputFiles):
+            frameFiles.append(frameFile)
+    return frameFiles
+
+def getFramePath(plyPath, frame):
+    return str(plyPath).replace("%04d", '%0*d' % (4, frame), 1)
+
+# run a stage through the cache: artifacts = {name in cache: output path}
+# returns True when the artifacts are restored from the cache instead of being computed
+def runCached(cache, key, artifacts, run, log=None, canRestore=True):
+    if cache is None:
+        run()
+        return False
+    with cache.lock(key):
+        if canRestore and cache.restore(key, artifacts):
+            print (utils.GREEN  + "Restored from cache:", key, utils.ENDC, file=log or sys.stdout, flush=True)
+            return True
+        run()
+        cache.store(key, artifacts)
+    return False
+
+# run a tool with its standard output written to outFile, the command line is written to cmdFile
+# the resource usage of the tool is recorded next to its output (ResourceMonitor)
+def runTool(cmd, outFile, cmdFile, cmdFileMode, log, processes=None):
+    with open(cmdFile, cmdFileMode) as f:
+        print(shlex.join(cmd), ">", shlex.quote(str(outFile)), file=f)
+    print("CMD=", shlex.join(cmd), file=log, flush=True)
+    recordFile = ResourceMonitor.getRecordFile(outFile)
+    ResourceMonitor.clearRecord(recordFile)
+    with open(outFile, 'w') as outF:
+        process = ResourceMonitor.MonitoredProcess(cmd, recordFile=recordFile, stdout=outF, stderr=None if log is sys.stdout else log)
+        if processes is not None:
+            processes.append(process)
+        try:
+            returncode = process.wait()
+        finally:
+            if processes is not None:
+                processes.remove(process)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
 
 def extract_ply_header(file_path):
     header_lines = []
@@ -108,6 +496,32 @@ def extract_binary_ply_header(file_path):
     header_str = header.decode('ascii', errors='ignore')
     return header_str
 
+# startFrameNumber, uncompressedDataPath and geometry peak (1023 or 2047) of a sequence cfg file
+def readSequenceCfg(seqCfgFile):
+    with open(seqCfgFile) as f:
+        for line in f:
+            if "startFrameNumber" in line:
+                startFrameNb = int(line.split(":")[1])
+            if "uncompressedDataPath" in line:
+                uncompressedDataPath = str(line.split(":")[1]).strip()
+            if "geometry3dCoordinatesBitdepth" in line:
+                resolution = 1023 if int(line.split(":")[1]) == 10 else 2047
+    return startFrameNb, uncompressedDataPath, resolution
+
+# groupOfFramesSize of a sequence cfg file, 1 when it is not set
+def readGroupOfFramesSize(seqCfgFile):
+    with open(seqCfgFile) as f:
+        for line in f:
+            if "groupOfFramesSize" in line:
+                return int(line.split(":")[1])
+    return 1
+
+# 1000 frames means all the frames of the input directory
+def getFrameNumber(task):
+    if task.frameNumber == 1000:
+        return len(glob.glob1(Path(task.inputDir).resolve(strict=True), "*.ply"))
+    return task.frameNumber
+
 def hasNormals(plyFile, start):
     fisrtFile = str(plyFile).replace("%04d", '%0*d' % (4, start), 1)
     try:
@@ -120,6 +534,337 @@ def hasNormals(plyFile, start):
         normalsPresent = False   
     return normalsPresent    
     
+# directory of the estimated normals, shared through the cache directory when there is one
+def getNormalsDir(task):
+    return Path(task.cacheDir).joinpath("normals") if task.cacheDir else Path(task.outputDir).resolve().joinpath("normals")
+
+# estimator of the normals of a source without normals (see NormalEstimator.py), None when the
+# source has normals or the normals are not estimated
+def getNormalEstimator(task, plySourcePath, startFrameNb, frameNumber, log=None):
+    if not task.estimateNormals or hasNormals(plySourcePath, startFrameNb):
+        return None
+    # numpy, scipy and pyntcloud are only needed to estimate the normals
+    from NormalEstimator import NormalEstimator
+    return NormalEstimator(plySourcePath, startFrameNb, frameNumber, getNormalsDir(task), nbJobs=task.nbThreads, log=log)
+
+def isNormalsDone(task):
+    startFrameNb, uncompressedDataPath, resolution = readSequenceCfg(task.seqCfgFile)
+    estimator = getNormalEstimator(task, Path(task.inputDir).resolve(strict=True).joinpath(uncompressedDataPath), startFrameNb, getFrameNumber(task))
+    return estimator is None or estimator.isDone()
+
+# encoder, decoder and mm executables of the platform and the files whose changes change the metrics
+def getTools(task, tmc2Dir, mmDir, log=None):
+    plt = platform.system()
+    if plt == "Windows":
+        print(utils.BLUE + "Your system is Windows", utils.ENDC, file=log)
+        encoder=Path(tmc2Dir).joinpath("bin", "Release", "PccAppEncoder.exe")
+        decoder=Path(tmc2Dir).joinpath("bin", "Release", "PccAppDecoder.exe")
+        mm=Path(mmDir).joinpath("build", "Release", "bin", "Release", "mm.exe")
+    elif plt == "Linux":
+        print(utils.BLUE + "Your system is Linux", utils.ENDC, file=log)
+        encoder=Path(tmc2Dir).joinpath("bin", "PccAppEncoder")
+        decoder=Path(tmc2Dir).joinpath("bin", "PccAppDecoder")
+        mm=Path(mmDir).joinpath("build", "Release", "bin", "mm")
+    else:
+        raise ValueError("Your system is not supported")
+    
+    if not encoder.exists():
+        raise ValueError("Exe not found : ", encoder)
+    if not decoder.exists():
+        raise ValueError("Exe not found : ", decoder)
+    if task.metricBackend == "mm" and not mm.exists():
+        raise ValueError("Exe not found : ", mm)
+    # files whose changes change the metrics
+    if task.metricBackend == "mm":
+        metricTools = [mm]
+    else:
+        metricTools = [Path(__file__).resolve().parent.joinpath(name) for name in ["PccMetrics.py", "Pcqm.py", "MmLog.py"]]
+    return encoder, decoder, mm, metricTools
+
+# run the stages of a task, the messages are printed in log and the tools started are appended
+# to processes (when given) such that a caller running the task in a thread can terminate them
+def runTask(task, log=None, processes=None):
+    log = log or sys.stdout
+
+    print("encOptions", shlex.join(task.encOptions), file=log)
+    utils.printArgs(task, file=log)
+    
+    inputDir  = Path(task.inputDir).resolve(strict=True)    
+    outputDir = Path(task.outputDir).resolve()
+    tmc2Dir   = Path(task.tmc2Dir).resolve()
+    mmDir     = Path(task.mmDir).resolve()
+    
+    # check options
+    
+    frameNumber = getFrameNumber(task)
+        
+    encoder, decoder, mm, metricTools = getTools(task, tmc2Dir, mmDir, log)
+    
+    #search info in Sequence cfg file
+    startFrameNb, uncompressedDataPath, resolution = readSequenceCfg(task.seqCfgFile)
+            
+    files           = getOutputFiles(outputDir, task.seq, frameNumber, task.condition, task.rate, task.name, task.testName)
+    outputPrefix    = files['outputPrefix']
+    compressedPath  = files['compressedPath']
+    cmdFile         = files['cmdFile']
+    encoderFile     = files['encoderFile']
+    decoderFile     = files['decoderFile']
+    compressBinFile = files['compressBinFile']
+    plyDecPath      = files['plyDecPath']
+    plySourcePath   = Path(inputDir).joinpath(uncompressedDataPath)
+    #detect if source had normals
+    if hasNormals(plySourcePath, startFrameNb):
+        nrmSourcePath   = Path(inputDir).joinpath(uncompressedDataPath)
+    else:
+        nrmSourcePath   = ""
+    # the estimated normals are given to the encoder and the metrics compare with them
+    metricSourcePath = plySourcePath
+    normalEstimator  = getNormalEstimator(task, plySourcePath, startFrameNb, frameNumber, log)
+    normalsKey       = ""
+    if normalEstimator is not None:
+        nrmSourcePath = metricSourcePath = normalEstimator.run()
+        normalsKey    = normalEstimator.getKey()
+    
+    journal      = JobJournal(getJournalFile(outputDir))
+    isEncodeDone = isStageDone("encoder", files, journal)
+    isDecodeDone = isDecodedForMetrics(files, journal, task.metrics, task.metricSampling)
+    isMetricDone = {family: isStageDone(getMetricStage(family), files, journal, sampling=task.metricSampling) for family in task.metrics}
+    runEncoder   = task.stage in ("all", "encoder")
+    runDecoder   = task.stage in ("all", "decoder")
+    # a mm_<family> stage only computes its family and mm_pcc the pcc ones, the decoded PLY are kept until all of them are computed
+    runFamilies  = getStageFamilies(task.stage, task.metrics)
+    runMetrics   = len(runFamilies) > 0
+    
+    print("metrics=", ",".join(runFamilies), "isMetricDone=", isMetricDone, file=log)
+    
+    # results are shared through the cache by identical tasks (e.g. same test in several profiles)
+    cache     = ResultCache(task.cacheDir, log=log) if task.cacheDir else None
+    cacheKeys = getCacheKeys(cache, task, encoder, decoder, metricTools, tmc2Dir, plySourcePath, startFrameNb, frameNumber, resolution, nrmSourcePath, normalsKey) if cache else {}
+    
+    #create outputDir if does not exist
+    if not compressedPath.exists():
+        print("create dir:", compressedPath, file=log, flush=True);
+        os.makedirs(compressedPath, exist_ok=True)
+    
+    # used to force decoding and metric computation if something change
+    isEncodedProcessDone = False
+    isDecodedProcessDone = False
+    isMetricsProcessDone = False
+    
+    # ENCODER
+    if not runEncoder:
+        pass
+    elif not isEncodeDone or task.forceEncode:
+        print (utils.GREEN  + "Encode: ", compressBinFile,  utils.ENDC, file=log, flush=True)
+        # encoder command line of the frames [startFrameNumber, startFrameNumber + frameCount - 1], the
+        # start frame of the sequence cfg is used when startFrameNumber is None
+        def getEncoderCmd(startFrameNumber, frameCount, compressedStreamPath, nbThread):
+            return [
+                str(encoder),
+                "".join(["--config=", str(Path(tmc2Dir).joinpath("cfg", "common", "ctc-common.cfg"))]),
+                "".join(["--config=", str(Path(tmc2Dir).joinpath("cfg", "condition", getConditionFileName(task.condition)))]),
+                "".join(["--config=", str(task.seqCfgFile)]),
+                "".join(["--configurationFolder=", str(Path(tmc2Dir).joinpath("cfg")), os.sep]),
+                "".join(["--uncompressedDataFolder=", str(inputDir), os.sep]),
+                "".join(["--compressedStreamPath=", str(compressedStreamPath)]),
+                "".join(["--normalDataPath=", str(nrmSourcePath)]),
+                "".join(["--nbThread=", str(nbThread)]),
+                "".join(["--frameCount=", str(frameCount)]),
+                "".join(["--resolution=", str(resolution)]),
+                ] + (["".join(["--startFrameNumber=", str(startFrameNumber)])] if startFrameNumber is not None else []) + task.encOptions
+        if task.isSegmented():
+            encode = lambda: SegmentedEncoder(getEncoderCmd, compressBinFile, encoderFile, startFrameNb, frameNumber, task.aiSegmentSize, task.nbThreads,
+                                              readGroupOfFramesSize(task.seqCfgFile), cmdFile, log, processes).run()
+        else:
+            encode = lambda: runTool(getEncoderCmd(None, frameNumber, compressBinFile, task.nbThreads), encoderFile, cmdFile, 'w', log, processes)
+        runJournaled(journal, "encoder", files, 
+                     lambda: runCached(cache, cacheKeys.get('encoder'), {'enc.bin': compressBinFile, 'encoder.log': encoderFile}, encode, log))
+        isEncodedProcessDone = True
+    
+    else:
+        print (utils.GREEN  + "Already encoded: ",compressBinFile,  utils.ENDC, file=log, flush=True)
+    
+    # command line computing the metric families of the frames [firstFrame, lastFrame], its output is the log
+    def getMetricCmd(families, firstFrame, lastFrame, nbJobs=1):
+        if task.metricBackend == "native":
+            return [
+                sys.executable, str(Path(__file__).resolve().parent.joinpath("PccMetrics.py")),
+                "-a", str(metricSourcePath), "-b", str(plyDecPath),
+                "-f", str(firstFrame), "-n", str(lastFrame - firstFrame + 1),
+                "--resolution", str(resolution), "--nbJobs", str(nbJobs),
+                "--metrics", ",".join(families), "-o", "-",
+                ]
+        cmd = [str(mm), "sequence", "--firstFrame", str(firstFrame), "--lastFrame", str(lastFrame)]
+        # geometry and colour are both computed by the pcc mode
+        if "geometry" in families or "color" in families:
+            cmd += ["END", "compare", "--mode", "pcc",  "--inputModelA", str(metricSourcePath), "--inputModelB", str(plyDecPath)]
+        if "pcqm" in families:
+            cmd += ["END", "compare", "--mode", "pcqm", "--inputModelA", str(metricSourcePath), "--inputModelB", str(plyDecPath)]
+        return cmd
+
+    def getFrameTable(runFile):
+        return runFile.with_name("".join([runFile.stem, "_frames.csv"]))
+
+    # DECODER  
+    isMetricsStreamed = False
+    if not runDecoder:
+        pass
+    elif not isDecodeDone or task.forceDecode or isEncodedProcessDone:      
+        print (utils.GREEN  + "Decode", compressBinFile, utils.ENDC, file=log, flush=True)
+        cmd = [
+            str(decoder),
+            "".join(["--startFrameNumber=", str(startFrameNb)]),
+            "".join(["--compressedStreamPath=", str(compressBinFile)]),
+            "".join(["--reconstructedDataPath=", str(plyDecPath)]),
+            "".join(["--inverseColorSpaceConversionConfig=", str(Path(tmc2Dir).joinpath("cfg", "hdrconvert", "yuv420toyuv444_16bit.cfg"))]),
+            "--nbThread=1",
+            ]
+        isMetricsCached = cache is not None and all(cache.has(cacheKeys[getMetricStage(family)]) for family in task.metrics)
+        if task.streamMetrics and task.metricSampling:
+            print (utils.BLUE  + "Metrics are not streamed with a frame sampling, they are computed after decoding", utils.ENDC, file=log, flush=True)
+        if task.isStreamed() and not isMetricsCached:
+            # the decoder stage also computes the metrics, the decoded frames are removed once measured
+            def streamRun(families, runFile):
+                StreamingMetrics(cmd, decoderFile, lambda first, last: getMetricCmd(families, first, last), runFile, plyDecPath, startFrameNb, frameNumber,
+                                 task.streamBatch, task.scratchLimit, cmdFile, log, processes, frameTable=getFrameTable(runFile)).run()
+            runJournaled(journal, "decoder", files, 
+                         lambda: runCached(cache, cacheKeys.get('decoder'), {'decoder.log': decoderFile}, 
+                                           lambda: runMetricFamilies(journal, cache, cacheKeys, files, task.metrics, streamRun, log, False), log, False))
+            isMetricsStreamed = True
+        else:
+            # the decoded PLY are not cached: the decoder log is only restored when the metrics can be restored too
+            runJournaled(journal, "decoder", files, 
+                         lambda: runCached(cache, cacheKeys.get('decoder'), {'decoder.log': decoderFile}, 
+                                           lambda: runTool(cmd, decoderFile, cmdFile, 'a', log, processes), log, isMetricsCached))
+        isDecodedProcessDone = True
+    else:
+        print (utils.GREEN  + "Already decoded: ",compressBinFile,  utils.ENDC, file=log, flush=True)
+    
+    # METRICS
+    if not runMetrics:
+        pass
+    elif isMetricsStreamed:
+        isMetricsProcessDone = True
+    elif any(not isMetricDone[family] for family in runFamilies) or task.forceMetric or isEncodedProcessDone or isDecodedProcessDone:
+        # the families to compute are computed together, each one gets its own log
+        families = [family for family in runFamilies if not isMetricDone[family] or task.forceMetric or isEncodedProcessDone or isDecodedProcessDone]
+        print (utils.GREEN  + "Compute Metrics", ",".join(families), metricSourcePath, "versus", plyDecPath, utils.ENDC, file=log, flush=True)
+        def metricRun(families, runFile):
+            if task.usesFrameCache():
+                # only the frames missing in the frame cache are measured, one per metric run
+                frames     = FrameSampling.getSampledFrames(task.metricSampling, startFrameNb, frameNumber)
+                frameKeys  = getFrameKeys(cache, task, metricTools, metricSourcePath, plyDecPath, frames, families, resolution)
+                frameCache = FrameCache(task.cacheDir)
+                frameCache.ingest(getFrameFiles(files, [decoderFile] + metricTools), frameKeys, log, startFrameNb)
+                cached     = frameCache.getFrames(frameKeys)
+                cachedLogs = [(MmLog.writeRangeLog(cached[frame], MmLog.getRangeLogFile(runFile, frame, frame), frame, frame), frame, frame) for frame in sorted(cached)]
+                print (utils.GREEN  + "Frames restored from the frame cache: %d of %d" % (len(cached), len(frames)), utils.ENDC, file=log, flush=True)
+                computed = ShardedMetrics(lambda first, last: getMetricCmd(families, first, last), runFile, startFrameNb, frameNumber, task.mmJobs,
+                                          frameTable=getFrameTable(runFile), cmdFile=cmdFile, log=log, processes=processes, sampling=task.metricSampling,
+                                          frames=[frame for frame in frames if frame not in cached], extraLogs=cachedLogs).run()
+                frameCache.putFrames(frameKeys, {first: stats for stats, first, last in computed})
+            elif task.metricSampling or (task.metricBackend == "mm" and task.mmJobs > 1 and frameNumber > 1):
+                # one metric run per (sampled) frame, the per frame means are merged into the log
+                ShardedMetrics(lambda first, last: getMetricCmd(families, first, last), runFile, startFrameNb, frameNumber, task.mmJobs,
+                               frameTable=getFrameTable(runFile), cmdFile=cmdFile, log=log, processes=processes, sampling=task.metricSampling).run()
+            else:
+                # the native backend computes the frames in parallel itself
+                runTool(getMetricCmd(families, startFrameNb, startFrameNb+frameNumber-1, task.mmJobs), runFile, cmdFile, 'a', log, processes)
+        runMetricFamilies(journal, cache, cacheKeys, files, families, metricRun, log, sampling=task.metricSampling)
+                                
+        isMetricsProcessDone = True
+        
+    else:
+        print (utils.GREEN  + "Already metric done: ",compressBinFile,  utils.ENDC, file=log, flush=True)        
+    
+    # decoded PLY are needed until the metrics of all families are computed (they can be computed by other tasks)
+    if task.forceClean and runMetrics and isStageDone("mm", files, journal, task.metrics, task.metricSampling):
+        removeDecodedPly(files, log)
+
+    # keep this print line to be able to retreive log files
+    print (utils.GREEN  + "Process is done.", utils.ENDC, file=log, flush=True)
+
+def removeDecodedPly(files, log):
+    compressedPath = files['compressedPath']
+    outputPrefix   = files['outputPrefix']
+    print (utils.GREEN  + "Remove decoded PLY in : ", compressedPath, "containing : ", outputPrefix, utils.ENDC, file=log, flush=True)            
+    for plyfile in os.listdir(compressedPath):
+        if plyfile.endswith("ply") and outputPrefix in plyfile:
+            if Path(compressedPath).joinpath(plyfile).exists():
+                os.remove(Path(compressedPath).joinpath(plyfile))
+
+# compute the metrics of several rates of the same sequence at once with the native backend: each
+# source frame is read and its KD-tree built once for all the rates (see PccMetrics.runBatch), one
+# log per rate is written and split in its family logs. The tasks shall have the same source,
+# frames and metric options, the metric families missing in any of them are computed for all.
+# With a cache directory, the family logs of each rate go through the result cache as in runTask:
+# the rates with all of them in the cache are restored, the other ones are measured and stored.
+def runBatchMetrics(tasks, log=None, processes=None):
+    log = log or sys.stdout
+    first = tasks[0]
+    startFrameNb, uncompressedDataPath, resolution = readSequenceCfg(first.seqCfgFile)
+    frameNumber   = getFrameNumber(first)
+    plySourcePath = Path(first.inputDir).resolve(strict=True).joinpath(uncompressedDataPath)
+    nrmSourcePath = plySourcePath if hasNormals(plySourcePath, startFrameNb) else ""
+    metricSourcePath = plySourcePath
+    normalEstimator  = getNormalEstimator(first, plySourcePath, startFrameNb, frameNumber, log)
+    normalsKey       = ""
+    if normalEstimator is not None:
+        nrmSourcePath = metricSourcePath = normalEstimator.run()
+        normalsKey    = normalEstimator.getKey()
+    journal  = JobJournal(getJournalFile(Path(first.outputDir).resolve()))
+    allFiles = [getOutputFiles(Path(task.outputDir).resolve(), task.seq, frameNumber, task.condition, task.rate, task.name, task.testName) for task in tasks]
+    families = [family for family in first.metrics if any(task.forceMetric or not isStageDone(getMetricStage(family), files, journal) for task, files in zip(tasks, allFiles))]
+    cache    = ResultCache(first.cacheDir, log=log) if first.cacheDir and families else None
+    allKeys  = [{}] * len(tasks)
+    if cache is not None:
+        tmc2Dir = Path(first.tmc2Dir).resolve()
+        encoder, decoder, mm, metricTools = getTools(first, tmc2Dir, Path(first.mmDir).resolve(), log)
+        allKeys = [getCacheKeys(cache, task, encoder, decoder, metricTools, tmc2Dir, plySourcePath, startFrameNb, frameNumber, resolution, nrmSourcePath, normalsKey) for task in tasks]
+    measured = []
+    for idx, (files, cacheKeys) in enumerate(zip(allFiles, allKeys) if families else []):
+        familyFiles = {family: files[getMetricFileKey(family)] for family in families}
+        # every family is restored (list, not generator), the ones of a rate measured anyway are overwritten
+        if cache is not None and all([cache.restore(cacheKeys[getMetricStage(family)], {'mm.log': familyFiles[family]}) for family in families]):
+            print (utils.GREEN  + "Restored from cache:", ",".join(families), files['outputPrefix'], utils.ENDC, file=log, flush=True)
+            for family in families:
+                journal.recordStage(files['journalKey'], getMetricStage(family), getStageArtifacts(getMetricStage(family), files), "")
+        else:
+            measured.append(idx)
+    if measured:
+        print (utils.GREEN  + "Compute Metrics", ",".join(families), "of", len(measured), "rates", metricSourcePath, utils.ENDC, file=log, flush=True)
+        runFiles = {idx: getMetricRunFile(allFiles[idx], families) for idx in measured}
+        batchFile = allFiles[0]['compressedPath'].joinpath("".join([allFiles[0]['compressedPath'].name, "_mm_batch.log"]))
+        cmd = [
+            sys.executable, str(Path(__file__).resolve().parent.joinpath("PccMetrics.py")),
+            "-a", str(metricSourcePath), "-b"] + [str(allFiles[idx]['plyDecPath']) for idx in measured] + [
+            "-f", str(startFrameNb), "-n", str(frameNumber),
+            "--resolution", str(resolution), "--nbJobs", str(first.mmJobs),
+            "--metrics", ",".join(families), "-o"] + [str(runFiles[idx]) for idx in measured]
+        # the stages of every rate are journaled around the single run, each rate splits its log once it is written
+        def runFrom(pos):
+            if pos == len(measured):
+                runTool(cmd, batchFile, allFiles[0]['cmdFile'], 'a', log, processes)
+                return
+            files, runFile, cacheKeys = allFiles[measured[pos]], runFiles[measured[pos]], allKeys[measured[pos]]
+            def run():
+                runFrom(pos + 1)
+                MmLog.splitLog(runFile, {family: files[getMetricFileKey(family)] for family in families})
+                if len(families) > 1:
+                    os.remove(runFile)
+                if cache is not None:
+                    for family in families:
+                        cache.store(cacheKeys[getMetricStage(family)], {'mm.log': files[getMetricFileKey(family)]})
+            runJournaled(journal, [getMetricStage(family) for family in families], files, run)
+        runFrom(0)
+    elif not families:
+        print (utils.GREEN  + "Already metric done:", len(tasks), "rates", plySourcePath, utils.ENDC, file=log, flush=True)
+
+    for task, files in zip(tasks, allFiles):
+        if task.forceClean:
+            removeDecodedPly(files, log)
+    print (utils.GREEN  + "Process is done.", utils.ENDC, file=log, flush=True)
+
 def main():
     try:
         # Parse arguments
@@ -128,179 +873,15 @@ def main():
             parser.print_help(sys.stderr)
             raise ValueError("bad arguments")
         
-        print("encOptions" , args.encOptions)
-        utils.printArgs(args)
-        
-        scriptDir = Path(__file__).resolve(strict=True)
-        inputDir  = Path(args.inputDir).resolve(strict=True)    
-        outputDir = Path(args.outputDir).resolve()
-        tmc2Dir   = Path(args.tmc2Dir).resolve()
-        mmDir     = Path(args.mmDir).resolve()
-        
-        # check options
-        
-        frameNumber = args.frameNumber
-        if (args.frameNumber == 1000):
-            frameNumber = len(glob.glob1(inputDir,"*.ply"))
-            
-        plt = platform.system()
-        if plt == "Windows":
-            print(utils.BLUE + "Your system is Windows", utils.ENDC)
-            encoder=Path(tmc2Dir).joinpath("bin", "Release", "PccAppEncoder.exe")
-            decoder=Path(tmc2Dir).joinpath("bin", "Release", "PccAppDecoder.exe")
-            mm=Path(mmDir).joinpath("build", "Release", "bin", "Release", "mm.exe")
-        elif plt == "Linux":
-            print(utils.BLUE + "Your system is Linux", utils.ENDC)
-            encoder=Path(tmc2Dir).joinpath("bin", "PccAppEncoder")
-            decoder=Path(tmc2Dir).joinpath("bin", "PccAppDecoder")
-            mm=Path(mmDir).joinpath("build", "Release", "bin", "mm")
-        else:
-            raise ValueError("Your system is not supported")
-        
-        if not encoder.exists():
-            raise ValueError("Exe not found : ", encoder)
-        if not decoder.exists():
-            raise ValueError("Exe not found : ", decoder)
-        if not mm.exists():
-            raise ValueError("Exe not found : ", mm)
-        
-        #search info in Sequence cfg file
-        with open(args.seqCfgFile) as f:
-            for line in f:
-                if "startFrameNumber" in line:
-                    startFrameNb = int(line.split(":")[1])
-                if "uncompressedDataPath" in line:
-                    uncompressedDataPath = str(line.split(":")[1]).strip()
-                if "geometry3dCoordinatesBitdepth" in line:
-                    resolution = 1023 if int(line.split(":")[1]) == 10 else 2047
-                
-        #testName        = "".join(["S", args.seq, "_F", str(frameNumber), "_", args.profileName])
-        testName        = "".join(["F", str(frameNumber), "_", args.testName])
-        testDir         = "".join(["S", args.seq, "C2", args.condition, "_", args.name])
-        ## ! outputPrefix shall be the same than in XlsSheetGenerator.py named "outputPrefix"
-        outputPrefix    = "".join(["S", args.seq, "C2", args.condition, "R%04d" % args.rate, "_", args.name]);
-        compressedPath  = Path(outputDir).joinpath(testName, testDir)
-        cmdFile         = Path(compressedPath).joinpath("".join([outputPrefix, "_command.log"]))
-        encoderFile     = Path(compressedPath).joinpath("".join([outputPrefix, "_encoder.log"]))
-        decoderFile     = Path(compressedPath).joinpath("".join([outputPrefix, "_decoder.log"]))
-        mmFile          = Path(compressedPath).joinpath("".join([outputPrefix, "_mm.log"]))
-        compressBinFile = Path(compressedPath).joinpath("".join([outputPrefix, "_enc.bin"]))
-        plyDecPath      = Path(compressedPath).joinpath("".join([outputPrefix, "_dec_%04d.ply"]))
-        #csvFile         = Path(outputDir).joinpath(testName, "".join([testName, "_metrics.csv"]))
-        plySourcePath   = Path(inputDir).joinpath(uncompressedDataPath)
-        #detect if source had normals
-        if hasNormals(plySourcePath, startFrameNb):
-            nrmSourcePath   = Path(inputDir).joinpath(uncompressedDataPath)
-        else:
-            nrmSourcePath   = ""
-        
-        #print("output encoderFile =", encoderFile, flush=True)
-        #print("output decoderFile =", decoderFile, flush=True)
-        #print("output mmFile      =", mmFile, flush=True)
-        isEncodeDone = isEncodeProcessSuccess(compressBinFile, encoderFile)
-        isDecodeDone = isDecodeProcessSuccess(decoderFile)
-        isMetricDone = isMetricProcessSuccess(mmFile)
-        
-        print("mmFile=", mmFile, "isMetricDone=", isMetricDone)
-        
-        #create outputDir if does not exist
-        if not compressedPath.exists():
-            print("create dir:", compressedPath, flush=True);
-            os.makedirs(compressedPath, exist_ok=True)
-        
-        # used to force decoding and metric computation if something change
-        isEncodedProcessDone = False
-        isDecodedProcessDone = False
-        isMetricsProcessDone = False
-        
-        # ENCODER
-        if not isEncodeDone or args.forceEncode:
-            print (utils.GREEN  + "Encode: ", compressBinFile,  utils.ENDC, flush=True)
-            config = "".join(
-                        [
-                        " --config=", str(Path(tmc2Dir).joinpath("cfg", "common", "ctc-common.cfg")),
-                        " --config=", str(Path(tmc2Dir).joinpath("cfg", "condition", getConditionFileName(args.condition))),
-                        " --config=", str(args.seqCfgFile),
-                        #" --config=", str(Path(tmc2Dir).joinpath("cfg", "rate", "".join(["ctc-r", str(args.rate), ".cfg"]))),
-                        " --configurationFolder=", str(Path(tmc2Dir).joinpath("cfg")),os.sep,
-                        " --uncompressedDataFolder=", str(inputDir), os.sep,
-                        " --compressedStreamPath=", str(compressBinFile),
-                        " --normalDataPath=", str(nrmSourcePath),
-                        " --nbThread=", str(args.nbThreads),                                                   
-                        " --frameCount=", str(frameNumber),                                                 
-                        " --resolution=", str(resolution),
-                        " ", str(args.encOptions),
-                        " > ", str(encoderFile)
-                        ])
-        
-            cmd = " ".join([str(encoder), config]) 
-            f = open(cmdFile,'w')
-            print(cmd, file=f) 
-            print("CMD=", cmd)
-            f.close()        
-            subprocess.check_call(cmd, shell=True)
-            encodingProcessDone = True
-        
-        else:
-            print (utils.GREEN  + "Already encoded: ",compressBinFile,  utils.ENDC, flush=True)
-        
-        # DECODER  
-        if not isDecodeDone or args.forceDecode or isEncodedProcessDone:      
-        #if (len(glob.glob1(compressedPath,"".join([outputPrefix,"*.ply"]))) != frameNumber) or args.forceDecode:
-            print (utils.GREEN  + "Decode", compressBinFile, utils.ENDC, flush=True)
-        
-            config = "".join(
-                        [" --startFrameNumber=", str(startFrameNb),
-                        " --compressedStreamPath=", str(compressBinFile),
-                        " --reconstructedDataPath=", str(plyDecPath),
-                        " --inverseColorSpaceConversionConfig=", str(Path(tmc2Dir).joinpath("cfg", "hdrconvert", "yuv420toyuv444_16bit.cfg")),
-                        " --nbThread=1 > ", str(decoderFile)])
-            cmd = " ".join([str(decoder), config]) 
-            f = open(cmdFile,'a')
-            print(cmd, file=f) 
-            f.close()
-            subprocess.check_call(cmd, shell=True)
-            isDecodedProcessDone = True
-        else:
-            print (utils.GREEN  + "Already decoded: ",compressBinFile,  utils.ENDC, flush=True)
-        
-        # METRICS
-        if not isMetricDone or args.forceMetric or isEncodedProcessDone or isDecodedProcessDone:
-                        
-            print (utils.GREEN  + "Compute Metrics", plySourcePath, "versus", plyDecPath, utils.ENDC, flush=True)
-            config = "".join(
-                        ["sequence --firstFrame ", str(startFrameNb), " --lastFrame ", str(startFrameNb+frameNumber-1), " END ",
-                         "compare --mode pcc  --inputModelA ", str(plySourcePath), " --inputModelB ", str(plyDecPath), " END ",
-                         "compare --mode pcqm --inputModelA ", str(plySourcePath), " --inputModelB ", str(plyDecPath), " > ", str(mmFile)])
-            cmd = " ".join([str(mm), config]) 
-            f = open(cmdFile,'a')
-            print(cmd, file=f) 
-            f.close()
-            subprocess.check_call(cmd, shell=True)
-                                    
-            isMetricsProcessDone = True
-            
-        else:
-            print (utils.GREEN  + "Already metric done: ",compressBinFile,  utils.ENDC, flush=True)        
-        
-        if args.forceClean:
-            print (utils.GREEN  + "Remove decoded PLY in : ", compressedPath, "containing : ", outputPrefix, utils.ENDC, flush=True)            
-            for plyfile in os.listdir(compressedPath):
-                if plyfile.endswith("ply") and outputPrefix in plyfile:
-                    if Path(compressedPath).joinpath(plyfile).exists():
-                        os.remove(Path(compressedPath).joinpath(plyfile))
-
-        # keep this print line to be able to retreive log files
-        print (utils.GREEN  + "Process is done.", utils.ENDC, flush=True)
+        runTask(ComputeTask.fromArgs(args))
                                    
-    except Exception as e:
-        print (utils.RED + "Exception:", e, utils.ENDC, flush=True)
-        sys.exit(e.returncode)
     except subprocess.CalledProcessError as e:
         print(utils.RED + "subprocess Exception:", e.returncode, utils.ENDC, flush=True)
-        print(utils.RED + e.cmd, utils.ENDC, flush=True)
-        print(utils.RED + e.output, utils.ENDC, flush=True)        
+        print(utils.RED + shlex.join(e.cmd), utils.ENDC, flush=True)
         sys.exit(e.returncode)
+    except Exception as e:
+        print (utils.RED + "Exception:", e, utils.ENDC, flush=True)
+        sys.exit(1)
 
 
 ##################
@@ -25,6 +25,12 @@ import utils as utils
 from ConfigManager import ConfigManager
 from BinGenerator import BinGenerator
 from XlsSheetGenerator import XlsSheetGenerator
+from NinjaGenerator import NinjaGenerator
+from RateMatcher import RateMatcher
+from BatchBackend import BACKENDS, getBatchBackend
+from compute import METRIC_BACKENDS
+import MmLog
+import FrameSampling
 
 def parseArgs():
     global parser
@@ -32,6 +38,30 @@ def parseArgs():
     parser.add_argument('-i', '--sequenceJson',     help="Json that contains the sequence to be done", type=str, required=True)
     parser.add_argument('-o', '--outputDir',        help="Output BIN directory", type=str, required=True)
     parser.add_argument('-t', '--testConfJson',     help="Json that contains the test configuration", type=str, required=True)
+    parser.add_argument(      '--nbThreads',        help="Number of threads used by each encoder (optional, default=1)", type=int, default=1)
+    parser.add_argument(      '--coreBudget',       help="Maximum number of cores used by all running tasks (optional, default=all cores)", type=int, default=None)
+    parser.add_argument(      '--mode',             help="all: run the tests then generate CSV and XLSM files, ninja: only write OUTPUTDIR/build.ninja, csv/xlsm: only generate CSV/XLSM files, rates: search the QPs of the TargetRateList of the sequences with probe encodes and write the test configuration with the found RateList (optional, default=all)", type=str, default="all", choices=["all", "ninja", "csv", "xlsm", "rates"])
+    parser.add_argument(      '--backend',          help="local: run the tests on this machine, slurm: submit the tests as array jobs with sbatch, fake-slurm: local stand-in of slurm (optional, default=local)", type=str, default="local", choices=BACKENDS)
+    parser.add_argument(      '--granularity',      help="Submit one array job per stage (encoder, decoder, mm) or one per test with a batch backend (optional, default=stage)", type=str, default="stage", choices=["stage", "test"])
+    parser.add_argument(      '--cleanDecoded',     help="Remove decoded PLY once metrics are computed in the ninja graph (optional, default=False)", action='store_true', default=False)
+    parser.add_argument(      '--cacheDir',         help="Directory of the result cache, identical tasks (same inputs, options and tools) are computed once and restored from it (optional, default=no cache)", type=str, default=None)
+    parser.add_argument(      '--streamMetrics',    help="Compute the metrics while decoding and remove the decoded frames once measured (optional, default=False)", action='store_true', default=False)
+    parser.add_argument(      '--streamBatch',      help="Number of frames measured by each mm run when streaming (optional, default=8)", type=int, default=8)
+    parser.add_argument(      '--scratchLimit',     help="Size in MB of the decoded frames of a test above which its decoder is paused when streaming, 0 for no limit (optional, default=0)", type=int, default=0)
+    parser.add_argument(      '--mmJobs',           help="Number of mm processes computing the metrics of the frames of a test in parallel (optional, default=1)", type=int, default=1)
+    parser.add_argument(      '--metrics',          help="Comma separated metric families computed for each test, each one has its own log: geometry, color, pcqm (optional, default=geometry,color,pcqm)", type=str, default=",".join(MmLog.METRIC_FAMILIES))
+    parser.add_argument(      '--metricBackend',    help="mm: compute the metrics with mm, native: with PccMetrics.py (optional, default=mm)", type=str, default="mm", choices=METRIC_BACKENDS)
+    parser.add_argument(      '--metricSampling',   help="Frames measured for exploratory runs: all, every:<k> (every k-th frame) or random:<n> (one random frame in each of n strata), the CSV gives the sampled means with a 95%% confidence interval (optional, default=all)", type=str, default="all")
+    parser.add_argument(      '--estimateNormals',  help="Estimate once per frame the normals of the sources without normals, they are kept in the cache directory (or in outputDir/normals) and given to the encoder and the metrics (optional, default=False)", action='store_true', default=False)
+    parser.add_argument(      '--aiSegmentSize',    help="Encode the AI tests by segments of this number of frames (rounded up to a multiple of groupOfFramesSize) running in parallel on the threads of the test, the bitstreams and logs are merged, 0 for a single encoder (optional, default=0)", type=int, default=0)
+    parser.add_argument(      '--frameCache',       help="With a cache directory, keep the metric values of each frame in it: a rerun only measures the frames it has not seen and every test gets its per frame values (optional, default=False)", action='store_true', default=False)
+    parser.add_argument(      '--batchRates',       help="With the native metric backend, compute the metrics of all the rates of a sequence in a single task reading each source frame once (optional, default=False)", action='store_true', default=False)
+    parser.add_argument(      '--costHistory',      help="Output directories of previous campaigns whose tests train the runtime model ordering the tasks longest first, with the tests of OUTPUTDIR (optional, default=none)", type=str, nargs="*", default=[])
+    parser.add_argument(      '--diskMargin',       help="Space in MB kept free on the output volume: a decoder is started once the free space less the decoded PLY reserved by the running tests holds its decoded PLY (optional, default=1024)", type=int, default=1024)
+    parser.add_argument(      '--probeFrames',      help="With the rates mode, number of frames of the probe encodes, the first ones of each sequence (optional, default=8)", type=int, default=8)
+    parser.add_argument(      '--rateTolerance',    help="With the rates mode, distance in percent of the target bitrate accepted for a probe encode (optional, default=5)", type=float, default=5.0)
+    parser.add_argument(      '--rateConfig',       help="With the rates mode, test configuration written with the found RateList (optional, default=OUTPUTDIR/<test configuration>_rates.json)", type=str, default=None)
+    parser.add_argument(      '--memoryBudget',     help="RAM in MB shared by the running stages: a stage is started once the peak memories predicted from the past runs of its sequence, condition and QPs (or a default proportional to the points of a frame) of the running stages and its own fit in it, 0 for no limit (optional, default=0)", type=int, default=0)
     return parser.parse_args()
       
 if __name__ == "__main__":
@@ -45,14 +75,37 @@ if __name__ == "__main__":
         
         #create a config manager
         cm = ConfigManager(args.outputDir, args.sequenceJson, args.testConfJson, 0)
+        cm.metrics = MmLog.parseFamilies(args.metrics)
         
-        #create a bin generator and run
-        binGen = BinGenerator(cm)
-        binGen.run()
-        
-        #create a xls sheet generator and run
+        taskOptions = {'streamMetrics': args.streamMetrics, 'streamBatch': args.streamBatch, 'scratchLimit': args.scratchLimit, 'mmJobs': args.mmJobs,
+                       'metrics': cm.metrics, 'metricBackend': args.metricBackend,
+                       'metricSampling': args.metricSampling if FrameSampling.parseSampling(args.metricSampling) else "", 'frameCache': args.frameCache,
+                       'estimateNormals': args.estimateNormals, 'aiSegmentSize': args.aiSegmentSize}
+        binGen = BinGenerator(cm, nbThreads=args.nbThreads, cacheDir=args.cacheDir, taskOptions=taskOptions, batchRates=args.batchRates, costHistory=args.costHistory, diskMargin=args.diskMargin * 1024 * 1024,
+                              memoryBudget=args.memoryBudget * 1024 * 1024)
         xlsGen = XlsSheetGenerator(cm)
-        xlsGen.run()
+
+        if args.mode == "ninja":
+            #write a ninja build file instead of running the tests
+            NinjaGenerator(cm, binGen, xlsGen, args.cleanDecoded).write()
+        elif args.mode == "csv":
+            xlsGen.run(createCsv=True, createXlsm=False)
+        elif args.mode == "xlsm":
+            xlsGen.run(createCsv=False, createXlsm=True)
+        elif args.mode == "rates":
+            if not RateMatcher(cm, binGen, args.nbThreads, args.probeFrames, args.rateTolerance / 100, args.rateConfig).run(args.coreBudget):
+                print(utils.RED + "Some rates are not matched, see logs in", cm.cmdDir, utils.ENDC, flush=True)
+        else:
+            #run the bin generator locally or through a batch queue
+            if args.backend == "local":
+                isSuccess = binGen.run(args.coreBudget)
+            else:
+                isSuccess = binGen.runBatch(getBatchBackend(args.backend, Path(cm.cmdDir).joinpath("batch")), args.granularity)
+            if not isSuccess:
+                print(utils.RED + "Some tasks failed, see logs in", cm.cmdDir, utils.ENDC, flush=True)
+        
+            #run the xls sheet generator once every task is finished
+            xlsGen.run()
         
     except Exception as e:
         exc_type, exc_obj, exc_tb = sys.exc_info()
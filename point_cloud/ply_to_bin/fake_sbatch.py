@@ -0,0 +1,210 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+# Local stand-in for the subset of the Slurm "sbatch" and "sacct" command lines used by
+# BatchBackend, such that batch submission can be run and tested on a single machine:
+#   fake_sbatch.py --spool DIR sbatch [--parsable] [--job-name=NAME] [--array=0-N] [--cpus-per-task=N]
+#                                     [--output=PATTERN] [--dependency=afterok|aftercorr|afterany:ID[:ID]]
+#                                     [--kill-on-invalid-dep=yes] script [args]
+#   fake_sbatch.py --spool DIR sacct --jobs=ID[,ID] [--parsable2] [--noheader] [--format=...]
+# Jobs are recorded in the spool directory and run by a detached process per job.
+
+import os, sys, json, time, argparse, subprocess, socket
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+TERMINAL_STATES = ["COMPLETED", "FAILED", "CANCELLED"]
+
+def parseArgs():
+    global parser
+    parser = argparse.ArgumentParser(description='Local stand-in for the Slurm sbatch and sacct commands')
+    parser.add_argument('--spool', help="Directory where jobs and their states are recorded", type=str, required=True)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    sbatch = subparsers.add_parser('sbatch')
+    sbatch.add_argument('--parsable',            action='store_true', default=False)
+    sbatch.add_argument('--job-name',            dest='jobName', type=str, default="job")
+    sbatch.add_argument('--array',               type=str, default="0")
+    sbatch.add_argument('--cpus-per-task',       dest='cpusPerTask', type=int, default=1)
+    sbatch.add_argument('--output',              type=str, default="fake-%A_%a.out")
+    sbatch.add_argument('--dependency',          type=str, default="")
+    sbatch.add_argument('--kill-on-invalid-dep', dest='killOnInvalidDep', type=str, default="yes")
+    sbatch.add_argument('script',                type=str)
+    sbatch.add_argument('scriptArgs',            nargs=argparse.REMAINDER)
+
+    sacct = subparsers.add_parser('sacct')
+    sacct.add_argument('--jobs',      type=str, required=True)
+    sacct.add_argument('--parsable2', action='store_true', default=False)
+    sacct.add_argument('--noheader',  action='store_true', default=False)
+    sacct.add_argument('--format',    type=str, default="JobID,State,ExitCode")
+
+    run = subparsers.add_parser('_run')
+    run.add_argument('jobId', type=str)
+    return parser.parse_args()
+
+def parseArray(array):
+    taskIds = []
+    for item in array.split("%")[0].split(","):
+        if "-" in item:
+            first, last = item.split("-")
+            taskIds += list(range(int(first), int(last) + 1))
+        else:
+            taskIds.append(int(item))
+    return taskIds
+
+def writeJson(path, data):
+    tmpPath = Path("".join([str(path), ".", socket.gethostname(), ".", str(os.getpid()), ".tmp"]))
+    with open(tmpPath, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmpPath, path)
+
+def readJson(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def stateFile(spool, jobId, taskId):
+    return Path(spool).joinpath("state", "".join([str(jobId), "_", str(taskId), ".json"]))
+
+def getTaskState(spool, jobId, taskId):
+    try:
+        return readJson(stateFile(spool, jobId, taskId))
+    except FileNotFoundError:
+        return None
+
+def setTaskState(spool, jobId, taskId, state, exitCode=0):
+    writeJson(stateFile(spool, jobId, taskId), {'state': state, 'exitCode': exitCode})
+
+def newJobId(spool):
+    lockFile = Path(spool).joinpath("jobid.lock")
+    while True:
+        try:
+            fd = os.open(lockFile, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            time.sleep(0.01)
+    try:
+        counterFile = Path(spool).joinpath("jobid")
+        jobId = int(counterFile.read_text()) + 1 if counterFile.exists() else 1
+        counterFile.write_text(str(jobId))
+    finally:
+        os.close(fd)
+        os.remove(lockFile)
+    return jobId
+
+def sbatch(args):
+    os.makedirs(Path(args.spool).joinpath("jobs"), exist_ok=True)
+    os.makedirs(Path(args.spool).joinpath("state"), exist_ok=True)
+    jobId = newJobId(args.spool)
+    job = {
+        'jobId'       : jobId,
+        'jobName'     : args.jobName,
+        'taskIds'     : parseArray(args.array),
+        'cpusPerTask' : args.cpusPerTask,
+        'output'      : args.output,
+        'dependency'  : args.dependency,
+        'script'      : str(Path(args.script).resolve()),
+        'scriptArgs'  : args.scriptArgs,
+        'cwd'         : os.getcwd(),
+    }
+    for taskId in job['taskIds']:
+        setTaskState(args.spool, jobId, taskId, "PENDING")
+    writeJson(Path(args.spool).joinpath("jobs", "".join([str(jobId), ".json"])), job)
+
+    subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "--spool", args.spool, "_run", str(jobId)],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    if args.parsable:
+        print(jobId)
+    else:
+        print("Submitted batch job", jobId)
+
+# returns True when the dependency of the task is satisfied, False while waiting, None when never satisfiable
+def isDependencySatisfied(spool, dependency, taskId):
+    if not dependency:
+        return True
+    depType, depJobs = dependency.split(":", 1)
+    for depJobId in depJobs.split(":"):
+        if depType == "aftercorr":
+            depTaskIds = [taskId]
+        else:
+            depTaskIds = readJson(Path(spool).joinpath("jobs", "".join([depJobId, ".json"])))['taskIds']
+        for depTaskId in depTaskIds:
+            state = getTaskState(spool, depJobId, depTaskId)
+            if state is None:
+                return None
+            if state['state'] not in TERMINAL_STATES:
+                return False
+            if depType != "afterany" and state['state'] != "COMPLETED":
+                return None
+    return True
+
+def runTask(spool, job, taskId):
+    while True:
+        satisfied = isDependencySatisfied(spool, job['dependency'], taskId)
+        if satisfied is None:
+            setTaskState(spool, job['jobId'], taskId, "CANCELLED", 0)
+            return
+        if satisfied:
+            break
+        time.sleep(0.5)
+
+    output = job['output'].replace("%A", str(job['jobId'])).replace("%a", str(taskId))
+    output = output.replace("%j", str(job['jobId'])).replace("%x", job['jobName'])
+    env = dict(os.environ)
+    env.update({
+        'SLURM_JOB_ID'        : str(job['jobId']),
+        'SLURM_ARRAY_JOB_ID'  : str(job['jobId']),
+        'SLURM_ARRAY_TASK_ID' : str(taskId),
+        'SLURM_CPUS_PER_TASK' : str(job['cpusPerTask']),
+        'SLURM_JOB_NAME'      : job['jobName'],
+    })
+    setTaskState(spool, job['jobId'], taskId, "RUNNING")
+    with open(Path(job['cwd']).joinpath(output), 'w') as logF:
+        returncode = subprocess.call(["bash", job['script']] + job['scriptArgs'], cwd=job['cwd'], env=env, stdout=logF, stderr=subprocess.STDOUT)
+    setTaskState(spool, job['jobId'], taskId, "COMPLETED" if returncode == 0 else "FAILED", returncode)
+
+def run(args):
+    job = readJson(Path(args.spool).joinpath("jobs", "".join([args.jobId, ".json"])))
+    nbWorkers = max(1, (os.cpu_count() or 1) // max(1, job['cpusPerTask']))
+    with ThreadPoolExecutor(max_workers=nbWorkers) as executor:
+        for taskId in job['taskIds']:
+            executor.submit(runTask, args.spool, job, taskId)
+
+def sacct(args):
+    fields = args.format.split(",")
+    if not args.noheader:
+        print("|".join(fields))
+    for jobId in args.jobs.split(","):
+        jobFile = Path(args.spool).joinpath("jobs", "".join([jobId, ".json"]))
+        if not jobFile.exists():
+            continue
+        for taskId in readJson(jobFile)['taskIds']:
+            state = getTaskState(args.spool, jobId, taskId) or {'state': "PENDING", 'exitCode': 0}
+            values = {
+                'JobID'    : "".join([jobId, "_", str(taskId)]),
+                'State'    : state['state'],
+                'ExitCode' : "".join([str(state['exitCode']), ":0"]),
+            }
+            print("|".join(values.get(field, "") for field in fields))
+
+if __name__ == "__main__":
+
+    args = parseArgs()
+    if args.command == "sbatch":
+        sbatch(args)
+    elif args.command == "sacct":
+        sacct(args)
+    else:
+        run(args)
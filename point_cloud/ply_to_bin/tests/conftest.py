@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+
+# the tests import the modules of ply_to_bin as its scripts do, from their directory
+import os, json, sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import MetricsBenchmark
+import PccMetrics
+
+# largest deviation versus mm of the values compared by MetricsBenchmark.py: {name: (absolute, relative)},
+# the PSNR in dB and PCQM relative to the value of mm
+MM_TOLERANCES = {
+    "D1"        : (0.01, None),
+    "D2"        : (0.01, None),
+    "Luma"      : (0.01, None),
+    "Cb"        : (0.01, None),
+    "Cr"        : (0.01, None),
+    "PCQM"      : (None, 0.025),
+    "PCQM-PSNR" : (0.1, None),
+    }
+
+# with REQUIRE_MM_REFERENCE=1 (once the mm logs of the bundled frames are recorded), a bundled case
+# without its frames or its recorded mm log fails instead of being skipped
+IS_MM_REFERENCE_REQUIRED = os.environ.get("REQUIRE_MM_REFERENCE", "0") == "1"
+
+# bundled frames of the metrics benchmark suite
+def getBundledCases():
+    with open(Path(MetricsBenchmark.__file__).parent.joinpath("jsons", "metrics_benchmark.json")) as f:
+        return json.load(f).get('Bundled', [])
+
+# values of a metric family computed by PccMetrics.py on the frames of a bundled case and the ones of
+# the mm log recorded on them (MetricsBenchmark.py --reference record), as read by ExtractMetrics
+def runVersusMm(bundled, family, logFile):
+    case = MetricsBenchmark.getBundledCase(MetricsBenchmark.BUNDLED_DIR, bundled)
+    skip = pytest.fail if IS_MM_REFERENCE_REQUIRED else pytest.skip
+    if case is None:
+        skip("bundled frames of %s not written (MetricsBenchmark.py --bundle)" % bundled['Name'])
+    reference = MetricsBenchmark.getReference(MetricsBenchmark.BUNDLED_DIR, case)
+    if reference is None:
+        skip("no mm log recorded on the bundled frames of %s (MetricsBenchmark.py --reference record)" % bundled['Name'])
+    referenceValues = MetricsBenchmark.readValues(reference, family)
+    if referenceValues is None:
+        skip("no %s metrics in %s" % (family, reference))
+    metrics = PccMetrics.PccMetrics(case['source'], case['decoded'], case['firstFrame'], case['nbFrame'], case['resolution'], families=[family])
+    metrics.run()
+    return MetricsBenchmark.readValues(metrics.writeLog(logFile), family), referenceValues
+
+def assertMatchesMm(values, referenceValues):
+    for name, value in values.items():
+        absolute, relative = MM_TOLERANCES[name]
+        assert value == pytest.approx(referenceValues[name], abs=absolute, rel=relative), name
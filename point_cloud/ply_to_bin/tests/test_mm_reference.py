@@ -0,0 +1,29 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+
+# Native metrics of PccMetrics.py (geometry, colour and PCQM) on the bundled frames of the metrics
+# benchmark versus the mm logs recorded on them (metrics_reference), within MM_TOLERANCES.
+
+import MmLog
+import pytest
+
+from conftest import assertMatchesMm, getBundledCases, runVersusMm
+
+@pytest.mark.parametrize("family", MmLog.METRIC_FAMILIES)
+@pytest.mark.parametrize("bundled", getBundledCases(), ids=lambda bundled: bundled['Name'])
+def test_bundledFramesVersusMm(bundled, family, tmp_path):
+    assertMatchesMm(*runVersusMm(bundled, family, tmp_path.joinpath("native_mm.log")))
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+
+# Native geometry (D1, D2) and colour (PSNR of Y, Cb, Cr) metrics of PccMetrics.py versus the
+# definitions of mm, checked on small clouds with known values (the bundled frames versus the mm logs
+# recorded on them are in test_mm_reference.py).
+
+import math
+
+import numpy as np
+import pytest
+
+import PccMetrics
+
+PEAK = 1023
+
+def getPlane(x=0.0, size=16):
+    y, z = np.meshgrid(np.arange(size), np.arange(size), indexing='ij')
+    return np.stack([np.full(size * size, x), y.ravel(), z.ravel()], axis=1).astype(np.float64)
+
+def getCloud(positions, normals=None, colors=None):
+    return {'positions': positions, 'normals': normals, 'colors': colors}
+
+def getValues(source, decoded, families=("geometry", "color")):
+    neighbours = PccMetrics.findNeighbours(source, decoded, PccMetrics.NB_SAME_DISTANCE)
+    values = {}
+    if "geometry" in families:
+        values.update(PccMetrics.computeGeometry(source, decoded, neighbours, PEAK))
+    if "color" in families:
+        values.update(PccMetrics.computeColor(source, decoded, neighbours))
+    return values
+
+# every point one voxel away from the other cloud along the normals: mse 1 in both directions
+def test_geometryOfShiftedPlane():
+    positions = getPlane()
+    normals = np.tile([1.0, 0.0, 0.0], (len(positions), 1))
+    values = getValues(getCloud(positions, normals), getCloud(positions + [1.0, 0.0, 0.0]), ["geometry"])
+    expected = 10 * math.log10(3 * PEAK * PEAK)
+    for label in ["mse1      (p2point) ", "mse2      (p2point) ", "mseF      (p2point) ", "mseF      (p2plane) "]:
+        assert values[label] == pytest.approx(1.0)
+    assert values["mseF, PSNR(p2point) "] == pytest.approx(expected)
+    assert values["mseF, PSNR(p2plane) "] == pytest.approx(expected)
+
+# a move within the planes of the source normals is not a point to plane error
+def test_geometryOfPlaneMovedAlongItself():
+    positions = getPlane()
+    normals = np.tile([1.0, 0.0, 0.0], (len(positions), 1))
+    values = getValues(getCloud(positions, normals), getCloud(positions + [0.0, 0.5, 0.0]), ["geometry"])
+    assert values["mseF      (p2point) "] == pytest.approx(0.25)
+    assert values["mseF      (p2plane) "] == pytest.approx(0.0)
+    assert values["mseF, PSNR(p2plane) "] == PccMetrics.PSNR_MAX
+
+# the worst direction gives mseF: a decoded cloud with extra points far from the source
+def test_geometryTakesTheWorstDirection():
+    positions = getPlane()
+    normals = np.tile([1.0, 0.0, 0.0], (len(positions), 1))
+    extra = np.array([[2.0, 0.0, 0.0]])
+    values = getValues(getCloud(positions, normals), getCloud(np.concatenate([positions, extra])), ["geometry"])
+    assert values["mse1      (p2point) "] == pytest.approx(4.0 / (len(positions) + 1))
+    assert values["mse2      (p2point) "] == pytest.approx(0.0)
+    assert values["mseF      (p2point) "] == values["mse1      (p2point) "]
+
+# grey colours offset by 4: the luma error is 4, the chroma errors are 0
+def test_colorOfOffsetGrey():
+    positions = getPlane()
+    source = getCloud(positions, colors=np.full((len(positions), 3), 100.0))
+    decoded = getCloud(positions.copy(), colors=np.full((len(positions), 3), 104.0))
+    values = getValues(source, decoded, ["color"])
+    assert values["c[0],PSNRF          "] == pytest.approx(10 * math.log10(255 * 255 / 16.0))
+    assert values["c[1],PSNRF          "] == PccMetrics.PSNR_MAX
+    assert values["c[2],PSNRF          "] == PccMetrics.PSNR_MAX
+
+# mm compares a colour with the mean colour of the neighbours at the nearest distance
+def test_colorAveragesTheNeighboursAtTheSameDistance():
+    source = getCloud(np.array([[0.0, 0.0, 0.0], [2.0, 0.0, 0.0]]), colors=np.array([[100.0] * 3, [120.0] * 3]))
+    decoded = getCloud(np.array([[1.0, 0.0, 0.0]]), colors=np.array([[110.0] * 3]))
+    values = getValues(source, decoded, ["color"])
+    assert values["c[0],    1          "] == pytest.approx(0.0, abs=1e-9)
+    assert values["c[0],PSNR2          "] == pytest.approx(10 * math.log10(255 * 255 / 100.0))
+    assert values["c[0],PSNRF          "] == values["c[0],PSNR2          "]
@@ -0,0 +1,79 @@
+#!/usr/bin/python3
+#--------------------------------------------------------------------------------
+# Copyright (c) 2025 InterDigital CE Patent Holdings
+# 
+# Licensed under the License terms and conditions for use, reproduction, and
+# distribution of 5G-MAG software (the “License”).  You may not use this file
+# except in compliance with the License.  You may obtain a copy of the License at
+# https://www.5g-mag.com/reference-tools.  Unless required by applicable law or
+# agreed to in writing, software distributed under the License is distributed on
+# an “AS IS” BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express
+# or implied.
+# 
+# See the License for the specific language governing permissions and limitations
+# under the License.
+#--------------------------------------------------------------------------------
+
+
+# Native PCQM of Pcqm.py versus the reference: the neighbourhoods and the quadric curvature checked
+# on clouds with known values (the bundled frames versus the mm logs recorded on them are in
+# test_mm_reference.py).
+
+import numpy as np
+import pytest
+from scipy.spatial import cKDTree
+
+import Pcqm
+
+def getSphere(radius, seed=0):
+    rng = np.random.default_rng(seed)
+    directions = rng.normal(size=(int(40 * radius * radius), 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    return np.unique(np.round(512 + radius * directions), axis=0)
+
+def getColors(positions):
+    return np.clip(np.round(128 + 100 * np.sin(positions / 7.0)), 0, 255)
+
+# every point within the radius, whatever the number of points and the size of the chunks
+@pytest.mark.parametrize("maxPairs", [Pcqm.MAX_PAIRS, 1000])
+def test_neighbourhoodsHoldAllPointsWithinRadius(maxPairs, monkeypatch):
+    monkeypatch.setattr(Pcqm, "MAX_PAIRS", maxPairs)
+    positions = np.argwhere(np.ones((12, 12, 12))).astype(np.float64)
+    tree = cKDTree(positions)
+    pairs = [(start + owners, indices) for start, stop, owners, indices, dists in Pcqm.queryRadius(tree, positions, 3.0)]
+    owners = np.concatenate([owners for owners, indices in pairs])
+    indices = np.concatenate([indices for owners, indices in pairs])
+    expected = tree.query_ball_point(positions, 3.0)
+    assert np.bincount(owners).max() > 32
+    for row in [0, 100, len(positions) // 2]:
+        assert sorted(indices[owners == row]) == sorted(expected[row])
+
+# at least the nearest points when the radius holds too few of them
+def test_neighbourhoodsTakeTheNearestPoints():
+    positions = np.arange(30, dtype=np.float64)[:, None] * [[4.0, 0.0, 0.0]]
+    owners = next(Pcqm.queryRadius(cKDTree(positions), positions, 1.0, Pcqm.MIN_NEIGHBOURS))[2]
+    assert np.all(np.bincount(owners) == Pcqm.MIN_NEIGHBOURS)
+
+# mean curvature 1/R of a voxelised sphere, 0 on a plane
+@pytest.mark.parametrize("radius", [20, 80])
+def test_curvatureOfSphere(radius):
+    positions = getSphere(radius)
+    curvature = Pcqm.computeCurvature(positions, cKDTree(positions), 5.0)
+    assert np.median(curvature) == pytest.approx(1.0 / radius, rel=0.1)
+
+def test_curvatureOfPlane():
+    positions = np.argwhere(np.ones((1, 40, 40))).astype(np.float64)
+    assert Pcqm.computeCurvature(positions, cKDTree(positions), 3.0) == pytest.approx(0.0, abs=1e-9)
+
+def test_identicalClouds():
+    positions = getSphere(20)
+    cloud = {'positions': positions, 'normals': None, 'colors': getColors(positions)}
+    values = Pcqm.computePcqm(cloud, {'positions': positions.copy(), 'normals': None, 'colors': cloud['colors'].copy()})
+    assert values["PCQM "] == pytest.approx(0.0, abs=1e-9)
+
+def test_degradedCloudsIncreasePcqm():
+    positions = getSphere(20)
+    source = {'positions': positions, 'normals': None, 'colors': getColors(positions)}
+    values = [Pcqm.computePcqm(source, {'positions': positions.copy(), 'normals': None, 'colors': np.clip(source['colors'] + step, 0, 255)})["PCQM "]
+              for step in [4, 16, 64]]
+    assert 0 < values[0] < values[1] < values[2]